@@ -1,24 +1,26 @@
 import time
-import pandas as pd
-import requests
+import numpy as np
 import re
 import os
-from datetime import datetime, timezone, timedelta
+import sys
 
 # --- CẤU HÌNH PHÍ GIAO DỊCH ---
 FEE_CRYPTO = 0.001   # 0.1% (Binance/KuCoin)
 FEE_STOCK = 0.0015   # 0.15% (Thuế + Phí CTCK)
 
 # --- THƯ VIỆN ---
-try:
-    import ccxt
-    from lunardate import LunarDate
-except ImportError:
-    pass
-
-# --- HÀM TẢI DỮ LIỆU (LOOP FETCHING) ---
-def get_historical_data(symbol, days):
-    end_ts = int(time.time()) * 1000 
+from hexagram_calendar import lookup_codes
+from market_data import load_stock_candles, load_crypto_candles
+from indicators import compute_indicators
+from resample import timeframe_step
+from signal_table import ACTION_HOLD, ACTION_BUY, ACTION_SELL, ACTION_NAMES, as_signal_table
+from run_profile import cprofile_to, span
+from backtest_cache import BACKTEST_CACHE_ENABLED, get_backtest_cache, make_key
+
+# --- HÀM TẢI DỮ LIỆU (ĐỌC QUA KHO NẾN CỤC BỘ, trả về CandleSeries) ---
+# failed: list tùy chọn nhận các khoảng tải lỗi (chuỗi trả về bị thiếu đoạn đó); to_ts: mốc cuối (giây), mặc định hiện tại
+def get_historical_data(symbol, days, timeframe="1h", failed=None, to_ts=None):
+    end_ts = (int(time.time()) if to_ts is None else int(to_ts)) * 1000 
     start_ts = end_ts - (days * 24 * 3600 * 1000)
     
     # 1. XỬ LÝ CRYPTO
@@ -28,39 +30,16 @@ def get_historical_data(symbol, days):
             if "USDT" in sym_map and "/" not in sym_map: sym_map = sym_map.replace("USDT", "/USDT")
             elif "/USDT" not in sym_map: sym_map += "/USDT"
 
-            ex = ccxt.kucoin() 
-            all_ohlcv = []
-            current_since = start_ts
-            
-            while current_since < end_ts:
-                try:
-                    ohlcv = ex.fetch_ohlcv(sym_map, '1h', since=current_since, limit=1000)
-                except Exception as e:
-                    print(f"❌ [BUILD LOG] Lỗi kết nối sàn Crypto với mã {symbol}: {str(e)}")
-                    return [], f"Lỗi sàn Crypto: {str(e)}", "ERROR"
-
-                if not ohlcv: break 
-                
-                start_candle = ohlcv[0][0]
-                last_candle = ohlcv[-1][0]
-                
-                if len(all_ohlcv) > 0 and start_candle <= all_ohlcv[-1]['ts_raw']: break
-                
-                for c in ohlcv:
-                    if c[0] >= start_ts and c[0] <= end_ts:
-                         all_ohlcv.append({
-                            "ts_raw": c[0],
-                            "t": datetime.fromtimestamp(c[0]/1000, tz=timezone(timedelta(hours=7))),
-                            "p": float(c[4])
-                        })
-                
-                current_since = last_candle + (60 * 60 * 1000)
-                time.sleep(0.1)
+            try:
+                series = load_crypto_candles(sym_map, start_ts // 1000, end_ts // 1000, timeframe, failed)
+            except Exception as e:
+                print(f"❌ [BUILD LOG] Lỗi kết nối sàn Crypto với mã {symbol}: {str(e)}")
+                return [], f"Lỗi sàn Crypto: {str(e)}", "ERROR"
 
-            if not all_ohlcv: 
+            if not len(series): 
                 print(f"❌ [BUILD LOG] Không tìm thấy dữ liệu Crypto cho mã {symbol}")
                 return [], "Không tìm thấy dữ liệu Crypto.", "ERROR"
-            return all_ohlcv, "OK", "CRYPTO"
+            return series, "OK", "CRYPTO"
             
         except Exception as e:
             print(f"❌ [BUILD LOG] Lỗi hệ thống Backtest Crypto: {str(e)}")
@@ -69,23 +48,15 @@ def get_historical_data(symbol, days):
     # 2. XỬ LÝ CHỨNG KHOÁN
     else:
         try:
-            to_ts_sec = int(time.time())
+            to_ts_sec = int(time.time()) if to_ts is None else int(to_ts)
             from_ts_sec = to_ts_sec - (days * 24 * 3600)
             
-            url = f"https://services.entrade.com.vn/chart-api/v2/ohlcs/stock?symbol={symbol}&resolution=1H&from={from_ts_sec}&to={to_ts_sec}"
-            res = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10).json()
+            series = load_stock_candles(symbol, from_ts_sec, to_ts_sec, timeframe, failed)
             
-            data = []
-            if 't' in res and res['t']:
-                for i in range(len(res['t'])):
-                    data.append({
-                        "t": datetime.fromtimestamp(res['t'][i], tz=timezone(timedelta(hours=7))),
-                        "p": float(res['c'][i])
-                    })
-            else: 
+            if not len(series): 
                 print(f"❌ [BUILD LOG] Không tìm thấy dữ liệu Stock cho mã {symbol} (Hoặc mã sai)")
                 return [], "Không tìm thấy dữ liệu Stock.", "ERROR"
-            return data, "OK", "STOCK"
+            return series, "OK", "STOCK"
         except Exception as e:
             print(f"❌ [BUILD LOG] Lỗi kết nối API Stock: {str(e)}")
             return [], f"Lỗi kết nối Stock: {str(e)}", "ERROR"
@@ -101,147 +72,245 @@ def add_indicators(df):
     df['RSI'] = 100 - (100 / (1 + rs))
     return df.fillna(0)
 
-king_wen_matrix = [[1, 10, 13, 25, 44, 6, 33, 12], [43, 58, 49, 17, 28, 47, 31, 45], [14, 38, 30, 21, 50, 64, 56, 35], [34, 54, 55, 51, 32, 40, 62, 16], [9, 61, 37, 42, 57, 59, 53, 20], [5, 60, 63, 3, 48, 29, 39, 8], [26, 41, 22, 27, 18, 4, 52, 23], [11, 19, 36, 24, 46, 7, 15, 2]]
-
-def calculate_hexagram(dt):
-    if dt.hour == 23: dt_l = dt + timedelta(days=1)
-    else: dt_l = dt
-    lunar = LunarDate.fromSolarDate(dt_l.year, dt_l.month, dt_l.day)
-    chi = 1 if dt.hour==23 or dt.hour==0 else ((dt.hour+1)//2 + 1 if dt.hour%2!=0 else dt.hour//2 + 1)
-    base = ((lunar.year - 1984)%12 + 1) + lunar.month + lunar.day
-    thuong, ha = base%8 or 8, (base+chi)%8 or 8
-    hao = (base+chi)%6 or 6
-    id_goc = king_wen_matrix[thuong-1][ha-1]
-    is_upper, line = hao>3, hao-3 if hao>3 else hao
-    target = thuong if is_upper else ha
-    new_trig = {1:{1:5,2:3,3:2},2:{1:6,2:4,3:1},3:{1:7,2:1,3:4},4:{1:8,2:2,3:3},5:{1:1,2:7,3:6},6:{1:2,2:8,3:5},7:{1:3,2:5,3:8},8:{1:4,2:6,3:7}}[target][line]
-    new_thuong, new_ha = (new_trig, thuong) if is_upper else (thuong, new_trig)
-    return f"G{id_goc}-B{king_wen_matrix[new_thuong-1][new_ha-1]}"
-
-def analyze_smart_action(text):
-    if not isinstance(text, str) or not text: return "GIỮ", 0.0
-    text = text.lower()
-    avoid = ['đứng ngoài', 'quan sát', 'không nên mua', 'rút lui', 'chờ đợi', 'thận trọng']
-    if any(w in text for w in avoid): return "GIỮ", 0.0
-    strong_buy = ['đại cát', 'lợi lớn', 'bay cao', 'thời cơ vàng', 'mua ngay', 'tất tay', 'all-in']
-    if any(w in text for w in strong_buy): return "MUA", 1.0 
-    strong_sell = ['nguy hiểm', 'sập', 'tháo chạy', 'bán tháo', 'tuyệt vọng', 'cắt lỗ ngay']
-    if any(w in text for w in strong_sell): return "BÁN", 1.0
-    normal_buy = ['mua', 'tốt', 'lãi', 'tích lũy', 'hanh thông', 'tăng', 'nên mua']
-    if any(w in text for w in normal_buy): return "MUA", 0.5
-    normal_sell = ['bán', 'xấu', 'lỗ', 'giảm', 'trở ngại', 'hạ tỷ trọng', 'nên bán']
-    if any(w in text for w in normal_sell): return "BÁN", 0.5
-    return "GIỮ", 0.0
-
-def run_backtest_core(symbol, days, advice_map):
-    try:
-        raw_data, msg, asset_type = get_historical_data(symbol, days)
-        if not raw_data: return f"❌ <b>Backtest Thất Bại</b>\nLý do: {msg}"
+# --- ENGINE ---
+# "vector": mô phỏng trên mảng NumPy (mặc định), "loop": duyệt từng nến như bản gốc (dùng để đối chiếu)
+BACKTEST_ENGINE = os.environ.get("BACKTEST_ENGINE", "vector")
+# Ghi cProfile cho mỗi lần run_backtest_core vào .cache/profile/ (BACKTEST_CPROFILE=1 hoặc --cprofile)
+BACKTEST_CPROFILE = os.environ.get("BACKTEST_CPROFILE") == "1" or "--cprofile" in sys.argv
 
-        df = pd.DataFrame(raw_data)
-        df = add_indicators(df)
-        data = df.to_dict('records')
-        
-        if len(data) < 20: return f"❌ <b>Dữ liệu quá ít</b>\nChỉ tìm thấy {len(data)} nến."
-
-        # Cấu hình Vốn & Phí
-        if asset_type == "CRYPTO": 
-            capital, currency, min_order = 5000, "$", 100
-            fee_rate = FEE_CRYPTO
-        else: 
-            capital, currency, min_order = 100_000_000, "đ", 5_000_000
-            fee_rate = FEE_STOCK
-
-        cash, stock, avg_price = capital, 0, 0
-        trade_count, win_count, loss_count = 0, 0, 0
-        total_fees = 0 # Tổng phí đã trả
+# Tham số chiến lược (engine vector nhận dict này, mặc định = logic gốc)
+DEFAULT_PARAMS = {"stop_loss": -0.07, "take_profit": 0.15, "rsi_floor": 35, "rsi_overbought": 75, "sma_window": 20}
+
+def get_backtest_config(asset_type):
+    # Cấu hình Vốn & Phí
+    if asset_type == "CRYPTO": return 5000, "$", 100, FEE_CRYPTO
+    return 100_000_000, "đ", 5_000_000, FEE_STOCK
+
+def simulate_loop(series, sma, rsi_arr, codes, signals, asset_type):
+    capital, currency, min_order, fee_rate = get_backtest_config(asset_type)
+    cash, stock, avg_price = capital, 0, 0
+    trade_count, win_count, loss_count = 0, 0, 0
+    total_fees = 0 # Tổng phí đã trả
+    prices, sma_list, rsi_list = series.close.tolist(), sma.tolist(), rsi_arr.tolist()
+
+    for i, code in enumerate(codes.tolist()):
+        price, sma20, rsi = prices[i], sma_list[i], rsi_list[i]
+        holding_pnl = (price - avg_price) / avg_price if (stock > 0 and avg_price > 0) else 0
+
+        action, percent = ACTION_NAMES[signals.actions[code]], float(signals.percents[code])
         
-        for item in data:
-            dt, price = item['t'], item['p']
-            sma20, rsi = item.get('SMA20', 0), item.get('RSI', 50)
-            holding_pnl = (price - avg_price) / avg_price if (stock > 0 and avg_price > 0) else 0
-
-            key = calculate_hexagram(dt)
-            advice = advice_map.get(key, "")
-            action, percent = analyze_smart_action(advice)
-            
-            risk_action = None
-            if stock > 0:
-                if holding_pnl <= -0.07: risk_action = "STOP_LOSS"
-                elif holding_pnl >= 0.15: risk_action = "TAKE_PROFIT"
-
-            if action == "MUA":
-                if price < sma20 and rsi > 35: action = "GIỮ"
-                if rsi > 75: action = "GIỮ"
-
-            final_action, final_percent = action, percent
-            if risk_action == "STOP_LOSS": final_action, final_percent = "BÁN", 1.0
-            elif risk_action == "TAKE_PROFIT": final_action, final_percent = "BÁN", 0.5
-
-            # [UPDATE] LOGIC TÍNH PHÍ MUA
-            if final_action == "MUA":
-                amt = cash * final_percent
-                if amt > min_order:
-                    qty = amt / price
-                    if asset_type == "STOCK": qty = int(qty // 100) * 100
-                    if qty > 0:
-                        buy_val = qty * price
-                        fee_val = buy_val * fee_rate # Phí mua
-                        total_fees += fee_val
-                        
-                        current_val = stock * avg_price
-                        stock += qty
-                        avg_price = (current_val + buy_val) / stock # Giá vốn không đổi, phí trừ thẳng vào tiền mặt
-                        cash -= (buy_val + fee_val) # Trừ tiền hàng + phí
-
-            # [UPDATE] LOGIC TÍNH PHÍ BÁN
-            elif final_action == "BÁN":
-                qty = stock * final_percent
+        risk_action = None
+        if stock > 0:
+            if holding_pnl <= -0.07: risk_action = "STOP_LOSS"
+            elif holding_pnl >= 0.15: risk_action = "TAKE_PROFIT"
+
+        if action == "MUA":
+            if price < sma20 and rsi > 35: action = "GIỮ"
+            if rsi > 75: action = "GIỮ"
+
+        final_action, final_percent = action, percent
+        if risk_action == "STOP_LOSS": final_action, final_percent = "BÁN", 1.0
+        elif risk_action == "TAKE_PROFIT": final_action, final_percent = "BÁN", 0.5
+
+        # [UPDATE] LOGIC TÍNH PHÍ MUA
+        if final_action == "MUA":
+            amt = cash * final_percent
+            if amt > min_order:
+                qty = amt / price
                 if asset_type == "STOCK": qty = int(qty // 100) * 100
-                if qty > stock: qty = stock
                 if qty > 0:
-                    sell_val = qty * price
-                    fee_val = sell_val * fee_rate # Phí bán
+                    buy_val = qty * price
+                    fee_val = buy_val * fee_rate # Phí mua
                     total_fees += fee_val
                     
-                    stock -= qty
-                    cash += (sell_val - fee_val) # Nhận tiền hàng - phí
-                    
-                    # Tính PnL thực (Đã trừ phí)
-                    # PnL = (Giá bán - Giá vốn) * Qty - Phí bán - (Phí mua phân bổ - cái này phức tạp, nên tính đơn giản trên cash flow)
-                    trade_pnl_gross = (price - avg_price) * qty
-                    # Đây là lãi gộp, lãi ròng sẽ phản ánh vào Cash cuối cùng
-                    if trade_pnl_gross > 0: win_count += 1
-                    elif trade_pnl_gross < 0: loss_count += 1
-                    trade_count += 1
-                    
-                    if stock == 0: avg_price = 0
+                    current_val = stock * avg_price
+                    stock += qty
+                    avg_price = (current_val + buy_val) / stock # Giá vốn không đổi, phí trừ thẳng vào tiền mặt
+                    cash -= (buy_val + fee_val) # Trừ tiền hàng + phí
 
-        final_equity = cash + (stock * data[-1]['p'])
-        net_profit = final_equity - capital
-        roi = net_profit / capital
-        win_rate = (win_count / trade_count) if trade_count > 0 else 0
-        
-        def fmt(v): return f"{v:,.2f}" if asset_type == "CRYPTO" else f"{v/1e6:,.1f} tr"
-
-        return (
-            f"📊 <b>KẾT QUẢ BACKTEST CHI TIẾT (Đã trừ phí)</b>\n"
-            f"--------------------------\n"
-            f"🔠 <b>Mã:</b> {symbol.upper()}\n"
-            f"⏳ <b>Thời gian:</b> {days} ngày\n"
-            f"🕯 <b>Dữ liệu:</b> {len(data)} nến\n"
-            f"--------------------------\n"
-            f"💰 <b>Vốn ban đầu:</b> {currency} {fmt(capital)}\n"
-            f"💎 <b>Vốn kết thúc:</b> {currency} {fmt(final_equity)}\n"
-            f"💵 <b>Lợi nhuận ròng:</b> {currency} {fmt(net_profit)}\n"
-            f"💸 <b>Tổng phí GD:</b> {currency} {fmt(total_fees)}\n"
-            f"🚀 <b>ROI: {roi:+.2%}</b>\n"
-            f"--------------------------\n"
-            f"🛒 <b>Tổng số lệnh:</b> {trade_count}\n"
-            f"✅ <b>Lệnh Thắng:</b> {win_count}\n"
-            f"❌ <b>Lệnh Thua:</b> {loss_count}\n"
-            f"🎯 <b>Tỷ lệ Thắng:</b> {win_rate:.1%}"
-        )
+        # [UPDATE] LOGIC TÍNH PHÍ BÁN
+        elif final_action == "BÁN":
+            qty = stock * final_percent
+            if asset_type == "STOCK": qty = int(qty // 100) * 100
+            if qty > stock: qty = stock
+            if qty > 0:
+                sell_val = qty * price
+                fee_val = sell_val * fee_rate # Phí bán
+                total_fees += fee_val
+                
+                stock -= qty
+                cash += (sell_val - fee_val) # Nhận tiền hàng - phí
+                
+                # Tính PnL thực (Đã trừ phí)
+                # PnL = (Giá bán - Giá vốn) * Qty - Phí bán - (Phí mua phân bổ - cái này phức tạp, nên tính đơn giản trên cash flow)
+                trade_pnl_gross = (price - avg_price) * qty
+                # Đây là lãi gộp, lãi ròng sẽ phản ánh vào Cash cuối cùng
+                if trade_pnl_gross > 0: win_count += 1
+                elif trade_pnl_gross < 0: loss_count += 1
+                trade_count += 1
+                
+                if stock == 0: avg_price = 0
+
+    return {"capital": capital, "final_equity": cash + (stock * prices[-1]), "total_fees": total_fees,
+            "trade_count": trade_count, "win_count": win_count, "loss_count": loss_count}
+
+def simulate_arrays(price, sma20, rsi, actions, percents, asset_type, params=None):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    signal = filter_buy_signals(price, sma20, rsi, actions, params)
+    # Vòng lặp trạng thái trên list float thuần (nhanh hơn truy cập phần tử numpy)
+    return simulate_signals(price.tolist(), signal.tolist(), percents.tolist(), asset_type, params)
+
+# Bộ lọc kỹ thuật cho lệnh MUA không phụ thuộc trạng thái -> tính một lần trên cả mảng
+def filter_buy_signals(price, sma20, rsi, actions, params=None):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    blocked = ((price < sma20) & (rsi > params["rsi_floor"])) | (rsi > params["rsi_overbought"])
+    return np.where((actions == ACTION_BUY) & blocked, ACTION_HOLD, actions)
+
+# prices / signals / pcts: list Python (đã lọc), dùng chung cho backtest thường và walk-forward
+def simulate_signals(prices, signals, pcts, asset_type, params=None):
+    capital, currency, min_order, fee_rate = get_backtest_config(asset_type)
+    is_stock = asset_type == "STOCK"
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    stop_loss, take_profit = params["stop_loss"], params["take_profit"]
+    cash, stock, avg_price = capital, 0, 0
+    trade_count, win_count, loss_count = 0, 0, 0
+    total_fees = 0
+    peak, max_drawdown = capital, 0.0
+
+    for i in range(len(prices)):
+        p, sig, pct = prices[i], signals[i], pcts[i]
+        if stock > 0 and avg_price > 0:
+            holding_pnl = (p - avg_price) / avg_price
+            if holding_pnl <= stop_loss: sig, pct = ACTION_SELL, 1.0
+            elif holding_pnl >= take_profit: sig, pct = ACTION_SELL, 0.5
+
+        if sig == ACTION_BUY:
+            amt = cash * pct
+            if amt > min_order:
+                qty = amt / p
+                if is_stock: qty = int(qty // 100) * 100
+                if qty > 0:
+                    buy_val = qty * p
+                    fee_val = buy_val * fee_rate
+                    total_fees += fee_val
+                    current_val = stock * avg_price
+                    stock += qty
+                    avg_price = (current_val + buy_val) / stock
+                    cash -= (buy_val + fee_val)
+        elif sig == ACTION_SELL:
+            qty = stock * pct
+            if is_stock: qty = int(qty // 100) * 100
+            if qty > stock: qty = stock
+            if qty > 0:
+                sell_val = qty * p
+                fee_val = sell_val * fee_rate
+                total_fees += fee_val
+                stock -= qty
+                cash += (sell_val - fee_val)
+                trade_pnl_gross = (p - avg_price) * qty
+                if trade_pnl_gross > 0: win_count += 1
+                elif trade_pnl_gross < 0: loss_count += 1
+                trade_count += 1
+                if stock == 0: avg_price = 0
+
+        equity = cash + stock * p
+        if equity > peak: peak = equity
+        elif peak > 0 and (equity - peak) / peak < max_drawdown: max_drawdown = (equity - peak) / peak
+
+    return {"capital": capital, "final_equity": cash + (stock * prices[-1]), "total_fees": total_fees,
+            "trade_count": trade_count, "win_count": win_count, "loss_count": loss_count, "max_drawdown": max_drawdown}
+
+def summarize_stats(stats):
+    trades = stats["trade_count"]
+    return {"roi": (stats["final_equity"] - stats["capital"]) / stats["capital"], "win_rate": stats["win_count"] / trades if trades > 0 else 0,
+            "trades": trades, "fees": stats["total_fees"], "max_drawdown": stats.get("max_drawdown", 0.0)}
+
+def format_backtest_report(symbol, days, n_candles, stats, asset_type, timeframe="1h", missing=0):
+    capital, currency, min_order, fee_rate = get_backtest_config(asset_type)
+    final_equity, total_fees = stats["final_equity"], stats["total_fees"]
+    trade_count, win_count, loss_count = stats["trade_count"], stats["win_count"], stats["loss_count"]
+    net_profit = final_equity - capital
+    roi = net_profit / capital
+    win_rate = (win_count / trade_count) if trade_count > 0 else 0
+    
+    def fmt(v): return f"{v:,.2f}" if asset_type == "CRYPTO" else f"{v/1e6:,.1f} tr"
+
+    return (
+        f"📊 <b>KẾT QUẢ BACKTEST CHI TIẾT (Đã trừ phí)</b>\n"
+        f"--------------------------\n"
+        f"🔠 <b>Mã:</b> {symbol.upper()}\n"
+        f"⏳ <b>Thời gian:</b> {days} ngày\n"
+        f"🕯 <b>Dữ liệu:</b> {n_candles} nến" + (f" {timeframe}" if timeframe != "1h" else "") + "\n"
+        + (f"⚠️ <b>Thiếu {missing} khoảng dữ liệu</b> (lỗi tải, kết quả chỉ tính trên phần đã có)\n" if missing else "") +
+        f"--------------------------\n"
+        f"💰 <b>Vốn ban đầu:</b> {currency} {fmt(capital)}\n"
+        f"💎 <b>Vốn kết thúc:</b> {currency} {fmt(final_equity)}\n"
+        f"💵 <b>Lợi nhuận ròng:</b> {currency} {fmt(net_profit)}\n"
+        f"💸 <b>Tổng phí GD:</b> {currency} {fmt(total_fees)}\n"
+        f"🚀 <b>ROI: {roi:+.2%}</b>\n"
+        f"--------------------------\n"
+        f"🛒 <b>Tổng số lệnh:</b> {trade_count}\n"
+        f"✅ <b>Lệnh Thắng:</b> {win_count}\n"
+        f"❌ <b>Lệnh Thua:</b> {loss_count}\n"
+        f"🎯 <b>Tỷ lệ Thắng:</b> {win_rate:.1%}"
+    )
+
+# Tải dữ liệu + tiền xử lý một lần (giá, mã quẻ, tín hiệu) cho các chế độ backtest
+# end_ts: chỉ lấy các nến đã đóng tại mốc này (bỏ nến đang chạy) -> cùng mốc thì cùng dữ liệu
+def load_backtest_arrays(symbol, days, signals, timeframe="1h", end_ts=None):
+    failed = []
+    series, msg, asset_type = get_historical_data(symbol, days, timeframe, failed, end_ts)
+    if end_ts is not None and len(series): series = series[:series.closed_count(end_ts, timeframe_step(timeframe))]
+    if not len(series): return None, f"❌ <b>Backtest Thất Bại</b>\nLý do: {msg}"
+    if len(series) < 20: return None, f"❌ <b>Dữ liệu quá ít</b>\nChỉ tìm thấy {len(series)} nến."
+
+    signals = as_signal_table(signals)
+    with span("hexagram"): codes = lookup_codes(series.ts)
+    actions, percents = signals.lookup(codes)
+    return {"symbol": symbol, "days": days, "timeframe": timeframe, "asset_type": asset_type, "series": series, "ts": series.ts, "price": series.close,
+            "codes": codes, "actions": actions, "percents": percents, "signals": signals, "missing": len(failed)}, "OK"
+
+def run_backtest_core(symbol, days, signals, engine=None, cprofile=None, use_cache=None, timeframe="1h"):
+    if cprofile if cprofile is not None else BACKTEST_CPROFILE:
+        with cprofile_to(f"backtest_{re.sub(r'[^A-Za-z0-9]', '_', symbol)}"):
+            return run_backtest_core(symbol, days, signals, engine, False, use_cache, timeframe)
+    engine = engine or BACKTEST_ENGINE
+    signals = as_signal_table(signals)
+
+    # Cache kết quả theo đầu vào; dữ liệu cắt tại đầu giờ hiện tại (bỏ nến đang chạy) nên kết quả trong cùng giờ không đổi
+    end_ts = int(time.time()) // 3600 * 3600
+    cache, key = None, None
+    if BACKTEST_CACHE_ENABLED if use_cache is None else use_cache:
+        try:
+            cache = get_backtest_cache()
+            key = make_key(symbol, days, end_ts, signals.fingerprint(), [FEE_CRYPTO, FEE_STOCK], DEFAULT_PARAMS, engine,
+                           timeframe)
+            hit = cache.get(key)
+            if hit:
+                print(f"⚡ [BUILD LOG] Backtest {symbol.upper()} ({days} ngày, {timeframe}) lấy từ cache")
+                return hit[0]
+        except Exception as e:
+            print(f"⚠️ [BUILD LOG] Không dùng được cache backtest: {e}")
+            cache = None
+
+    try:
+        bt, msg = load_backtest_arrays(symbol, days, signals, timeframe, end_ts)
+        if bt is None: return msg
+        asset_type = bt["asset_type"]
+
+        if engine == "loop":
+            import pandas as pd   # Chỉ engine đối chiếu "loop" dùng pandas
+            with span("indicators"): df = add_indicators(pd.DataFrame({"p": bt["price"]}))
+            with span("simulate"): stats = simulate_loop(bt["series"], df['SMA20'].to_numpy(), df['RSI'].to_numpy(), bt["codes"], bt["signals"], asset_type)
+        else:
+            with span("indicators"): sma20, rsi = compute_indicators(bt["price"])
+            with span("simulate"): stats = simulate_arrays(bt["price"], sma20, rsi, bt["actions"], bt["percents"], asset_type)
+
+        report = format_backtest_report(symbol, days, len(bt["price"]), stats, asset_type, timeframe, bt["missing"])
+        if cache is not None and not bt["missing"]:   # Không cache kết quả trên dữ liệu thiếu
+            try: cache.put(key, symbol, days, report, stats)
+            except Exception as e: print(f"⚠️ [BUILD LOG] Không ghi được cache backtest: {e}")
+        return report
     except Exception as e:
         print(f"❌ [BUILD LOG] Exception in Backtest: {str(e)}")
         return f"❌ <b>Lỗi Backtest</b>: {str(e)}"
@@ -0,0 +1,62 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from concurrency import lazy_singleton
+from hexagram_calendar import CACHE_DIR
+
+# --- CACHE KẾT QUẢ BACKTEST (LRU, lưu đĩa) ---
+# Khóa = băm của mọi đầu vào: mã, khoảng thời gian (tới giờ hiện tại), khung nến, hash lời khuyên, phí, tham số chiến lược, engine.
+# Đổi bất kỳ đầu vào nào -> khóa mới; bản cũ tự rơi khỏi cache theo LRU.
+# Dữ liệu nến được tái dùng riêng qua kho nến (bp 180 ngày chỉ tải phần còn thiếu so với bp 90 ngày trước đó).
+BACKTEST_CACHE_DB = os.path.join(CACHE_DIR, "backtest_results.sqlite")
+BACKTEST_CACHE_SIZE = int(os.environ.get("BACKTEST_CACHE_SIZE", 200))
+BACKTEST_CACHE_ENABLED = os.environ.get("BACKTEST_CACHE", "1") != "0"
+CACHE_VERSION = 1   # Tăng khi đổi logic mô phỏng / định dạng báo cáo
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, symbol TEXT, days INTEGER, created REAL, last_used REAL, report TEXT, stats TEXT);
+CREATE INDEX IF NOT EXISTS results_lru ON results (last_used);
+"""
+
+def make_key(symbol, days, end_ts, signals_hash, fees, params, engine, timeframe="1h"):
+    raw = json.dumps({"v": CACHE_VERSION, "symbol": symbol.upper(), "days": int(days), "end": int(end_ts), "signals": signals_hash,
+                      "fees": fees, "params": params, "engine": engine, "timeframe": timeframe}, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+class BacktestCache:
+    def __init__(self, path=BACKTEST_CACHE_DB, max_entries=BACKTEST_CACHE_SIZE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(_SCHEMA)
+
+    # -> (report, stats) hoặc None
+    def get(self, key):
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT report, stats FROM results WHERE key=?", (key,)).fetchone()
+            if not row: return None
+            self.conn.execute("UPDATE results SET last_used=? WHERE key=?", (time.time(), key))
+            return row[0], json.loads(row[1])
+
+    def put(self, key, symbol, days, report, stats):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (key, symbol.upper(), int(days), now, now, report, json.dumps(stats)))
+            self.conn.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                              (self.max_entries,))
+
+    def __len__(self):
+        with self.lock: return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self):
+        with self.lock, self.conn: self.conn.execute("DELETE FROM results")
+
+get_backtest_cache = lazy_singleton(BacktestCache)
@@ -0,0 +1,79 @@
+import os
+import re
+import sys
+import time
+
+from backtest import load_backtest_arrays, simulate_arrays, summarize_stats
+from concurrency import run_parallel
+from indicators import compute_indicators
+from resample import pop_timeframe
+from signal_table import as_signal_table, load_signal_table
+from telegram_sender import print_report
+
+# --- DANH SÁCH THEO DÕI (dùng "@tên" trong lệnh bp) ---
+WATCHLISTS = {
+    "vn30": ["ACB", "BCM", "BID", "BVH", "CTG", "FPT", "GAS", "GVR", "HDB", "HPG", "MBB", "MSN", "MWG", "PLX", "POW",
+             "SAB", "SHB", "SSB", "SSI", "STB", "TCB", "TPB", "VCB", "VHM", "VIB", "VIC", "VJC", "VNM", "VPB", "VRE"],
+    "crypto": ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT", "ADAUSDT", "DOGEUSDT", "AVAXUSDT", "LINKUSDT", "DOTUSDT"],
+}
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 8))
+MAX_BATCH_SYMBOLS = 40
+
+# "BTC,ETH FPT" / "@vn30" -> danh sách mã (giữ thứ tự, bỏ trùng)
+def resolve_symbols(tokens):
+    symbols = []
+    for token in tokens:
+        for part in filter(None, token.split(",")):
+            if part.startswith("@"):
+                name = part[1:].lower()
+                if name not in WATCHLISTS: raise ValueError(f"Không có danh sách '{name}' (có: {', '.join(WATCHLISTS)})")
+                symbols.extend(WATCHLISTS[name])
+            else: symbols.append(part.upper())
+    symbols = list(dict.fromkeys(symbols))
+    if len(symbols) > MAX_BATCH_SYMBOLS: raise ValueError(f"Tối đa {MAX_BATCH_SYMBOLS} mã mỗi lần")
+    return symbols
+
+def _backtest_one(args):
+    symbol, days, signals, timeframe = args
+    try:
+        bt, msg = load_backtest_arrays(symbol, days, signals, timeframe)
+        if bt is None: return {"symbol": symbol, "error": re.sub(r"<[^>]+>", "", msg).replace("\n", " ")}
+        sma20, rsi = compute_indicators(bt["price"])
+        stats = simulate_arrays(bt["price"], sma20, rsi, bt["actions"], bt["percents"], bt["asset_type"])
+        return {"symbol": symbol, "type": bt["asset_type"], "candles": len(bt["price"]), "missing": bt["missing"], **summarize_stats(stats)}
+    except Exception as e:
+        return {"symbol": symbol, "error": str(e)}
+
+# Tải + mô phỏng song song, giới hạn tốc độ theo sàn nằm trong market_data
+def run_batch_backtest(symbols, days, signals, workers=BATCH_WORKERS, timeframe="1h"):
+    signals = as_signal_table(signals)
+    rows = run_parallel(_backtest_one, [(s, days, signals, timeframe) for s in symbols], workers)
+    ok = sorted([r for r in rows if "error" not in r], key=lambda r: r["roi"], reverse=True)
+    return ok, [r for r in rows if "error" in r]
+
+def format_batch_report(days, ok, failed, elapsed, timeframe="1h"):
+    lines = [f"{'#':>2} {'Mã':<9} {'ROI':>8} {'Win':>5} {'Lệnh':>4} {'MaxDD':>7} {'Nến':>5}"]
+    for i, r in enumerate(ok, 1):
+        lines.append(f"{i:>2} {r['symbol'][:9]:<9} {r['roi']:>+8.2%} {r['win_rate']:>5.0%} {r['trades']:>4} {r['max_drawdown']:>7.1%} {r['candles']:>5}")
+    msg = (
+        f"📊 <b>SO SÁNH BACKTEST ({len(ok) + len(failed)} mã, đã trừ phí)</b>\n"
+        f"⏳ {days} ngày" + (f" | 🕯 {timeframe}" if timeframe != "1h" else "") + f" | ⏱ {elapsed:.1f}s\n"
+        f"<pre>" + "\n".join(lines) + "</pre>"
+    )
+    partial = [r for r in ok if r.get("missing")]
+    if partial: msg += "\n⚠️ <b>Thiếu dữ liệu:</b> " + ", ".join(f"{r['symbol']} ({r['missing']} khoảng)" for r in partial)
+    if failed: msg += "\n⚠️ <b>Lỗi:</b>\n" + "\n".join(f"• {r['symbol']}: {r['error']}" for r in failed)
+    return msg
+
+def run_batch_report(symbols, days, signals, workers=BATCH_WORKERS, timeframe="1h"):
+    started = time.time()
+    ok, failed = run_batch_backtest(symbols, days, signals, workers, timeframe)
+    return format_batch_report(days, ok, failed, time.time() - started, timeframe)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Cách dùng: python batch_backtest.py BTC,ETH,FPT|@vn30 [NGÀY] [1h|2h|4h|1d]")
+        sys.exit(1)
+    tokens, timeframe = pop_timeframe(sys.argv[1:])
+    days = int(tokens.pop()) if len(tokens) > 1 and tokens[-1].isdigit() else 90
+    print_report(run_batch_report(resolve_symbols(tokens), days, load_signal_table(), timeframe=timeframe))
@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import types
+import zlib
+import argparse
+import platform
+import tempfile
+import subprocess
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+# --- BENCHMARK OFFLINE ---
+# Dữ liệu OHLCV giả theo giờ + dịch vụ giả chạy trong tiến trình (Entrade, ccxt, Notion, Telegram) để đo
+# run_campaign, cả lượt chạy theo giờ, run_backtest_core, walk-forward, Monte Carlo và backtest danh mục ở nhiều
+# quy mô mà không cần mạng hay secrets.
+# VD: python benchmark.py --symbols 3,10 --days 30,365 --out bench_results.json --compare bench_old.json
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_ENV = {"NOTION_TOKEN": "bench", "CONFIG_DB_ID": "c" * 32, "LOG_DB_ID": "d" * 32, "TELEGRAM_TOKEN": "bench", "TELEGRAM_CHAT_ID": "1",
+            # Bỏ giới hạn tốc độ để đo thời gian của code chứ không phải thời gian chờ token bucket
+            "NOTION_RATE": "100000", "KUCOIN_RATE": "100000", "ENTRADE_RATE": "100000",
+            "TG_CHAT_RATE": "100000", "TG_GLOBAL_RATE": "100000"}
+
+# --- DỮ LIỆU GIẢ ---
+class FakeMarket:
+    def __init__(self, history_hours):
+        self.end = int(time.time()) // 3600 * 3600
+        self.start = self.end - history_hours * 3600
+        self.series = {}
+
+    def candles(self, symbol):
+        if symbol not in self.series:
+            rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+            ts = np.arange(self.start, self.end + 1, 3600, dtype=np.int64)
+            stock = "/" not in symbol
+            if stock:   # Cổ phiếu: chỉ có nến trong giờ giao dịch (9h-15h VN, thứ 2-6)
+                local = ts + 7 * 3600
+                ts = ts[((local // 3600) % 24 >= 9) & ((local // 3600) % 24 < 15) & (((local // 86400) + 3) % 7 < 5)]
+            close = (30.0 if stock else 100.0) * np.exp(np.cumsum(rng.normal(0, 0.01, len(ts))))
+            if stock: close = np.round(close, 2)
+            spread = np.abs(rng.normal(0, 0.004, len(ts))) * close
+            self.series[symbol] = (ts, close - spread / 2, close + spread, close - spread, close, rng.uniform(1e3, 1e5, len(ts)))
+        return self.series[symbol]
+
+    def window(self, symbol, start_ts, end_ts):
+        cols = self.candles(symbol)
+        a, b = np.searchsorted(cols[0], start_ts), np.searchsorted(cols[0], end_ts, side="right")
+        return [c[a:b] for c in cols]
+
+# --- DỊCH VỤ GIẢ (thay HTTPAdapter.send của requests + module ccxt) ---
+class FakeServices:
+    def __init__(self, market, n_symbols):
+        self.market = market
+        self.campaigns = [(f"Bench {i}", "Crypto" if i % 2 else "Stock", f"C{i:03d}" if i % 2 else f"S{i:03d}", 5000 if i % 2 else 100_000_000)
+                          for i in range(n_symbols)]
+        self.pages = []
+        self.counts = {}
+
+    def _count(self, key): self.counts[key] = self.counts.get(key, 0) + 1
+
+    def entrade(self, q):
+        self._count("entrade")
+        ts, o, h, l, c, v = self.market.window(q["symbol"], int(q["from"]), int(q["to"]))
+        return {"t": ts.tolist(), "o": o.tolist(), "h": h.tolist(), "l": l.tolist(), "c": c.tolist(), "v": v.tolist()}
+
+    def notion_query(self, db, body):
+        self._count("notion_query")
+        if db == FAKE_ENV["CONFIG_DB_ID"]:
+            return {"results": [{"id": f"bench-{sym}", "properties": {"Tên Chiến Dịch": {"title": [{"plain_text": n}]}, "Sàn Giao Dịch": {"select": {"name": m}},
+                                 "Mã Tài Sản": {"rich_text": [{"plain_text": sym}]}, "Vốn Ban Đầu": {"number": cap}}} for n, m, sym, cap in self.campaigns],
+                    "has_more": False}
+        f = body.get("filter", {})
+        conds = f.get("and", [f])
+        sym = next((c["rich_text"]["contains"] for c in conds if "rich_text" in c), "")
+        since = next((c["date"]["on_or_after"] for c in conds if "date" in c), "")
+        rows = sorted((p for p in self.pages if sym in p["properties"]["Mã"]["rich_text"][0]["plain_text"]
+                       and p["properties"]["Giờ Giao Dịch"]["date"]["start"] >= since), key=lambda p: p["properties"]["Giờ Giao Dịch"]["date"]["start"])
+        off = int(body.get("start_cursor") or 0)
+        more = off + body.get("page_size", 100) < len(rows)
+        return {"results": rows[off:off + body.get("page_size", 100)], "has_more": more, "next_cursor": str(off + 100) if more else None}
+
+    def notion_page(self, body):
+        self._count("notion_page")
+        for prop in ("Thời Gian", "Mã"):
+            for part in body["properties"][prop].get("title") or body["properties"][prop].get("rich_text"): part["plain_text"] = part["text"]["content"]
+        self.pages.append(body)
+        return {"object": "page", "id": str(len(self.pages))}
+
+    def handle(self, method, url, body):
+        u = urlparse(url)
+        if "entrade" in u.netloc: return self.entrade({k: v[0] for k, v in parse_qs(u.query).items()})
+        if "telegram" in u.netloc:
+            self._count("telegram")
+            return {"ok": True, "result": [] if u.path.endswith("getUpdates") else {}}
+        if "notion" in u.netloc:
+            parts = u.path.strip("/").split("/")
+            if parts[-1] == "query": return self.notion_query(parts[-2].replace("-", ""), body or {})
+            if parts[-1] == "pages": return self.notion_page(body)
+        return None
+
+    def install(self):
+        import requests
+        services = self
+
+        def send(adapter, request, **kwargs):
+            body = json.loads(request.body) if request.body else None
+            data = services.handle(request.method, request.url, body)
+            resp = requests.Response()
+            resp.status_code, resp.url, resp.request, resp.encoding = (200 if data is not None else 404), request.url, request, "utf-8"
+            resp._content = json.dumps(data if data is not None else {"message": "not found"}, ensure_ascii=False).encode()
+            resp.headers["Content-Type"] = "application/json"
+            return resp
+        requests.adapters.HTTPAdapter.send = send
+
+        class FakeKucoin:
+            def __init__(self, *a, **k): self.markets, self.currencies = None, None
+            # Như ccxt: fetch_ohlcv tự tải danh sách thị trường nếu instance chưa có
+            def load_markets(self, reload=False, params=None):
+                if self.markets is None or reload:
+                    services._count("ccxt_markets")
+                    self.markets, self.currencies = {f"{s}/USDT": {"symbol": f"{s}/USDT"} for _, _, s, _ in services.campaigns}, {"USDT": {}}
+                return self.markets
+            def set_markets(self, markets, currencies=None): self.markets, self.currencies = markets, currencies
+            def fetch_ohlcv(self, pair, timeframe="1h", since=None, limit=500, params=None):
+                self.load_markets()
+                services._count("ccxt")
+                frm = since // 1000 if since else services.market.end - (limit - 1) * 3600
+                ts, o, h, l, c, v = services.market.window(pair, frm, services.market.end)
+                return [[int(t) * 1000, a, b, d, e, f] for t, a, b, d, e, f in zip(ts[:limit].tolist(), o.tolist(), h.tolist(), l.tolist(), c.tolist(), v.tolist())]
+        sys.modules["ccxt"] = types.SimpleNamespace(kucoin=FakeKucoin)
+
+# --- ĐO ---
+def timed(results, name, fn, **scale):
+    t0 = time.perf_counter()
+    out = fn()
+    results.append({"name": name, **scale, "seconds": round(time.perf_counter() - t0, 4)})
+    print(f"⏱ {name:<24} {json.dumps(scale):<32} {results[-1]['seconds']:>8.3f}s")
+    return out
+
+def _quiet(fn):
+    def run():
+        with open(os.devnull, "w") as devnull:
+            saved, sys.stdout = sys.stdout, devnull
+            try: return fn()
+            finally: sys.stdout = saved
+    return run
+
+def run_child(args):
+    results = []
+    market = FakeMarket(history_hours=(max(args.days) + 30) * 24)
+    services = FakeServices(market, args.symbols[0])
+    services.install()
+    sys.path.insert(0, HERE)
+
+    # Lượt chạy đầy đủ (nạp module, bảng tín hiệu, lịch quẻ, tải dữ liệu, ghi Notion) với cache trống
+    def cold_pass():
+        import main
+        main.main([])
+        return main
+    g = timed(results, "hourly_pass_cold", _quiet(cold_pass), symbols=args.symbols[0])
+    from signal_table import load_signal_table
+    signals = load_signal_table()
+    timed(results, "hourly_pass_warm", _quiet(lambda: g.run_hourly_pass(signals)), symbols=args.symbols[0])
+
+    configs = services.notion_query(FAKE_ENV["CONFIG_DB_ID"], {})["results"]
+    for cfg in configs[:2]:
+        sym = cfg["properties"]["Mã Tài Sản"]["rich_text"][0]["plain_text"]
+        g.REBUILD_STATE = True
+        timed(results, "run_campaign_bootstrap", _quiet(lambda: g.run_campaign(cfg)), symbol=sym)
+        g.REBUILD_STATE = False
+        timed(results, "run_campaign_checkpoint", _quiet(lambda: g.run_campaign(cfg)), symbol=sym)
+    g.notion.flush()
+    from backtest import run_backtest_core
+
+    for days in (args.days if args.backtest else []):
+        for sym in ("S900", "C900USDT"):
+            for engine in ("vector", "loop"):
+                for phase in ("cold", "warm") if engine == "vector" else ("warm",):
+                    timed(results, f"backtest_{engine}_{phase}", _quiet(lambda: run_backtest_core(sym, days, signals, engine, use_cache=False)),
+                          symbol=sym, days=days)
+            run_backtest_core(sym, days, signals)
+            timed(results, "backtest_cache_hit", _quiet(lambda: run_backtest_core(sym, days, signals)), symbol=sym, days=days)
+    if args.backtest:
+        from walk_forward import run_walk_forward_report
+        for sym in ("S900", "C900USDT"):
+            timed(results, "walk_forward", _quiet(lambda: run_walk_forward_report(sym, signals, 90, max(args.days))), symbol=sym,
+                  horizon=90, span=max(args.days))
+        from monte_carlo import run_monte_carlo_report
+        for sym in ("S900", "C900USDT"):
+            timed(results, "monte_carlo", _quiet(lambda: run_monte_carlo_report(sym, max(args.days), signals, 10000)), symbol=sym,
+                  days=max(args.days), paths=10000)
+        from portfolio_backtest import run_portfolio_report
+        assets = g.campaign_assets()
+        for mode in ("shared", "independent"):
+            timed(results, "portfolio", _quiet(lambda: run_portfolio_report(assets, max(args.days), signals, mode)), assets=len(assets),
+                  days=max(args.days), cash=mode)
+    return {"results": results, "requests": services.counts}
+
+# Khởi động nguội trong tiến trình mới: import main + bảng tín hiệu + lịch quẻ; kiểm tra ccxt/pandas chưa bị nạp
+STARTUP_SNIPPET = (
+    "import time, sys, json; t0 = time.perf_counter(); import main; t1 = time.perf_counter();"
+    "from signal_table import load_signal_table; from hexagram_calendar import load_calendar; load_signal_table(); load_calendar();"
+    "print(json.dumps({'import_s': round(t1 - t0, 4), 'ready_s': round(time.perf_counter() - t0, 4), 'budget_s': main.STARTUP_BUDGET_S,"
+    "'heavy_loaded': [m for m in ('ccxt', 'pandas') if m in sys.modules]}))"
+)
+
+def measure_startup(cache_dir):
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", STARTUP_SNIPPET], cwd=HERE, check=True, capture_output=True, text=True,
+                          env={**os.environ, **FAKE_ENV, "BOT_CACHE_DIR": cache_dir})
+    return {**json.loads(proc.stdout.strip().splitlines()[-1]), "process_s": round(time.perf_counter() - t0, 4)}
+
+def compare(new, old_path):
+    old = {(r["name"], json.dumps({k: v for k, v in r.items() if k not in ("name", "seconds")}, sort_keys=True)): r["seconds"]
+           for r in json.load(open(old_path, encoding="utf-8"))["results"]}
+    print(f"\n📈 So sánh với {old_path}:")
+    for r in new["results"]:
+        key = (r["name"], json.dumps({k: v for k, v in r.items() if k not in ("name", "seconds")}, sort_keys=True))
+        if key in old and old[key] > 0:
+            ratio = r["seconds"] / old[key]
+            print(f"   {'🔴' if ratio > 1.2 else '🟢' if ratio < 0.8 else '⚪'} {r['name']:<24} {key[1]:<40} {old[key]:>8.3f}s -> {r['seconds']:>8.3f}s ({ratio:.2f}x)")
+
+def git_version():
+    try: return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError: return None
+
+def parse_ints(text): return [int(x) for x in text.split(",") if x]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline cho bot (dữ liệu giả, không cần mạng)")
+    parser.add_argument("--symbols", type=parse_ints, default=[3, 10], help="số chiến dịch, VD 3,10")
+    parser.add_argument("--days", type=parse_ints, default=[30, 365], help="số ngày backtest, VD 30,365")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="file kết quả cũ để so sánh")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--no-backtest", dest="backtest", action="store_false", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print("BENCH_RESULT " + json.dumps(run_child(args)))
+        sys.exit(0)
+
+    report = {"version": git_version(), "python": platform.python_version(), "machine": platform.machine(), "timestamp": int(time.time()),
+              "startup": {}, "results": [], "requests": {}}
+    with tempfile.TemporaryDirectory(prefix="bench-cache-") as cache:
+        measure_startup(cache)   # Lần đầu dựng lịch quẻ + bảng tín hiệu vào cache
+        report["startup"] = st = measure_startup(cache)
+    report["results"].append({"name": "startup_ready", "seconds": st["ready_s"]})
+    print(f"⏱ {'startup_ready':<24} {json.dumps({'import_s': st['import_s']}):<32} {st['ready_s']:>8.3f}s "
+          f"{'⚠️ vượt ngân sách' if st['ready_s'] > st['budget_s'] else '✅'} {st['budget_s']:.1f}s, nạp sẵn: {st['heavy_loaded'] or 'không'}")
+    # Mỗi quy mô chạy trong một tiến trình riêng với cache trống để kết quả độc lập
+    for i, n in enumerate(args.symbols):
+        with tempfile.TemporaryDirectory(prefix="bench-cache-") as cache:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--symbols", str(n), "--days", ",".join(map(str, args.days))] + ([] if i == 0 else ["--no-backtest"]),
+                                  cwd=HERE, env={**os.environ, **FAKE_ENV, "BOT_CACHE_DIR": cache}, capture_output=True, text=True)
+            sys.stdout.write("".join(line + "\n" for line in proc.stdout.splitlines() if line.startswith("⏱")))
+            line = next((l for l in proc.stdout.splitlines() if l.startswith("BENCH_RESULT ")), None)
+            if proc.returncode != 0 or not line:
+                print(f"❌ Benchmark lỗi (symbols={n}):\n{proc.stderr[-2000:]}")
+                sys.exit(1)
+            child = json.loads(line[len("BENCH_RESULT "):])
+            report["results"] += child["results"]
+            report["requests"][str(n)] = child["requests"]
+
+    with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"✅ Đã ghi {args.out}")
+    if args.compare: compare(report, args.compare)
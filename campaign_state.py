@@ -0,0 +1,25 @@
+import os
+import re
+import json
+import threading
+
+from hexagram_calendar import CACHE_DIR
+
+# --- CHECKPOINT DANH MỤC THEO CHIẾN DỊCH ---
+# Mỗi chiến dịch một file JSON: tiền mặt, vị thế, giá vốn, nến đã đóng cuối cùng và trạng thái chỉ báo streaming
+STATE_DIR = os.path.join(CACHE_DIR, "campaign_state")
+
+def state_path(campaign_id):
+    return os.path.join(STATE_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', str(campaign_id)) + ".json")
+
+def load_campaign_state(campaign_id):
+    try:
+        with open(state_path(campaign_id), encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def save_campaign_state(campaign_id, state):
+    path = state_path(campaign_id)
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import numpy as np
+
+from hexagram_calendar import VN_TZ
+
+# --- CHUỖI NẾN DẠNG CỘT ---
+# Mỗi cột một mảng liên tục (ts int64 giây, OHLCV float64) ~48 byte/nến thay cho list dict + datetime.
+# Cắt lát (series[-48:]) trả về view, không sao chép dữ liệu.
+ROW_DTYPE = np.dtype([("ts", np.int64), ("o", np.float64), ("h", np.float64), ("l", np.float64), ("c", np.float64), ("v", np.float64)])
+
+class CandleSeries:
+    __slots__ = ("ts", "open", "high", "low", "close", "volume")
+
+    def __init__(self, ts, open, high, low, close, volume):
+        self.ts, self.open, self.high, self.low, self.close, self.volume = ts, open, high, low, close, volume
+
+    # rows: iterable (ts, o, h, l, c, v) — list tuple hoặc con trỏ SQLite (đọc từng dòng, không giữ list)
+    @classmethod
+    def from_rows(cls, rows, count=-1):
+        table = np.fromiter(rows, dtype=ROW_DTYPE, count=count)
+        return cls(*(np.ascontiguousarray(table[name]) for name in ROW_DTYPE.names))
+
+    @classmethod
+    def empty(cls):
+        return cls.from_rows([], 0)
+
+    def __len__(self): return len(self.ts)
+
+    def __getitem__(self, idx):
+        if not isinstance(idx, slice): raise TypeError("CandleSeries chỉ hỗ trợ cắt lát; dùng .ts[i] / .close[i] cho từng nến")
+        return CandleSeries(self.ts[idx], self.open[idx], self.high[idx], self.low[idx], self.close[idx], self.volume[idx])
+
+    def datetime_at(self, i):
+        return datetime.fromtimestamp(int(self.ts[i]), tz=VN_TZ)
+
+    def closed_count(self, now_ts, step=3600):
+        return int(np.searchsorted(self.ts, now_ts - step, side="right"))
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import threading
+
+from hexagram_calendar import CACHE_DIR
+from candle_series import CandleSeries
+from concurrency import lazy_singleton
+
+# --- KHO NẾN CỤC BỘ (SQLite) ---
+# Bảng candles giữ OHLCV theo (nguồn:mã, khung giờ, ts giây); bảng coverage ghi lại các
+# khoảng thời gian đã hỏi API xong -> phần còn thiếu (đuôi mới, lỗ hổng, đầu lịch sử) được tải bù.
+CANDLE_DB = os.path.join(CACHE_DIR, "candles.sqlite")
+TIMEFRAME_SEC = {"1h": 3600, "2h": 7200, "4h": 14400, "1d": 86400}   # Khung lớn được gộp từ 1h (resample.py)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS candles (
+    symbol TEXT NOT NULL, timeframe TEXT NOT NULL, ts INTEGER NOT NULL,
+    o REAL, h REAL, l REAL, c REAL NOT NULL, v REAL,
+    PRIMARY KEY (symbol, timeframe, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    symbol TEXT NOT NULL, timeframe TEXT NOT NULL, start_ts INTEGER NOT NULL, end_ts INTEGER NOT NULL,
+    PRIMARY KEY (symbol, timeframe, start_ts)
+) WITHOUT ROWID;
+"""
+
+class CandleStore:
+    def __init__(self, path=CANDLE_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(_SCHEMA)
+
+    def read_series(self, symbol, timeframe, start_ts, end_ts):
+        with self.lock:
+            cur = self.conn.execute("SELECT ts, o, h, l, c, v FROM candles WHERE symbol=? AND timeframe=? AND ts BETWEEN ? AND ? ORDER BY ts",
+                                    (symbol, timeframe, start_ts, end_ts))
+            return CandleSeries.from_rows(cur)
+
+    def write(self, symbol, timeframe, rows):
+        if not rows: return
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [(symbol, timeframe, int(r[0]), r[1], r[2], r[3], r[4], r[5]) for r in rows])
+
+    def coverage(self, symbol, timeframe):
+        with self.lock:
+            return self.conn.execute("SELECT start_ts, end_ts FROM coverage WHERE symbol=? AND timeframe=? ORDER BY start_ts",
+                                     (symbol, timeframe)).fetchall()
+
+    def mark_covered(self, symbol, timeframe, start_ts, end_ts):
+        step = TIMEFRAME_SEC.get(timeframe, 1)
+        with self.lock, self.conn:
+            merged = []
+            for a, b in sorted(self.coverage(symbol, timeframe) + [(start_ts, end_ts)]):
+                if merged and a <= merged[-1][1] + step: merged[-1][1] = max(merged[-1][1], b)
+                else: merged.append([a, b])
+            self.conn.execute("DELETE FROM coverage WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+            self.conn.executemany("INSERT INTO coverage VALUES (?, ?, ?, ?)", [(symbol, timeframe, a, b) for a, b in merged])
+
+    # Các khoảng [a, b] trong [start_ts, end_ts] chưa từng được tải
+    def missing_ranges(self, symbol, timeframe, start_ts, end_ts):
+        step = TIMEFRAME_SEC.get(timeframe, 1)
+        missing, cur = [], start_ts
+        for a, b in self.coverage(symbol, timeframe):
+            if b < cur: continue
+            if a > end_ts: break
+            if a > cur: missing.append((cur, a - step))
+            cur = max(cur, b + step)
+        if cur <= end_ts: missing.append((cur, end_ts))
+        return missing
+
+    def clear(self, symbol, timeframe):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM candles WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+            self.conn.execute("DELETE FROM coverage WHERE symbol=? AND timeframe=?", (symbol, timeframe))
+
+get_store = lazy_singleton(CandleStore)
@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from run_profile import profile
+
+# --- GIỚI HẠN SONG SONG THEO HOST ---
+# Ghi đè bằng biến môi trường, VD: HOST_LIMITS="api.notion.com=3,kucoin=2"
+HOST_LIMITS = {"api.notion.com": 3, "api.telegram.org": 2, "services.entrade.com.vn": 4, "kucoin": 2}
+DEFAULT_HOST_LIMIT = 4
+
+for item in filter(None, os.environ.get("HOST_LIMITS", "").split(",")):
+    host, _, limit = item.partition("=")
+    if limit.strip().isdigit(): HOST_LIMITS[host.strip()] = int(limit)
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+def _host_semaphore(host):
+    with _semaphores_lock:
+        if host not in _semaphores: _semaphores[host] = threading.BoundedSemaphore(max(1, HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT)))
+        return _semaphores[host]
+
+class _Slot:
+    nbytes = 0
+
+# Giữ 1 suất của host; đo độ trễ request (không tính thời gian chờ suất). Ghi slot.nbytes nếu biết kích thước phản hồi
+@contextmanager
+def host_slot(host, label=None):
+    sem = _host_semaphore(host)
+    with sem:
+        slot, error, t0 = _Slot(), False, time.perf_counter()
+        try: yield slot
+        except BaseException:
+            error = True
+            raise
+        finally: profile.record_request(label or host, time.perf_counter() - t0, slot.nbytes, error)
+
+# --- CHẠY SONG SONG, GIỮ NGUYÊN THỨ TỰ KẾT QUẢ ---
+def run_parallel(fn, items, workers):
+    items = list(items)
+    if workers <= 1 or len(items) <= 1: return [fn(x) for x in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+# --- POOL TIẾN TRÌNH (spawn) ---
+# Không fork: daemon có thể đang giữ khóa SQLite / session HTTP trong luồng khác lúc lệnh Telegram tạo pool
+def process_pool(workers, initializer=None, initargs=()):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=initializer, initargs=initargs)
+
+# Dữ liệu dùng chung của worker, nạp một lần cho mỗi tiến trình: process_pool(n, init_worker, (tên, ctx));
+# chạy tuần tự thì gọi thẳng init_worker(tên, ctx). Khóa theo tên để sweep / Monte Carlo không ghi đè nhau
+_worker_ctx = {}
+
+def init_worker(name, ctx): _worker_ctx[name] = ctx
+
+def worker_ctx(name): return _worker_ctx[name]
+
+# --- INSTANCE DÙNG CHUNG, TẠO KHI CẦN ---
+# Lần gọi đầu có thể đến từ nhiều luồng chiến dịch cùng lúc -> khóa kiểm tra hai lần, chỉ gọi factory một lần
+def lazy_singleton(factory):
+    instance, lock = [], threading.Lock()
+    def get():
+        if not instance:
+            with lock:
+                if not instance: instance.append(factory())
+        return instance[0]
+    return get
+
+# --- TOKEN BUCKET: giới hạn tốc độ (request/giây) dùng chung giữa các luồng ---
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,28 @@
+import os
+import sys
+import tempfile
+import threading
+
+# Cache riêng cho lượt test (đặt trước khi nạp module của bot: CACHE_DIR đọc lúc import)
+os.environ.setdefault("BOT_CACHE_DIR", tempfile.mkdtemp(prefix="kdb_test_"))
+os.environ["BACKTEST_CACHE"] = "0"
+
+import pytest
+import requests
+
+# --- DỊCH VỤ GIẢ (dùng lại của benchmark.py): Entrade, ccxt, Notion, Telegram chạy trong tiến trình ---
+@pytest.fixture
+def fake_services(monkeypatch):
+    import benchmark
+    import market_data
+    saved_send, saved_ccxt = requests.adapters.HTTPAdapter.send, sys.modules.get("ccxt")
+    services = benchmark.FakeServices(benchmark.FakeMarket(history_hours=40 * 24), 3)
+    services.install()
+    # Instance ccxt giữ theo luồng -> tạo lại để trỏ vào dịch vụ giả của test này
+    monkeypatch.setattr(market_data, "_local", threading.local())
+    monkeypatch.setattr(market_data, "_markets", None)
+    try: yield services
+    finally:
+        requests.adapters.HTTPAdapter.send = saved_send
+        if saved_ccxt is None: sys.modules.pop("ccxt", None)
+        else: sys.modules["ccxt"] = saved_ccxt
@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import time
+import threading
+
+import numpy as np
+
+from concurrency import lazy_singleton
+from hexagram_calendar import CACHE_DIR
+
+# --- KHO CHUỖI THỜI GIAN TÀI SẢN THEO CHIẾN DỊCH (cục bộ, chỉ ghi thêm) ---
+# Mỗi lượt chạy ghi thêm các nến vừa xử lý (NAV, tiền mặt, vị thế, giá, ROI, lệnh, quẻ) vào tail.bin (bản ghi nhị phân
+# cố định); vượt ngưỡng thì gộp vào base.npz (mỗi cột một mảng). Nến trùng ts giữ bản ghi mới nhất (nến đang chạy
+# được xử lý lại ở lượt sau). Bản tin sáng / báo cáo hiệu suất / drawdown đọc từ đây, Notion chỉ còn là bản sao để ghi.
+EQUITY_DIR = os.path.join(CACHE_DIR, "equity")
+COMPACT_ROWS = int(os.environ.get("EQUITY_COMPACT_ROWS", 512))
+ROW_DTYPE = np.dtype([("ts", "<i8"), ("equity", "<f8"), ("cash", "<f8"), ("position", "<f8"), ("price", "<f8"),
+                      ("roi", "<f8"), ("action", "i1"), ("code", "<i2")])
+COLUMNS = ROW_DTYPE.names
+ACTION_CODES = {"MUA": 1, "BÁN": 2, "✂️ CẮT LỖ": 3, "💵 CHỐT LỜI": 4}   # Còn lại (giữ / không mua) = 0
+ACTION_LABELS = {1: "MUA", 2: "BÁN", 3: "CẮT LỖ", 4: "CHỐT LỜI"}
+RESET_KEYS = ("symbol", "capital", "timeframe")   # Đổi một trong các khóa này = chiến dịch mới -> xóa chuỗi cũ
+
+def action_code(display_label): return ACTION_CODES.get(display_label, 0)
+
+class EquityStore:
+    def __init__(self, root=EQUITY_DIR):
+        self.root = root
+        self.lock = threading.RLock()
+
+    def _dir(self, campaign_id):
+        return os.path.join(self.root, re.sub(r'[^A-Za-z0-9_.-]', '_', str(campaign_id)))
+
+    def _write_atomic(self, path, write_fn):
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "wb") as f: write_fn(f)
+        os.replace(tmp, path)
+
+    def meta(self, campaign_id):
+        try:
+            with open(os.path.join(self._dir(campaign_id), "meta.json"), encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError): return None
+
+    # Ghi thông tin chiến dịch; trả về True nếu chuỗi cũ bị xóa vì chiến dịch đã đổi mã / vốn / khung giờ
+    def set_meta(self, campaign_id, meta):
+        with self.lock:
+            old = self.meta(campaign_id)
+            reset = bool(old) and any(old.get(k) != meta.get(k) for k in RESET_KEYS)
+            if reset: self.clear(campaign_id)
+            if old == meta: return False
+            os.makedirs(self._dir(campaign_id), exist_ok=True)
+            self._write_atomic(os.path.join(self._dir(campaign_id), "meta.json"),
+                               lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+            return reset
+
+    def append(self, campaign_id, rows):
+        if not rows: return
+        with self.lock:
+            folder = self._dir(campaign_id)
+            os.makedirs(folder, exist_ok=True)
+            tail = os.path.join(folder, "tail.bin")
+            with open(tail, "ab") as f:
+                f.truncate(f.tell() - f.tell() % ROW_DTYPE.itemsize)   # Cắt bản ghi ghi dở để các bản ghi sau không bị lệch
+                np.array(rows, dtype=ROW_DTYPE).tofile(f)
+            if os.path.getsize(tail) >= COMPACT_ROWS * ROW_DTYPE.itemsize: self.compact(campaign_id)
+
+    def _load(self, campaign_id):
+        folder = self._dir(campaign_id)
+        parts = []
+        try:
+            with np.load(os.path.join(folder, "base.npz")) as base:
+                block = np.empty(len(base["ts"]), dtype=ROW_DTYPE)
+                for name in COLUMNS: block[name] = base[name]
+                parts.append(block)
+        except (OSError, KeyError, ValueError): pass
+        try:
+            raw = np.fromfile(os.path.join(folder, "tail.bin"), dtype=np.uint8)
+            parts.append(raw[:len(raw) - len(raw) % ROW_DTYPE.itemsize].view(ROW_DTYPE))   # Bỏ bản ghi ghi dở khi bị ngắt
+        except OSError: pass
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=ROW_DTYPE)
+        # Sắp theo ts, ts trùng giữ bản ghi ghi sau cùng
+        order = np.argsort(rows["ts"], kind="stable")
+        rows = rows[order]
+        keep = np.append(rows["ts"][1:] != rows["ts"][:-1], True) if len(rows) else np.empty(0, dtype=bool)
+        return rows[keep]
+
+    # Gộp tail vào base: ghi base mới trước rồi mới xóa tail -> ngắt giữa chừng chỉ để lại bản ghi trùng, không mất dữ liệu
+    def compact(self, campaign_id):
+        with self.lock:
+            folder = self._dir(campaign_id)
+            rows = self._load(campaign_id)
+            self._write_atomic(os.path.join(folder, "base.npz"), lambda f: np.savez(f, **{name: rows[name] for name in COLUMNS}))
+            open(os.path.join(folder, "tail.bin"), "wb").close()
+            return len(rows)
+
+    # Cột NumPy của chiến dịch trong [start_ts, end_ts]
+    def read(self, campaign_id, start_ts=None, end_ts=None):
+        with self.lock: rows = self._load(campaign_id)
+        lo = 0 if start_ts is None else np.searchsorted(rows["ts"], start_ts)
+        hi = len(rows) if end_ts is None else np.searchsorted(rows["ts"], end_ts, side="right")
+        return {name: rows[name][lo:hi] for name in COLUMNS}
+
+    def campaigns(self):
+        if not os.path.isdir(self.root): return []
+        found = []
+        for name in sorted(os.listdir(self.root)):
+            meta = self.meta(name)
+            if meta: found.append((meta.get("id", name), meta))
+        return found
+
+    def find(self, query):
+        q = query.lower()
+        return [(cid, m) for cid, m in self.campaigns() if q in str(m.get("symbol", "")).lower() or q in str(m.get("name", "")).lower()]
+
+    def clear(self, campaign_id):
+        with self.lock:
+            for name in ("base.npz", "tail.bin"):
+                path = os.path.join(self._dir(campaign_id), name)
+                if os.path.exists(path): os.remove(path)
+
+get_equity_store = lazy_singleton(EquityStore)
+
+# --- PHÂN TÍCH ---
+def period_stats(cols):
+    equity = cols["equity"]
+    if not len(equity): return None
+    peak = np.maximum.accumulate(equity)
+    drawdown = np.where(peak > 0, equity / peak - 1, 0.0)
+    exposure = np.where(equity > 0, cols["position"] * cols["price"] / equity, 0.0)
+    actions = cols["action"]
+    return {
+        "start_ts": int(cols["ts"][0]), "end_ts": int(cols["ts"][-1]), "candles": len(equity),
+        "start_equity": float(equity[0]), "end_equity": float(equity[-1]), "change": float(equity[-1] / equity[0] - 1) if equity[0] else 0.0,
+        "roi": float(cols["roi"][-1]), "max_drawdown": float(drawdown.min()), "current_drawdown": float(drawdown[-1]),
+        "exposure_avg": float(exposure.mean()), "holding": bool(cols["position"][-1] > 0),
+        "trades": {label: int((actions == code).sum()) for code, label in ACTION_LABELS.items()},
+    }
+
+# Thay đổi NAV của chiến dịch so với hours giờ trước (cho bản tin sáng)
+def equity_change(store, campaign_id, hours=24, now_ts=None):
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    cols = store.read(campaign_id, now_ts - hours * 3600 - 3600, now_ts)
+    stats = period_stats(cols)
+    return stats["change"] if stats and stats["candles"] > 1 else None
+
+def _money(value, meta):
+    return f"{value:,.2f} $" if meta.get("type") == "CRYPTO" else f"{value:,.0f} đ"
+
+def format_equity_report(store, query, days=30, now_ts=None):
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    matches = store.find(query) if query else store.campaigns()
+    if not matches: return f"❌ Không có dữ liệu tài sản cục bộ cho: {query or 'chiến dịch nào'}"
+    fmt_day = lambda ts: time.strftime("%d/%m", time.gmtime(ts + 7 * 3600))
+    blocks = []
+    for cid, meta in matches:
+        s = period_stats(store.read(cid, now_ts - days * 86400, now_ts))
+        title = f"📈 <b>{meta.get('name', cid)} ({meta.get('symbol', '?')})</b>"
+        if not s:
+            blocks.append(f"{title}\n   Chưa có dữ liệu {days} ngày gần nhất.")
+            continue
+        trades = ", ".join(f"{k} {v}" for k, v in s["trades"].items() if v) or "không có"
+        blocks.append(
+            f"{title} - {days} ngày ({fmt_day(s['start_ts'])} → {fmt_day(s['end_ts'])})\n"
+            f"💰 NAV: {_money(s['start_equity'], meta)} → <b>{_money(s['end_equity'], meta)}</b> ({s['change']:+.2%})\n"
+            f"📊 ROI từ đầu: {s['roi']:+.2%} | Vị thế: {'✊ Đang giữ' if s['holding'] else '⚪ Full Cash'}\n"
+            f"📉 MaxDD kỳ: {s['max_drawdown']:.2%} | DD hiện tại: {s['current_drawdown']:.2%}\n"
+            f"🔁 Lệnh: {trades} | Tỷ trọng TB: {s['exposure_avg']:.0%}"
+        )
+    return "\n\n".join(blocks)
+
+def format_drawdown_report(store, days=30, now_ts=None):
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    rows = []
+    for cid, meta in store.campaigns():
+        s = period_stats(store.read(cid, now_ts - days * 86400, now_ts))
+        if s: rows.append((meta.get("symbol", cid), s))
+    if not rows: return "❌ Chưa có dữ liệu tài sản cục bộ."
+    rows.sort(key=lambda r: r[1]["max_drawdown"])
+    lines = [f"{'Mã':<10}{'Kỳ':>9}{'MaxDD':>9}{'DD nay':>9}"]
+    for symbol, s in rows:
+        lines.append(f"{symbol[:10]:<10}{s['change']:>+9.1%}{s['max_drawdown']:>9.1%}{s['current_drawdown']:>9.1%}")
+    return f"📉 <b>DRAWDOWN {days} NGÀY</b> ({len(rows)} chiến dịch)\n<pre>" + "\n".join(lines) + "</pre>"
+
+# "eq [TÊN|MÃ] [NGÀY]" / "dd [NGÀY]"
+def parse_report_args(parts, default_days=30):
+    parts = list(parts)
+    days = int(parts.pop()) if parts and parts[-1].isdigit() else default_days
+    if days <= 0: raise ValueError("Số ngày phải > 0")
+    return " ".join(parts), days
@@ -0,0 +1,136 @@
+import os
+import threading
+import sys
+import struct
+import numpy as np
+from datetime import datetime, date, timezone, timedelta
+
+# --- THƯ VIỆN ---
+try:
+    from lunardate import LunarDate
+except ImportError:
+    pass
+
+# --- CẤU HÌNH LỊCH QUẺ ---
+CACHE_DIR = os.environ.get("BOT_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CALENDAR_START_YEAR = int(os.environ.get("HEX_CALENDAR_START", 2015))
+CALENDAR_END_YEAR = int(os.environ.get("HEX_CALENDAR_END", 2035))
+VN_TZ = timezone(timedelta(hours=7))
+VN_OFFSET_SEC = 7 * 3600
+CHI_SLOTS = 12
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# File nhị phân: header (magic, ordinal ngày đầu, số ngày) + mảng uint16 [số ngày x 12 giờ chi]
+_MAGIC = b"HEXCAL1\0"
+_HEADER = struct.Struct("<8sii")
+
+king_wen_matrix = [[1, 10, 13, 25, 44, 6, 33, 12], [43, 58, 49, 17, 28, 47, 31, 45], [14, 38, 30, 21, 50, 64, 56, 35], [34, 54, 55, 51, 32, 40, 62, 16], [9, 61, 37, 42, 57, 59, 53, 20], [5, 60, 63, 3, 48, 29, 39, 8], [26, 41, 22, 27, 18, 4, 52, 23], [11, 19, 36, 24, 46, 7, 15, 2]]
+new_trigram_map = {1:{1:5,2:3,3:2},2:{1:6,2:4,3:1},3:{1:7,2:1,3:4},4:{1:8,2:2,3:3},5:{1:1,2:7,3:6},6:{1:2,2:8,3:5},7:{1:3,2:5,3:8},8:{1:4,2:6,3:7}}
+
+# --- BẢNG MÃ QUẺ (384 tổ hợp Thượng x Hạ x Hào) ---
+def hexagram_key(thuong, ha, hao):
+    id_goc = king_wen_matrix[thuong-1][ha-1]
+    is_upper, line = hao>3, hao-3 if hao>3 else hao
+    target = thuong if is_upper else ha
+    new_trig = new_trigram_map[target][line]
+    new_thuong, new_ha = (new_trig, thuong) if is_upper else (thuong, new_trig)
+    return f"G{id_goc}-B{king_wen_matrix[new_thuong-1][new_ha-1]}"
+
+def key_code(thuong, ha, hao): return ((thuong-1)*8 + (ha-1))*6 + (hao-1)
+
+KEY_IDS = [hexagram_key(t, h, l) for t in range(1, 9) for h in range(1, 9) for l in range(1, 7)]
+KEY_INDEX = {k: i for i, k in enumerate(KEY_IDS)}
+
+def _lunar_base(year, month, day):
+    lunar = LunarDate.fromSolarDate(year, month, day)
+    return ((lunar.year - 1984)%12 + 1) + lunar.month + lunar.day
+
+def _code_from_base(base, chi):
+    return key_code(base%8 or 8, (base+chi)%8 or 8, (base+chi)%6 or 6)
+
+def _chi_of_hour(hour):
+    return 1 if hour==23 or hour==0 else ((hour+1)//2 + 1 if hour%2!=0 else hour//2 + 1)
+
+# Hàm gốc (giữ làm fallback cho ngày nằm ngoài bảng)
+def calculate_hexagram(dt):
+    if dt.hour == 23: dt_l = dt + timedelta(days=1)
+    else: dt_l = dt
+    base = _lunar_base(dt_l.year, dt_l.month, dt_l.day)
+    chi = _chi_of_hour(dt.hour)
+    thuong, ha = base%8 or 8, (base+chi)%8 or 8
+    hao = (base+chi)%6 or 6
+    return hexagram_key(thuong, ha, hao)
+
+# --- TẠO & LƯU BẢNG ---
+def calendar_path(start_year=CALENDAR_START_YEAR, end_year=CALENDAR_END_YEAR):
+    return os.path.join(CACHE_DIR, f"hex_calendar_{start_year}_{end_year}.bin")
+
+def build_calendar(start_year=CALENDAR_START_YEAR, end_year=CALENDAR_END_YEAR):
+    start_ord = date(start_year, 1, 1).toordinal()
+    n_days = date(end_year, 12, 31).toordinal() - start_ord + 1
+    table = np.empty((n_days, CHI_SLOTS), dtype=np.uint16)
+    for i in range(n_days):
+        d = date.fromordinal(start_ord + i)
+        base = _lunar_base(d.year, d.month, d.day)
+        table[i] = [_code_from_base(base, chi) for chi in range(1, CHI_SLOTS + 1)]
+    return start_ord, table
+
+def save_calendar(path, start_ord, table):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, start_ord, table.shape[0]))
+        f.write(np.ascontiguousarray(table, dtype="<u2").tobytes())
+    os.replace(tmp, path)
+
+def open_calendar(path):
+    with open(path, "rb") as f:
+        magic, start_ord, n_days = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC: raise ValueError(f"File lịch quẻ không hợp lệ: {path}")
+    table = np.memmap(path, dtype="<u2", mode="r", offset=_HEADER.size, shape=(n_days, CHI_SLOTS))
+    return start_ord, table
+
+class HexagramCalendar:
+    def __init__(self, start_ord, table):
+        self.start_ord, self.table = start_ord, table
+        self.n_days = table.shape[0]
+
+    # Tra cứu vector hóa: mảng epoch (giây) -> mảng mã quẻ, giờ tính theo UTC+7
+    def lookup_codes(self, epoch_sec):
+        ts = np.asarray(epoch_sec, dtype=np.int64)
+        local = ts + (VN_OFFSET_SEC + 3600)  # dời 1 tiếng để giờ Tý (23h-1h) rơi vào cùng một ngày
+        day = local // 86400 + (EPOCH_ORDINAL - self.start_ord)
+        slot = (local % 86400) // 7200
+        inside = (day >= 0) & (day < self.n_days)
+        codes = np.empty(ts.shape, dtype=np.int16)
+        codes[inside] = self.table[day[inside], slot[inside]]
+        for i in np.flatnonzero(~inside):
+            codes[i] = KEY_INDEX[calculate_hexagram(datetime.fromtimestamp(int(ts[i]), tz=VN_TZ))]
+        return codes
+
+_calendar = None
+
+def load_calendar(start_year=CALENDAR_START_YEAR, end_year=CALENDAR_END_YEAR):
+    global _calendar
+    if _calendar is not None: return _calendar
+    path = calendar_path(start_year, end_year)
+    try:
+        start_ord, table = open_calendar(path)
+    except (OSError, ValueError, struct.error):
+        print(f"📅 [BUILD LOG] Đang tạo lịch quẻ {start_year}-{end_year}...")
+        start_ord, table = build_calendar(start_year, end_year)
+        try:
+            save_calendar(path, start_ord, table)
+            start_ord, table = open_calendar(path)
+        except OSError as e: print(f"⚠️ [BUILD LOG] Không lưu được lịch quẻ: {e}")
+    _calendar = HexagramCalendar(start_ord, table)
+    return _calendar
+
+def lookup_codes(epoch_sec): return load_calendar().lookup_codes(epoch_sec)
+
+if __name__ == "__main__":
+    start_year = int(sys.argv[1]) if len(sys.argv) > 1 else CALENDAR_START_YEAR
+    end_year = int(sys.argv[2]) if len(sys.argv) > 2 else CALENDAR_END_YEAR
+    start_ord, table = build_calendar(start_year, end_year)
+    save_calendar(calendar_path(start_year, end_year), start_ord, table)
+    print(f"✅ Đã tạo lịch quẻ {start_year}-{end_year}: {table.shape[0]} ngày -> {calendar_path(start_year, end_year)}")
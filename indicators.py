@@ -0,0 +1,121 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# --- CHỈ BÁO SMA20 / RSI14 DẠNG STREAMING ---
+# Cộng dồn theo đúng thuật toán rolling mean của pandas (tổng Kahan, bù riêng khi thêm/bớt,
+# đếm số âm và chuỗi giá trị trùng) để kết quả khớp từng bit với add_technical_indicators cũ.
+SMA_WINDOW = 20
+RSI_WINDOW = 14
+
+class RollingMean:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.nobs, self.neg_ct, self.same_ct = 0, 0, 0
+        self.sum_x, self.comp_add, self.comp_remove = 0.0, 0.0, 0.0
+        self.prev_value = None
+
+    def _add(self, val):
+        self.nobs += 1
+        y = val - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0: self.neg_ct += 1
+        if self.prev_value is not None and val == self.prev_value: self.same_ct += 1
+        else: self.same_ct = 1
+        self.prev_value = val
+
+    def _remove(self, val):
+        self.nobs -= 1
+        y = -val - self.comp_remove
+        t = self.sum_x + y
+        self.comp_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, val) < 0: self.neg_ct -= 1
+
+    def update(self, val):
+        if len(self.values) == self.window: self._remove(self.values.popleft())
+        self.values.append(val)
+        self._add(val)
+        if self.nobs < self.window: return math.nan
+        result = self.sum_x / self.nobs
+        if self.same_ct >= self.nobs: result = self.prev_value
+        elif self.neg_ct == 0 and result < 0: result = 0.0
+        elif self.neg_ct == self.nobs and result > 0: result = 0.0
+        return result
+
+    def to_dict(self):
+        return {"window": self.window, "values": list(self.values), "nobs": self.nobs, "neg_ct": self.neg_ct, "same_ct": self.same_ct,
+                "sum_x": self.sum_x, "comp_add": self.comp_add, "comp_remove": self.comp_remove, "prev_value": self.prev_value}
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls(d["window"])
+        obj.values = deque(d["values"])
+        obj.nobs, obj.neg_ct, obj.same_ct = d["nobs"], d["neg_ct"], d["same_ct"]
+        obj.sum_x, obj.comp_add, obj.comp_remove, obj.prev_value = d["sum_x"], d["comp_add"], d["comp_remove"], d["prev_value"]
+        return obj
+
+def _rsi_from_means(gain, loss):
+    if math.isnan(gain) or math.isnan(loss): return 0.0
+    if loss == 0:
+        if gain == 0: return 0.0  # 0/0 -> NaN -> fillna(0)
+        return 100.0
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+class IndicatorState:
+    def __init__(self, sma_window=SMA_WINDOW, rsi_window=RSI_WINDOW):
+        self.sma = RollingMean(sma_window)
+        self.gain = RollingMean(rsi_window)
+        self.loss = RollingMean(rsi_window)
+        self.prev_price = None
+        self.count = 0
+
+    # Nạp 1 nến -> (SMA20, RSI); giá trị chưa đủ cửa sổ trả 0 như fillna(0)
+    def update(self, price):
+        price = float(price)
+        sma = self.sma.update(price)
+        delta = price - self.prev_price if self.prev_price is not None else math.nan
+        gain = delta if delta > 0 else 0.0
+        loss = -(delta if delta < 0 else 0.0)
+        rsi = _rsi_from_means(self.gain.update(gain), self.loss.update(loss))
+        self.prev_price = price
+        self.count += 1
+        return (0.0 if math.isnan(sma) else sma), rsi
+
+    # prices: mảng float64 (VD CandleSeries.close) -> (mảng SMA, mảng RSI)
+    def update_batch(self, prices):
+        sma_out, rsi_out = np.empty(len(prices)), np.empty(len(prices))
+        for i, p in enumerate(np.asarray(prices, dtype=np.float64).tolist()): sma_out[i], rsi_out[i] = self.update(p)
+        return sma_out, rsi_out
+
+    def to_dict(self):
+        return {"sma": self.sma.to_dict(), "gain": self.gain.to_dict(), "loss": self.loss.to_dict(),
+                "prev_price": self.prev_price, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls.__new__(cls)
+        obj.sma, obj.gain, obj.loss = RollingMean.from_dict(d["sma"]), RollingMean.from_dict(d["gain"]), RollingMean.from_dict(d["loss"])
+        obj.prev_price, obj.count = d["prev_price"], d["count"]
+        return obj
+
+# --- CHẾ ĐỘ BATCH (pandas rolling, vector hóa) cho backtest / sweep / walk-forward / Monte Carlo ---
+# Cùng thuật toán với RollingMean -> khớp từng bit với IndicatorState; streaming chỉ dùng cho cập nhật tăng dần của run_campaign
+def compute_indicators(prices, sma_window=SMA_WINDOW):
+    import pandas as pd
+    p = pd.Series(np.asarray(prices, dtype=np.float64))
+    sma = p.rolling(window=sma_window).mean()
+    delta = p.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=RSI_WINDOW).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=RSI_WINDOW).mean()
+    rsi = 100 - (100 / (1 + gain / loss))
+    return sma.fillna(0).to_numpy(), rsi.fillna(0).to_numpy()
+
+def compute_sma(prices, window):
+    import pandas as pd
+    return pd.Series(np.asarray(prices, dtype=np.float64)).rolling(window=window).mean().fillna(0).to_numpy()
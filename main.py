@@ -1,16 +1,15 @@
+import time
+_STARTED = time.perf_counter()
 import os
 import requests
-import pandas as pd
-import time
 import re
-import io
 import sys
 import math
+import threading
+import queue
 from datetime import datetime, timezone, timedelta
 
-# Import Module Backtest
-try: from backtest import run_backtest_core
-except ImportError: pass
+from notion_client import NotionClient
 
 # --- 1. CẤU HÌNH ---
 NOTION_TOKEN = os.environ.get("NOTION_TOKEN")
@@ -22,13 +21,18 @@ TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 # --- PARAMETERS ---
 STOP_LOSS_PCT = -0.07
 TAKE_PROFIT_PCT = 0.15
-USD_VND_RATE = 25300 
 FEE_CRYPTO = 0.001   # 0.1%
 FEE_STOCK = 0.0015   # 0.15%
-
-if not NOTION_TOKEN or not CONFIG_DB_ID or not LOG_DB_ID:
-    print("❌ [BUILD LOG] LỖI: Thiếu Notion Secrets.")
-    sys.exit(1)
+CAMPAIGN_WORKERS = int(os.environ.get("CAMPAIGN_WORKERS", 4))
+# Cờ dòng lệnh (--rebuild-state, --daemon, ...) được áp dụng trong main()
+REBUILD_STATE = os.environ.get("REBUILD_STATE") == "1"
+REBUILD_SIGNATURES = os.environ.get("REBUILD_SIGNATURES") == "1"
+COMMAND_MAX_AGE = 600   # Bỏ qua lệnh Telegram cũ hơn 10 phút
+# Chế độ daemon: chạy liên tục, long polling Telegram + tự lên lịch chạy chiến dịch (mặc định: chạy 1 lần theo cron)
+DAEMON_MODE = os.environ.get("BOT_DAEMON") == "1"
+SCHEDULE_MINUTE = int(os.environ.get("SCHEDULE_MINUTE", 5))   # Giống cron '5 * * * *'
+PROFILE_TELEGRAM = os.environ.get("PROFILE_TELEGRAM") == "1"
+STARTUP_BUDGET_S = float(os.environ.get("STARTUP_BUDGET_S", 1.5))   # Cảnh báo nếu khởi động (import + bảng tín hiệu + lịch quẻ) chậm hơn
 
 def extract_id(text):
     match = re.search(r'([a-f0-9]{32})', (text or "").replace("-", ""))
@@ -36,28 +40,33 @@ def extract_id(text):
 
 CONFIG_DB_ID = extract_id(CONFIG_DB_ID)
 LOG_DB_ID = extract_id(LOG_DB_ID)
-
-BACKUP_CSV = """KEY_ID,Lời Khuyên
-G1-B1,Đại cát đại lợi, thời cơ chín muồi. Nên mua tất tay.
-G1-B43,Nguy hiểm rình rập, bán tháo ngay lập tức.
-G1-B14,Vận khí tốt, có thể mua vào tích lũy.
-G23-B4,Mông lung xấu, nên hạ tỷ trọng bán bớt."""
-
-try:
-    import ccxt
-    from lunardate import LunarDate
-except ImportError: pass
+notion = None   # NotionClient, tạo trong main()
+
+from hexagram_calendar import CACHE_DIR, KEY_IDS, load_calendar
+from signal_table import ACTION_NAMES, load_signal_table
+from signal_schedule import get_signal_schedule
+from market_data import USD_VND_RATE, load_stock_candles, load_crypto_candles
+from concurrency import run_parallel
+from signature_index import get_signature_index, sync_signatures
+from campaign_state import load_campaign_state, save_campaign_state
+from equity_store import action_code, equity_change, get_equity_store
+from indicators import IndicatorState
+from candle_series import CandleSeries
+from resample import bar_start, parse_timeframe, pop_timeframe, timeframe_step
+from telegram_poller import POLL_TIMEOUT, TelegramPoller
+from telegram_sender import TelegramSender
+from run_profile import PROFILE_FILE, format_profile_summary, profile, span
+import numpy as np
 
 # --- UTILS ---
-def send_telegram_message(message):
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID: return
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "HTML"}
-        requests.post(url, json=payload, timeout=10)
-    except: pass
+# Tin nhắn đi qua hàng đợi nền (telegram_sender.py): chiến dịch không chờ Telegram, hàng đợi được xả khi thoát
+telegram = TelegramSender(TELEGRAM_TOKEN) if TELEGRAM_TOKEN else None
 
-def check_telegram_command(adv_map):
+def send_telegram_message(message, group=None):
+    if not telegram or not TELEGRAM_CHAT_ID: return
+    telegram.send(TELEGRAM_CHAT_ID, message, group)
+
+def check_telegram_command(signals):
     if not TELEGRAM_TOKEN: return
     print("📩 [BUILD LOG] Đang kiểm tra tin nhắn Telegram...")
     try:
@@ -69,109 +78,154 @@ def check_telegram_command(adv_map):
         msg_date = last_msg.get('message', {}).get('date', 0)
         text = last_msg.get('message', {}).get('text', '').strip()
         
-        if int(time.time()) - msg_date > 600: return
-
-        if text.lower().startswith('bp '):
-            try:
-                parts = text.split()
-                if len(parts) >= 2:
-                    symbol = parts[1].upper()
-                    days = int(parts[2]) if len(parts) > 2 else 90
-                    print(f"   -> ⚙️ Backtest: {symbol} ({days} ngày)")
-                    send_telegram_message(f"⏳ <b>Đang chạy Backtest cho {symbol}...</b>")
-                    report = run_backtest_core(symbol, days, adv_map)
-                    send_telegram_message(report)
-            except Exception as e:
-                send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+        if int(time.time()) - msg_date > COMMAND_MAX_AGE: return
+        handle_command(text, signals)
     except Exception as e: print(f"❌ [BUILD LOG] Lỗi Telegram: {e}")
 
-def get_stock_data(symbol):
+# Module backtest chỉ được nạp khi có lệnh cần đến
+def handle_command(text, signals):
+    if text.lower().startswith('bp '):
+        try:
+            from backtest import run_backtest_core
+            from batch_backtest import resolve_symbols, run_batch_report
+            # "bp MÃ [NGÀY] [KHUNG]" hoặc nhiều mã: "bp BTC,ETH FPT [NGÀY] [KHUNG]" / "bp @vn30 [NGÀY]"; KHUNG: 1h, 2h (chi), 4h, 1d
+            parts, timeframe = pop_timeframe(text.split()[1:])
+            days = int(parts.pop()) if len(parts) > 1 and parts[-1].isdigit() else 90
+            symbols = resolve_symbols(parts)
+            if len(symbols) == 1:
+                symbol = symbols[0]
+                print(f"   -> ⚙️ Backtest: {symbol} ({days} ngày, {timeframe})")
+                send_telegram_message(f"⏳ <b>Đang chạy Backtest cho {symbol}...</b>")
+                report = run_backtest_core(symbol, days, signals, timeframe=timeframe)
+                send_telegram_message(report)
+            elif symbols:
+                print(f"   -> ⚙️ Backtest nhiều mã: {', '.join(symbols)} ({days} ngày, {timeframe})")
+                send_telegram_message(f"⏳ <b>Đang chạy Backtest cho {len(symbols)} mã...</b>")
+                send_telegram_message(run_batch_report(symbols, days, signals, timeframe=timeframe))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+    elif text.lower().startswith('sweep '):
+        try:
+            from sweep import parse_sweep_args, run_sweep_report
+            symbol, days, overrides = parse_sweep_args(text.split()[1:])
+            print(f"   -> 🧪 Sweep: {symbol} ({days} ngày)")
+            send_telegram_message(f"⏳ <b>Đang quét tham số cho {symbol}...</b>")
+            send_telegram_message(run_sweep_report(symbol, days, signals, overrides))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+    elif text.lower().startswith('wf '):
+        try:
+            from walk_forward import parse_walk_forward_args, run_walk_forward_report
+            symbol, horizon, span_days, step = parse_walk_forward_args(text.split()[1:])
+            print(f"   -> 🧭 Walk-forward: {symbol} ({horizon} ngày × {span_days} ngày)")
+            send_telegram_message(f"⏳ <b>Đang chạy walk-forward cho {symbol}...</b>")
+            send_telegram_message(run_walk_forward_report(symbol, signals, horizon, span_days, step))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+    elif text.lower().startswith('mc '):
+        try:
+            from monte_carlo import parse_monte_carlo_args, run_monte_carlo_report
+            symbol, days, n_paths, opts = parse_monte_carlo_args(text.split()[1:])
+            print(f"   -> 🎲 Monte Carlo: {symbol} ({days} ngày, {n_paths:,} đường)")
+            send_telegram_message(f"⏳ <b>Đang chạy Monte Carlo cho {symbol} ({n_paths:,} đường)...</b>")
+            send_telegram_message(run_monte_carlo_report(symbol, days, signals, n_paths, opts))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+    elif text.lower() == 'pf' or text.lower().startswith('pf '):
+        try:
+            from portfolio_backtest import parse_portfolio_args, run_portfolio_report
+            # "pf [MÃ,MÃ|@list] [NGÀY] [shared|bucket|independent]", không có mã -> các chiến dịch đang chạy với vốn thật
+            symbols, days, mode = parse_portfolio_args(text.split()[1:])
+            assets = [(s, None) for s in symbols] if symbols else campaign_assets()
+            if not assets: send_telegram_message("❌ Không có chiến dịch nào đang chạy.")
+            else:
+                print(f"   -> 💼 Backtest danh mục: {len(assets)} mã ({days} ngày, {mode})")
+                send_telegram_message(f"⏳ <b>Đang chạy backtest danh mục {len(assets)} mã...</b>")
+                send_telegram_message(run_portfolio_report(assets, days, signals, mode, USD_VND_RATE))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+    elif text.lower() == 'eq' or text.lower().startswith('eq '):
+        try:
+            from equity_store import format_equity_report, parse_report_args
+            # "eq [TÊN|MÃ] [NGÀY]": hiệu suất chiến dịch từ kho cục bộ (mặc định 30 ngày, tất cả chiến dịch)
+            query, days = parse_report_args(text.split()[1:])
+            print(f"   -> 📈 Hiệu suất: {query or 'tất cả'} ({days} ngày)")
+            send_telegram_message(format_equity_report(get_equity_store(), query, days))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+    elif text.lower() == 'dd' or text.lower().startswith('dd '):
+        try:
+            from equity_store import format_drawdown_report, parse_report_args
+            _, days = parse_report_args(text.split()[1:])
+            print(f"   -> 📉 Drawdown ({days} ngày)")
+            send_telegram_message(format_drawdown_report(get_equity_store(), days))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+    elif text.lower().split()[:1] in (['quẻ'], ['que']):
+        try:
+            from signal_schedule import format_schedule_report, parse_schedule_args
+            # "quẻ [GIỜ] [lệnh]": lịch quẻ / tín hiệu các giờ chi sắp tới (mặc định 24 giờ)
+            hours, only_trades = parse_schedule_args(text.split()[1:])
+            now_ts = int(time.time())
+            print(f"   -> 🔮 Lịch quẻ {hours} giờ tới")
+            send_telegram_message(format_schedule_report(get_signal_schedule(signals, now_ts, now_ts + hours * 3600), now_ts, hours, only_trades))
+        except Exception as e:
+            send_telegram_message(f"❌ Lỗi lệnh: {str(e)}")
+
+def query_active_campaigns():
+    query = {"filter": {"property": "Trạng Thái", "status": {"equals": "Đang chạy"}}}
+    res = notion_request(f"databases/{CONFIG_DB_ID}/query", "POST", query)
+    return res['results'] if res and 'results' in res else None
+
+# Chiến dịch đang chạy -> [(mã backtest, vốn)] cho backtest danh mục
+def campaign_assets():
+    assets = []
+    for config in query_active_campaigns() or []:
+        try:
+            market = config['properties']['Sàn Giao Dịch']['select']['name']
+            symbol = config['properties']['Mã Tài Sản']['rich_text'][0]['plain_text'].upper()
+            capital = config['properties']['Vốn Ban Đầu']['number']
+        except: continue
+        if "Binance" in market or "Crypto" in market: symbol = symbol.replace("/", "") if "USDT" in symbol else symbol + "USDT"
+        assets.append((symbol, capital))
+    return assets
+
+def get_stock_data(symbol, from_ts=None, timeframe="1h"):
     try:
         to_ts = int(time.time())
-        from_ts = to_ts - (30 * 24 * 3600) 
-        url = f"https://services.entrade.com.vn/chart-api/v2/ohlcs/stock?symbol={symbol}&resolution=1H&from={from_ts}&to={to_ts}"
-        res = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}).json()
-        data = []
-        if 't' in res and res['t']:
-            for i in range(len(res['t'])):
-                data.append({"t": datetime.fromtimestamp(res['t'][i], tz=timezone(timedelta(hours=7))), "p": float(res['c'][i])})
-        return data
-    except: return []
-
-def add_technical_indicators(data):
-    if not data: return []
-    df = pd.DataFrame(data)
-    df['SMA20'] = df['p'].rolling(window=20).mean()
-    delta = df['p'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
-    df = df.fillna(0)
-    return df.to_dict('records')
+        if from_ts is None: from_ts = to_ts - max(30 * 24 * 3600, 499 * timeframe_step(timeframe))
+        return load_stock_candles(symbol, from_ts, to_ts, timeframe)
+    except: return CandleSeries.empty()
+
+# -> (mảng SMA20, mảng RSI) theo từng nến của series
+def add_technical_indicators(series, ind=None):
+    with span("indicators"): return (ind or IndicatorState()).update_batch(series.close)
 
 def notion_request(endpoint, method="POST", payload=None):
-    url = f"https://api.notion.com/v1/{endpoint}"
-    headers = {"Authorization": f"Bearer {NOTION_TOKEN}", "Content-Type": "application/json", "Notion-Version": "2022-06-28"}
-    try:
-        if method == "POST": response = requests.post(url, headers=headers, json=payload)
-        else: response = requests.get(url, headers=headers)
-        return response.json() if response.status_code == 200 else None
+    try: return notion.request(endpoint, method, payload)
     except: return None
 
-def load_advice_data():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(current_dir, 'data_loi_khuyen.csv')
-    if os.path.exists(file_path): return pd.read_csv(file_path)
-    return pd.read_csv(io.StringIO(BACKUP_CSV))
-
-king_wen_matrix = [[1, 10, 13, 25, 44, 6, 33, 12], [43, 58, 49, 17, 28, 47, 31, 45], [14, 38, 30, 21, 50, 64, 56, 35], [34, 54, 55, 51, 32, 40, 62, 16], [9, 61, 37, 42, 57, 59, 53, 20], [5, 60, 63, 3, 48, 29, 39, 8], [26, 41, 22, 27, 18, 4, 52, 23], [11, 19, 36, 24, 46, 7, 15, 2]]
-
-def calculate_hexagram(dt):
-    if dt.hour == 23: dt_l = dt + timedelta(days=1)
-    else: dt_l = dt
-    lunar = LunarDate.fromSolarDate(dt_l.year, dt_l.month, dt_l.day)
-    chi = 1 if dt.hour==23 or dt.hour==0 else ((dt.hour+1)//2 + 1 if dt.hour%2!=0 else dt.hour//2 + 1)
-    base = ((lunar.year - 1984)%12 + 1) + lunar.month + lunar.day
-    thuong, ha = base%8 or 8, (base+chi)%8 or 8
-    hao = (base+chi)%6 or 6 
-    id_goc = king_wen_matrix[thuong-1][ha-1]
-    is_upper, line = hao>3, hao-3 if hao>3 else hao
-    target = thuong if is_upper else ha
-    new_trig = {1:{1:5,2:3,3:2},2:{1:6,2:4,3:1},3:{1:7,2:1,3:4},4:{1:8,2:2,3:3},5:{1:1,2:7,3:6},6:{1:2,2:8,3:5},7:{1:3,2:5,3:8},8:{1:4,2:6,3:7}}[target][line]
-    new_thuong, new_ha = (new_trig, thuong) if is_upper else (thuong, new_trig)
-    return f"G{id_goc}-B{king_wen_matrix[new_thuong-1][new_ha-1]}"
-
-def analyze_smart_action(text):
-    if not isinstance(text, str) or not text: return "GIỮ", 0.0
-    text = text.lower()
-    avoid = ['đứng ngoài', 'quan sát', 'không nên mua', 'rút lui', 'chờ đợi', 'thận trọng']
-    if any(w in text for w in avoid): return "GIỮ", 0.0
-    strong_buy = ['đại cát', 'lợi lớn', 'bay cao', 'thời cơ vàng', 'mua ngay', 'tất tay', 'all-in']
-    if any(w in text for w in strong_buy): return "MUA", 1.0 
-    strong_sell = ['nguy hiểm', 'sập', 'tháo chạy', 'bán tháo', 'tuyệt vọng', 'cắt lỗ ngay']
-    if any(w in text for w in strong_sell): return "BÁN", 1.0
-    normal_buy = ['mua', 'tốt', 'lãi', 'tích lũy', 'hanh thông', 'tăng', 'nên mua']
-    if any(w in text for w in normal_buy): return "MUA", 0.5
-    normal_sell = ['bán', 'xấu', 'lỗ', 'giảm', 'trở ngại', 'hạ tỷ trọng', 'nên bán']
-    if any(w in text for w in normal_sell): return "BÁN", 0.5
-    return "GIỮ", 0.0
-
 def get_existing_signatures(symbol):
-    payload = {"filter": {"property": "Mã", "rich_text": {"contains": symbol}}, "sorts": [{"property": "Giờ Giao Dịch", "direction": "descending"}], "page_size": 100}
-    try: data = notion_request(f"databases/{LOG_DB_ID}/query", "POST", payload)
-    except: 
-        payload["sorts"] = [{"property": "Thời Gian", "direction": "descending"}]
-        data = notion_request(f"databases/{LOG_DB_ID}/query", "POST", payload)
-    s = set()
-    if data and 'results' in data:
-        for p in data['results']:
-            try:
-                t = p['properties']['Thời Gian']['title'][0]['plain_text']
-                match = re.search(r'(\d{2}:\d{2} \d{2}/\d{2})', t)
-                if match: s.add(match.group(1))
-            except: pass
-    return s
+    index = get_signature_index()
+    if not sync_signatures(index, notion_request, LOG_DB_ID, symbol, full=REBUILD_SIGNATURES):
+        print(f"⚠️ [BUILD LOG] Không đồng bộ được chỉ mục Notion cho {symbol}, dùng dữ liệu cục bộ.")
+    return index.load(symbol)
+
+# Cột "Khung Giờ" (tùy chọn) của chiến dịch: 1h (mặc định), 2h (theo giờ chi), 4h, 1d
+def campaign_timeframe(config):
+    try: text = config['properties']['Khung Giờ']['select']['name']
+    except: return "1h"
+    try: return parse_timeframe(text)
+    except ValueError as e:
+        print(f"⚠️ [BUILD LOG] {e}, dùng 1h.")
+        return "1h"
 
 def run_campaign(config):
     try:
@@ -180,51 +234,84 @@ def run_campaign(config):
         symbol = config['properties']['Mã Tài Sản']['rich_text'][0]['plain_text']
         capital = config['properties']['Vốn Ban Đầu']['number']
     except: return None
+    timeframe = campaign_timeframe(config)
+    step = timeframe_step(timeframe)
 
-    print(f"\n🚀 Processing: {name} ({symbol})")
+    print(f"\n🚀 Processing: {name} ({symbol})" + (f" [{timeframe}]" if timeframe != "1h" else ""))
+    profile.set_campaign(f"{name} ({symbol})")
     
     is_crypto = "Binance" in market or "Crypto" in market
-    data_raw = []
+    campaign_id = config.get('id') or symbol
+    data_raw = CandleSeries.empty()
+
+    # Checkpoint: chỉ xử lý các nến mới hơn nến đã đóng cuối cùng
+    state = None if REBUILD_STATE else load_campaign_state(campaign_id)
+    if state and (state.get('symbol') != symbol or state.get('capital') != capital or 'indicators' not in state
+                  or state.get('timeframe', '1h') != timeframe): state = None
+    since_ts = state['last_ts'] + 1 if state else None
+    equity_store = get_equity_store()
+    if equity_store.set_meta(campaign_id, {"id": campaign_id, "name": name, "symbol": symbol, "capital": capital, "timeframe": timeframe,
+                                           "type": "CRYPTO" if is_crypto else "STOCK"}):
+        print(f"♻️ [BUILD LOG] Chiến dịch {name} đổi cấu hình, xóa chuỗi tài sản cục bộ cũ.")
     
     # Fetch Data
     if is_crypto:
         try:
-            ex = ccxt.kucoin()
-            ohlcv = ex.fetch_ohlcv(symbol if "/USDT" in symbol else symbol+"/USDT", '1h', limit=500)
-            for c in ohlcv: data_raw.append({"t": datetime.fromtimestamp(c[0]/1000, tz=timezone(timedelta(hours=7))), "p": c[4]})
+            to_ts = int(time.time())
+            from_ts = since_ts if since_ts else bar_start(to_ts, timeframe) - 499 * step
+            data_raw = load_crypto_candles(symbol if "/USDT" in symbol else symbol+"/USDT", from_ts, to_ts, timeframe)
         except: pass
     elif "Stock" in market or "VNIndex" in market:
-        data_raw = get_stock_data(symbol)
+        data_raw = get_stock_data(symbol, since_ts, timeframe)
+
+    if not len(data_raw) and state:
+        print(f"✅ [BUILD LOG] Không có nến mới cho {symbol} (checkpoint {datetime.fromtimestamp(state['last_ts'], tz=timezone(timedelta(hours=7))).strftime('%H:%M %d/%m')}).")
+        return campaign_stats(symbol, is_crypto, capital, state['cash'], state['stock'], state['avg_price'], state['last_price'], state['last_rsi'],
+                              campaign_id)
 
-    if not data_raw:
+    if not len(data_raw):
         print(f"❌ [BUILD LOG] Không tìm thấy dữ liệu giá cho {symbol}.")
         return None
 
-    data_full = add_technical_indicators(data_raw)
-    data_to_trade = data_full[-48:] 
-    df_adv = load_advice_data()
-    adv_map = dict(zip(df_adv['KEY_ID'], df_adv['Lời Khuyên']))
+    # Chỉ báo streaming tiếp nối từ checkpoint; chụp trạng thái tại nến đã đóng cuối cùng
+    now_ts = int(time.time())
+    ind = IndicatorState.from_dict(state['indicators']) if state else IndicatorState()
+    n_closed = data_raw.closed_count(now_ts, step)
+    sma_closed, rsi_closed = add_technical_indicators(data_raw[:n_closed], ind)
+    ind_checkpoint = ind.to_dict()
+    sma_open, rsi_open = add_technical_indicators(data_raw[n_closed:], ind)
+    sma_full, rsi_full = np.concatenate((sma_closed, sma_open)), np.concatenate((rsi_closed, rsi_open))
+    start = 0 if state else max(0, len(data_raw) - 48)
+    data_to_trade, sma_list, rsi_list = data_raw[start:], sma_full[start:].tolist(), rsi_full[start:].tolist()
+    prices = data_to_trade.close.tolist()
+    signals = load_signal_table()
     existing = get_existing_signatures(symbol)
+    # Quẻ / lệnh / tỷ trọng tra từ lịch tín hiệu tính sẵn (dùng chung mọi chiến dịch); vòng lặp chỉ còn bộ lọc giá
+    with span("hexagram"):
+        codes, sched_actions, sched_percents = get_signal_schedule(signals).lookup(data_to_trade.ts)
+        codes, sched_actions, sched_percents = codes.tolist(), sched_actions.tolist(), sched_percents.tolist()
     
-    cash, stock, avg_price = capital, 0, 0
+    cash, stock, avg_price = (state['cash'], state['stock'], state['avg_price']) if state else (capital, 0, 0)
+    checkpoint = None
     new_logs_count = 0
+    equity_rows = []
     fee_rate = FEE_CRYPTO if is_crypto else FEE_STOCK
 
     # --- SIMULATION ---
-    for i, item in enumerate(data_to_trade):
-        dt, price = item['t'], item['p']
-        sma20, rsi = item.get('SMA20', 0), item.get('RSI', 50)
+    sim_started = time.perf_counter()
+    for i in range(len(data_to_trade)):
+        dt, price = data_to_trade.datetime_at(i), prices[i]
+        sma20, rsi = sma_list[i], rsi_list[i]
         time_sig = dt.strftime('%H:%M %d/%m')
+        candle_ts = int(data_to_trade.ts[i])
         holding_pnl = (price - avg_price) / avg_price if (stock > 0 and avg_price > 0) else 0
         
         # Biến cờ kiểm tra nến cuối cùng
         is_last_candle = (i == len(data_to_trade) - 1)
 
-        key = calculate_hexagram(dt)
-        advice = adv_map.get(key, "")
-        if not advice: advice = f"Quẻ {key} (Chưa có lời khuyên)"
-        
-        action, percent = analyze_smart_action(advice)
+        code = codes[i]
+        key = KEY_IDS[code]
+        action, percent = ACTION_NAMES[sched_actions[i]], sched_percents[i]
         risk_action, risk_reason, tech_reason = None, "", ""
         
         if stock > 0:
@@ -279,9 +366,11 @@ def run_campaign(config):
         roi_total = (equity - capital) / capital
         allocation = current_asset_val / equity if equity > 0 else 0
         holding_pnl_new = (price - avg_price) / avg_price if (stock > 0 and avg_price > 0) else 0
+        if candle_ts + step <= now_ts: checkpoint = (candle_ts, cash, stock, avg_price, price, rsi)
+        equity_rows.append((candle_ts, equity, cash, stock, price, roi_total, action_code(display_label), code))
 
         # PHẦN 1: GHI NOTION (Chỉ ghi khi chưa có)
-        if time_sig not in existing:
+        if candle_ts not in existing:
             icon = "⚪"
             if "MUA" in display_label: icon = "🟢"
             elif "BÁN" in display_label: icon = "🔴"
@@ -307,8 +396,8 @@ def run_campaign(config):
                     "% Lời/Lỗ CP": {"number": holding_pnl_new}
                 }
             }
-            notion_request("pages", "POST", payload)
-            existing.add(time_sig)
+            notion.queue_page(payload, on_success=lambda ts=candle_ts: get_signature_index().add(symbol, [ts]))
+            existing.add(candle_ts)
             new_logs_count += 1
             print(f"   ✅ [GHI] {title}")
 
@@ -322,7 +411,7 @@ def run_campaign(config):
             elif "GIỮ" in display_label: icon = "✊"
             elif "KHÔNG MUA" in display_label: icon = "⛔"
 
-            final_reason = advice
+            final_reason = signals.advice[code] or f"Quẻ {key} (Chưa có lời khuyên)"
             if risk_reason: final_reason = risk_reason
             elif tech_reason: final_reason = tech_reason
             
@@ -335,58 +424,199 @@ def run_campaign(config):
                 f"📊 <b>Chỉ số: RSI: </b> {rsi:.0f} | <b>SMA20: </b> {sma20:,.0f}\n"
                 f"💡 <b>Lý do:</b> {final_reason}"
             )
-            send_telegram_message(msg)
+            send_telegram_message(msg, group="signals")   # Giữ tới cuối lượt, nhiều tín hiệu -> gộp một tin
 
+    profile.record_span("simulate", time.perf_counter() - sim_started)
+    try: equity_store.append(campaign_id, equity_rows)
+    except Exception as e: print(f"⚠️ [BUILD LOG] Không ghi được chuỗi tài sản cục bộ: {e}")
     if new_logs_count == 0:
         print(f"✅ [BUILD LOG] Dữ liệu đã đồng bộ (Không ghi thêm vào Notion).")
 
-    last_item = data_to_trade[-1]
-    equity_final = cash + (stock * last_item['p'])
-    pnl_value = (last_item['p'] - avg_price) * stock if stock > 0 else 0
-    pnl_percent = (last_item['p'] - avg_price) / avg_price if (stock > 0 and avg_price > 0) else 0
+    # Lưu checkpoint tới nến đã đóng cuối cùng (nến đang chạy sẽ được xử lý lại ở lần sau)
+    if checkpoint:
+        last_ts, c_cash, c_stock, c_avg, c_price, c_rsi = checkpoint
+        save_campaign_state(campaign_id, {"symbol": symbol, "capital": capital, "last_ts": last_ts, "cash": c_cash, "stock": c_stock,
+                                          "avg_price": c_avg, "last_price": c_price, "last_rsi": c_rsi, "indicators": ind_checkpoint,
+                                          "timeframe": timeframe})
+
+    return campaign_stats(symbol, is_crypto, capital, cash, stock, avg_price, prices[-1], rsi_list[-1], campaign_id)
+
+def campaign_stats(symbol, is_crypto, capital, cash, stock, avg_price, price, rsi, campaign_id=None):
+    equity_final = cash + (stock * price)
+    pnl_value = (price - avg_price) * stock if stock > 0 else 0
+    pnl_percent = (price - avg_price) / avg_price if (stock > 0 and avg_price > 0) else 0
 
     return {
-        "symbol": symbol, "price": last_item['p'], "equity": equity_final, "cash": cash, "stock_amt": stock,
+        "symbol": symbol, "price": price, "equity": equity_final, "cash": cash, "stock_amt": stock,
         "roi": (equity_final - capital) / capital, "pnl_percent": pnl_percent, "pnl_value": pnl_value,
-        "hold": stock > 0, "rsi": last_item.get('RSI', 50), "type": "CRYPTO" if is_crypto else "STOCK"
+        "hold": stock > 0, "rsi": rsi, "type": "CRYPTO" if is_crypto else "STOCK", "campaign_id": campaign_id
     }
 
-print("📡 Đang khởi động...")
-df_adv = load_advice_data()
-adv_map = dict(zip(df_adv['KEY_ID'], df_adv['Lời Khuyên']))
-check_telegram_command(adv_map)
-query = {"filter": {"property": "Trạng Thái", "status": {"equals": "Đang chạy"}}}
-res = notion_request(f"databases/{CONFIG_DB_ID}/query", "POST", query)
-daily_stats = []
-if res and 'results' in res:
-    print(f"✅ Tìm thấy {len(res['results'])} chiến dịch.")
-    for cfg in res['results']: 
-        stat = run_campaign(cfg)
-        if stat: daily_stats.append(stat)
-
-now_utc = datetime.now(timezone.utc)
-now_vn = now_utc + timedelta(hours=7)
-if now_vn.hour == 6 and daily_stats:
-    total_nav_vnd, total_cash_vnd, total_cash_usd = 0, 0, 0
+# Ngày đã gửi bản tin sáng -> khởi động lại daemon trong giờ 6 không gửi lần nữa
+BRIEFING_FILE = os.path.join(CACHE_DIR, "last_briefing.txt")
+
+def briefing_sent_on(day):
+    try:
+        with open(BRIEFING_FILE, encoding="utf-8") as f: return f.read().strip() == day
+    except OSError: return False
+
+def mark_briefing_sent(day):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{BRIEFING_FILE}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f: f.write(day)
+        os.replace(tmp, BRIEFING_FILE)
+    except OSError as e: print(f"⚠️ [BUILD LOG] Không lưu được ngày gửi bản tin: {e}")
+
+def send_morning_briefing(daily_stats, signals):
+    now_utc = datetime.now(timezone.utc)
+    now_vn = now_utc + timedelta(hours=7)
+    if now_vn.hour != 6 or not daily_stats: return
+    today = now_vn.strftime('%Y-%m-%d')
+    if briefing_sent_on(today):
+        print(f"☕ [BUILD LOG] Bản tin sáng {today} đã gửi, bỏ qua.")
+        return
+    total_nav_vnd, total_cash_vnd, total_cash_usd, prev_nav_vnd = 0, 0, 0, 0
     list_stock, list_crypto = [], []
+    # Biến động NAV 24h đọc từ kho chuỗi tài sản cục bộ
+    equity_store = get_equity_store()
     for s in daily_stats:
-        if s['type'] == "STOCK":
-            total_nav_vnd += s['equity']; total_cash_vnd += s['cash']; list_stock.append(s)
-        else:
-            total_nav_vnd += s['equity'] * USD_VND_RATE; total_cash_usd += s['cash']; list_crypto.append(s)
-
-    daily_key = calculate_hexagram(now_vn)
-    daily_advice = adv_map.get(daily_key, "Vận khí bình ổn.")
-    msg = f"☕ <b>MORNING BRIEFING</b> - {now_vn.strftime('%d/%m/%Y')}\n--------------------------\n💰 <b>TỔNG NAV: {total_nav_vnd/1e6:,.1f} tr</b>\n💵 <b>Tiền mặt khả dụng:</b>\n   • VNĐ: {total_cash_vnd:,.0f} đ\n   • USD: {total_cash_usd:,.2f} $\n--------------------------\n\n"
+        s['nav_24h'] = equity_change(equity_store, s['campaign_id']) if s.get('campaign_id') else None
+        nav_vnd = s['equity'] * (1 if s['type'] == "STOCK" else USD_VND_RATE)
+        total_nav_vnd += nav_vnd
+        prev_nav_vnd += nav_vnd / (1 + s['nav_24h']) if s['nav_24h'] is not None else nav_vnd
+        if s['type'] == "STOCK": total_cash_vnd += s['cash']; list_stock.append(s)
+        else: total_cash_usd += s['cash']; list_crypto.append(s)
+    has_history = any(s['nav_24h'] is not None for s in daily_stats)
+    nav_change = f" ({total_nav_vnd / prev_nav_vnd - 1:+.2%} 24h)" if has_history and prev_nav_vnd > 0 else ""
+    nav_line = lambda s: f"   • NAV 24h: {s['nav_24h']:+.2%}\n" if s['nav_24h'] is not None else ""
+
+    daily_key = KEY_IDS[get_signal_schedule(signals).code_at(int(now_utc.timestamp()))]
+    daily_advice = signals.advice_for(daily_key) or "Vận khí bình ổn."
+    msg = f"☕ <b>MORNING BRIEFING</b> - {now_vn.strftime('%d/%m/%Y')}\n--------------------------\n💰 <b>TỔNG NAV: {total_nav_vnd/1e6:,.1f} tr</b>{nav_change}\n💵 <b>Tiền mặt khả dụng:</b>\n   • VNĐ: {total_cash_vnd:,.0f} đ\n   • USD: {total_cash_usd:,.2f} $\n--------------------------\n\n"
     if list_stock:
         msg += "🇻🇳 <b>CHỨNG KHOÁN:</b>\n"
         for i, s in enumerate(list_stock, 1):
             status = f"✊ Giữ {s['stock_amt']:,.0f} cp" if s['hold'] else "⚪ Full Cash"
-            msg += f"{i}. <b>{s['symbol']}</b>: {'🟢' if s['pnl_percent']>=0 else '🔴'} {s['pnl_percent']:+.2%}\n   • Vị thế: {status}\n\n"
+            msg += f"{i}. <b>{s['symbol']}</b>: {'🟢' if s['pnl_percent']>=0 else '🔴'} {s['pnl_percent']:+.2%}\n   • Vị thế: {status}\n{nav_line(s)}\n"
     if list_crypto:
         msg += "🌍 <b>CRYPTO:</b>\n"
         for i, s in enumerate(list_crypto, 1):
             status = f"✊ Giữ {s['stock_amt']:.4f}" if s['hold'] else "⚪ Full Cash"
-            msg += f"{i}. <b>{s['symbol']}</b>: {'🟢' if s['pnl_percent']>=0 else '🔴'} {s['pnl_percent']:+.2%}\n   • Vị thế: {status}\n\n"
+            msg += f"{i}. <b>{s['symbol']}</b>: {'🟢' if s['pnl_percent']>=0 else '🔴'} {s['pnl_percent']:+.2%}\n   • Vị thế: {status}\n{nav_line(s)}\n"
     msg += f"🔮 <b>QUẺ NGÀY ({daily_key}):</b>\n<i>{daily_advice}</i>"
     send_telegram_message(msg)
+    mark_briefing_sent(today)
+
+def run_campaign_timed(config):
+    t0 = time.perf_counter()
+    try: return run_campaign(config)
+    finally:
+        profile.record_span("campaign", time.perf_counter() - t0)
+        profile.set_campaign(None)
+
+# Một lượt chạy: quét chiến dịch, ghi Notion, bản tin sáng lúc 6h
+def run_hourly_pass(signals):
+    profile.reset()
+    results = query_active_campaigns()
+    daily_stats = []
+    if results is not None:
+        print(f"✅ Tìm thấy {len(results)} chiến dịch.")
+        # Chạy song song các chiến dịch, kết quả giữ đúng thứ tự cấu hình cho bản tin sáng
+        for stat in run_parallel(run_campaign_timed, results, CAMPAIGN_WORKERS):
+            if stat: daily_stats.append(stat)
+    if telegram: telegram.release("signals")   # Tín hiệu của cả lượt gửi một lần (đủ ngưỡng thì gộp)
+
+    notion.flush()
+    print(notion.summary())
+    send_morning_briefing(daily_stats, signals)
+    if telegram:
+        telegram.flush()
+        print(telegram.summary())
+    write_run_profile()
+
+# Profile JSON của lượt chạy; tóm tắt ngắn qua Telegram nếu bật PROFILE_TELEGRAM=1 / --profile-telegram
+def write_run_profile():
+    try:
+        data = profile.write(PROFILE_FILE)
+        print(f"⏱ [BUILD LOG] Profile lượt chạy ({data['elapsed_s']:.1f}s) -> {PROFILE_FILE}")
+        if PROFILE_TELEGRAM: send_telegram_message(format_profile_summary(data))
+    except Exception as e: print(f"⚠️ [BUILD LOG] Không ghi được profile: {e}")
+
+def next_run_ts(now_ts):
+    slot = now_ts - now_ts % 3600 + SCHEDULE_MINUTE * 60
+    return slot if slot > now_ts else slot + 3600
+
+# --- DAEMON: giữ nóng bảng tín hiệu, lịch quẻ, kho nến, session HTTP giữa các lượt ---
+def run_daemon(signals):
+    poller = TelegramPoller(TELEGRAM_TOKEN) if TELEGRAM_TOKEN else None
+    pass_thread, due = None, int(time.time())   # Chạy ngay một lượt khi khởi động
+    # Lệnh Telegram chạy tuần tự trên một luồng riêng -> lệnh chậm (sweep, mc, pf...) không chặn long polling / lịch chạy
+    commands = queue.Queue()
+
+    def command_worker():
+        while True:
+            text = commands.get()
+            try: handle_command(text, signals)
+            except Exception as e: print(f"❌ [BUILD LOG] Lỗi xử lý lệnh: {e}")
+            finally: commands.task_done()
+
+    threading.Thread(target=command_worker, daemon=True).start()
+    print(f"🤖 [BUILD LOG] Daemon đã chạy, lịch chiến dịch: phút {SCHEDULE_MINUTE:02d} mỗi giờ")
+
+    def hourly_pass():
+        global REBUILD_STATE, REBUILD_SIGNATURES
+        try: run_hourly_pass(signals)
+        except Exception as e: print(f"❌ [BUILD LOG] Lỗi lượt chạy chiến dịch: {e}")
+        REBUILD_STATE = REBUILD_SIGNATURES = False   # Chỉ dựng lại ở lượt đầu
+
+    while True:
+        now_ts = int(time.time())
+        if now_ts >= due and not (pass_thread and pass_thread.is_alive()):
+            # Lượt chiến dịch chạy nền để lệnh Telegram vẫn được trả lời trong lúc chờ
+            pass_thread = threading.Thread(target=hourly_pass, daemon=True)
+            pass_thread.start()
+            due = next_run_ts(now_ts)
+        if not poller:
+            time.sleep(max(1, min(60, due - now_ts)))
+            continue
+        try:
+            for _, msg_date, text in poller.poll(timeout=max(1, min(POLL_TIMEOUT, due - now_ts))):
+                if int(time.time()) - msg_date > COMMAND_MAX_AGE: continue
+                print(f"📩 [BUILD LOG] Lệnh Telegram: {text}")
+                commands.put(text)
+        except Exception as e:
+            print(f"❌ [BUILD LOG] Lỗi long polling Telegram: {e}")
+            time.sleep(5)
+
+def main(argv=None):
+    global notion, REBUILD_STATE, REBUILD_SIGNATURES, DAEMON_MODE, PROFILE_TELEGRAM
+    argv = sys.argv[1:] if argv is None else argv
+    REBUILD_STATE = REBUILD_STATE or "--rebuild-state" in argv
+    REBUILD_SIGNATURES = REBUILD_SIGNATURES or "--rebuild-signatures" in argv
+    DAEMON_MODE = DAEMON_MODE or "--daemon" in argv
+    PROFILE_TELEGRAM = PROFILE_TELEGRAM or "--profile-telegram" in argv
+
+    if not NOTION_TOKEN or not CONFIG_DB_ID or not LOG_DB_ID:
+        print("❌ [BUILD LOG] LỖI: Thiếu Notion Secrets.")
+        sys.exit(1)
+    notion = NotionClient(NOTION_TOKEN)
+
+    print("📡 Đang khởi động...")
+    signals = load_signal_table()
+    load_calendar()
+    get_signal_schedule(signals)
+    startup_s = time.perf_counter() - _STARTED
+    profile.meta.update({"startup_s": round(startup_s, 4), "startup_budget_s": STARTUP_BUDGET_S})
+    print(f"{'⚠️' if startup_s > STARTUP_BUDGET_S else '⚡'} [BUILD LOG] Khởi động {startup_s:.2f}s (ngân sách {STARTUP_BUDGET_S:.1f}s)")
+
+    if DAEMON_MODE:
+        try: run_daemon(signals)
+        except KeyboardInterrupt: print("👋 [BUILD LOG] Dừng daemon.")
+        notion.flush()
+    else:
+        check_telegram_command(signals)
+        run_hourly_pass(signals)
+
+if __name__ == "__main__":
+    main()
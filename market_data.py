@@ -0,0 +1,145 @@
+import os
+import time
+import threading
+import requests
+
+import numpy as np
+
+from candle_store import TIMEFRAME_SEC, get_store
+from concurrency import TokenBucket, host_slot, run_parallel
+from run_profile import span
+from resample import bar_start, load_resampled
+
+ENTRADE_URL = "https://services.entrade.com.vn/chart-api/v2/ohlcs/stock"
+ENTRADE_RESOLUTION = {"1h": "1H"}
+
+# Giới hạn tốc độ dùng chung cho mọi luồng tải (request/giây theo sàn)
+EXCHANGE_RATES = {"kucoin": float(os.environ.get("KUCOIN_RATE", 8)), "entrade": float(os.environ.get("ENTRADE_RATE", 5))}
+rate_limiters = {name: TokenBucket(rate) for name, rate in EXCHANGE_RATES.items()}
+# Tải lịch sử dài theo cửa sổ độc lập (số nến mỗi cửa sổ), chạy song song trong giới hạn tốc độ trên
+WINDOW_CANDLES = {"kucoin": 1000, "entrade": int(os.environ.get("ENTRADE_WINDOW_CANDLES", 1000))}
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", 4))
+# Tỷ giá quy đổi tài sản crypto (USD) sang VNĐ: bản tin sáng, backtest danh mục
+USD_VND_RATE = float(os.environ.get("USD_VND_RATE", 25300))
+
+# Mỗi luồng một instance ccxt (session HTTP của ccxt không an toàn khi dùng chung giữa các luồng).
+# Danh sách cặp giao dịch chỉ tải một lần rồi gắn cho mọi instance: fetch_ohlcv tự gọi load_markets() khi instance
+# chưa có markets -> mỗi luồng tải mới sẽ tốn thêm một lần tải toàn bộ thị trường ngoài token bucket.
+_local = threading.local()
+_markets = None
+_markets_lock = threading.Lock()
+
+def get_exchange():
+    if getattr(_local, "exchange", None) is None:
+        import ccxt   # Nạp chậm: chỉ chiến dịch / backtest crypto mới cần (import ccxt mất vài giây)
+        _local.exchange = _with_markets(ccxt.kucoin())
+    return _local.exchange
+
+def _with_markets(ex):
+    global _markets
+    with _markets_lock:
+        if _markets is None:
+            rate_limiters["kucoin"].acquire()
+            with host_slot("kucoin"): ex.load_markets()
+            _markets = (ex.markets, ex.currencies)
+        else: ex.set_markets(*_markets)
+    return ex
+
+# --- HÀM TẢI TỪ API (trả về list (ts giây, o, h, l, c, v); load_* trả về CandleSeries) ---
+def fetch_stock_ohlcv(symbol, start_ts, end_ts, timeframe="1h"):
+    url = f"{ENTRADE_URL}?symbol={symbol}&resolution={ENTRADE_RESOLUTION[timeframe]}&from={start_ts}&to={end_ts}"
+    rate_limiters["entrade"].acquire()
+    with host_slot("services.entrade.com.vn") as slot:
+        resp = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+        slot.nbytes = len(resp.content)
+    res = resp.json()
+    if 't' not in res or not res['t']: return []
+    c = res['c']
+    o, h, l, v = res.get('o') or c, res.get('h') or c, res.get('l') or c, res.get('v') or [0] * len(c)
+    return [(int(res['t'][i]), float(o[i]), float(h[i]), float(l[i]), float(c[i]), float(v[i])) for i in range(len(res['t']))]
+
+def fetch_crypto_ohlcv(pair, start_ts, end_ts, timeframe="1h"):
+    ex = get_exchange()
+    step_ms = TIMEFRAME_SEC[timeframe] * 1000
+    end_ms, current_since = end_ts * 1000, start_ts * 1000
+    rows = []
+    while current_since <= end_ms:
+        rate_limiters["kucoin"].acquire()
+        with host_slot("kucoin") as slot:
+            ohlcv = ex.fetch_ohlcv(pair, timeframe, since=current_since, limit=1000)
+            slot.nbytes = len(getattr(ex, "last_http_response", None) or "")
+        if not ohlcv: break
+        if rows and ohlcv[0][0] <= rows[-1][0] * 1000: break
+        for c in ohlcv:
+            if current_since <= c[0] <= end_ms:
+                rows.append((c[0] // 1000, float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5] or 0)))
+        current_since = ohlcv[-1][0] + step_ms
+    return rows
+
+# --- TẢI THEO CỬA SỔ SONG SONG ---
+def split_windows(start_ts, end_ts, step, window_candles):
+    span = step * window_candles
+    return [(a, min(end_ts, a + span - step)) for a in range(start_ts, end_ts + 1, span)]
+
+# -> (nến đã gộp, bỏ trùng, theo thứ tự ts; các khoảng không có dữ liệu / lỗi; [(khoảng, lỗi)] của cửa sổ tải lỗi)
+def download_windows(fetch_fn, start_ts, end_ts, timeframe="1h", window_candles=1000, workers=DOWNLOAD_WORKERS, on_window=None):
+    step = TIMEFRAME_SEC[timeframe]
+    def fetch(window):
+        try:
+            rows = fetch_fn(*window)
+            if on_window: on_window(window, rows)
+            return rows, None
+        except Exception as e: return [], e
+    windows = split_windows(start_ts, end_ts, step, window_candles)
+    results = run_parallel(fetch, windows, workers)
+    merged, gaps, failed = {}, [], []
+    for window, (rows, err) in zip(windows, results):
+        if err is not None: failed.append((window, err))
+        if not rows: gaps.append(window)
+        for r in rows: merged[int(r[0])] = r
+    if failed and not merged: raise failed[0][1]
+    return [merged[ts] for ts in sorted(merged)], gaps, failed
+
+# --- ĐỌC QUA KHO NẾN: chỉ tải phần còn thiếu ---
+# failed: list tùy chọn, nhận [(a, b)] các khoảng tải lỗi -> người gọi biết chuỗi trả về bị thiếu
+def load_candles(key, start_ts, end_ts, fetch_fn, timeframe="1h", store=None, window_candles=1000, failed=None):
+    with span("fetch"): return _load_candles(key, start_ts, end_ts, fetch_fn, timeframe, store, window_candles, failed)
+
+def _load_candles(key, start_ts, end_ts, fetch_fn, timeframe, store, window_candles, failed):
+    store = store or get_store()
+    step = TIMEFRAME_SEC[timeframe]
+    aligned_start = start_ts - start_ts % step
+    # Nến đang chạy chưa đóng -> không đánh dấu đã phủ để lần sau tải lại
+    closed_until = (int(time.time()) // step) * step - step
+    # Ghi từng cửa sổ ngay khi tải xong, cửa sổ rỗng/lỗi không được đánh dấu để lần sau tải lại
+    def save_window(window, rows):
+        a, b = window
+        store.write(key, timeframe, rows)
+        if rows and min(b, closed_until) >= a: store.mark_covered(key, timeframe, a, min(b, closed_until))
+    fmt = lambda ts: time.strftime("%d/%m/%Y %H:%M", time.gmtime(ts))
+    for a, b in store.missing_ranges(key, timeframe, aligned_start, end_ts):
+        _, gaps, errors = download_windows(fetch_fn, a, b, timeframe, window_candles, on_window=save_window)
+        for (ea, eb), err in errors:
+            print(f"❌ [BUILD LOG] {key}: lỗi tải {fmt(ea)} → {fmt(eb)}: {err}")
+            if failed is not None: failed.append((ea, eb))
+        # Chỉ báo khoảng trống với lần tải lịch sử dài (cập nhật theo giờ ngoài phiên vốn rỗng)
+        gaps = [(ga, gb) for ga, gb in gaps if ga <= closed_until]
+        if gaps and b - a >= step * window_candles:
+            print(f"⚠️ [BUILD LOG] {key}: thiếu dữ liệu " + ", ".join(f"{fmt(ga)} → {fmt(gb)}" for ga, gb in gaps[:5])
+                  + (f" (+{len(gaps) - 5} khoảng)" if len(gaps) > 5 else ""))
+    return store.read_series(key, timeframe, start_ts, end_ts)
+
+# Luôn tải nến 1h (một lần tải phục vụ mọi khung); khung lớn hơn được gộp cục bộ từ kho nến.
+# Khung 1h trả đúng [start_ts, end_ts]: checkpoint gọi với last_ts + 1, không được trả lại nến đã xử lý
+def load_timeframe(key, start_ts, end_ts, fetch_fn, timeframe, window_candles, failed=None):
+    series = load_candles(key, bar_start(start_ts, timeframe), end_ts, fetch_fn, "1h", window_candles=window_candles, failed=failed)
+    if timeframe == "1h": return series[int(np.searchsorted(series.ts, start_ts)):]
+    with span("resample"): return load_resampled(key, timeframe, start_ts, end_ts)
+
+def load_stock_candles(symbol, start_ts, end_ts, timeframe="1h", failed=None):
+    return load_timeframe(f"entrade:{symbol}", start_ts, end_ts, lambda a, b: fetch_stock_ohlcv(symbol, a, b, "1h"), timeframe,
+                          WINDOW_CANDLES["entrade"], failed)
+
+def load_crypto_candles(pair, start_ts, end_ts, timeframe="1h", failed=None):
+    return load_timeframe(f"kucoin:{pair}", start_ts, end_ts, lambda a, b: fetch_crypto_ohlcv(pair, a, b, "1h"), timeframe,
+                          WINDOW_CANDLES["kucoin"], failed)
@@ -0,0 +1,213 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from concurrency import init_worker, process_pool, worker_ctx
+from backtest import DEFAULT_PARAMS, get_backtest_config, load_backtest_arrays, simulate_arrays, summarize_stats
+from indicators import RSI_WINDOW, compute_indicators
+from signal_table import ACTION_BUY, ACTION_SELL, load_signal_table
+from telegram_sender import print_report
+from walk_forward import distribution
+
+# --- MONTE CARLO: ĐỘ BỀN CỦA KẾT QUẢ BACKTEST ---
+# Mỗi đường giá là một biến thể của dữ liệu thật: lợi suất theo giờ được bốc lại theo khối (block bootstrap, giữ
+# tương quan ngắn hạn), lệnh MUA khớp trễ ngẫu nhiên 0..N nến, phí và trượt giá dao động theo từng đường.
+# Tín hiệu quẻ gắn với thời điểm nên giữ nguyên; SMA/RSI và bộ lọc kỹ thuật tính lại trên giá của từng đường.
+# Mọi đường chạy song song dạng mảng NumPy (một bước thời gian cho cả khối đường), chia khối cho nhiều tiến trình nếu có.
+MC_PATHS = int(os.environ.get("MC_PATHS", 10000))
+MAX_PATHS = 50000
+MC_CHUNK = int(os.environ.get("MC_CHUNK", 2500))
+MC_WORKERS = int(os.environ.get("MC_WORKERS", os.cpu_count() or 2))
+MC_DEFAULTS = {"block": 24, "delay": 3, "fee_jitter": 0.5, "slippage": 0.001, "seed": 0}
+# Tên viết tắt dùng trong CLI / Telegram -> khóa trong MC_DEFAULTS
+MC_ALIASES = {"block": "block", "delay": "delay", "fee": "fee_jitter", "slip": "slippage", "seed": "seed"}
+
+# --- WORKER (dữ liệu dùng chung được nạp một lần cho mỗi tiến trình) ---
+def _simulate_chunk(job):
+    seed, n = job
+    c = worker_ctx("monte_carlo")
+    rng = np.random.default_rng(seed)
+    params, opts = c["params"], c["opts"]
+    price, growth, actions, percents = c["price"], c["growth"], c["actions"], c["percents"]
+    capital, _, min_order, fee_rate = get_backtest_config(c["asset_type"])
+    is_stock = c["asset_type"] == "STOCK"
+    sl_mul, tp_mul = 1 + params["stop_loss"], 1 + params["take_profit"]
+    rsi_floor, rsi_ob, sma_w = params["rsi_floor"], params["rsi_overbought"], params["sma_window"]
+    block = min(int(opts["block"]), len(growth))
+    max_delay = int(opts["delay"])
+
+    fee = fee_rate * rng.uniform(1 - opts["fee_jitter"], 1 + opts["fee_jitter"], n)
+    slip = rng.uniform(0, opts["slippage"], n)
+    cash, stock, avg = np.full(n, float(capital)), np.zeros(n), np.zeros(n)
+    # Ngưỡng giá cắt lỗ / chốt lời theo giá vốn (không giữ hàng -> không bao giờ chạm)
+    lo, hi = np.full(n, -1.0), np.full(n, np.inf)
+    trades, wins, fees_paid = np.zeros(n, np.int64), np.zeros(n, np.int64), np.zeros(n)
+    peak, ratio_min, equity = np.full(n, float(capital)), np.ones(n), np.empty(n)
+    due_at, due_pct = np.full(n, -1, np.int64), np.zeros(n)   # Lệnh MUA chờ khớp của mỗi đường: nến khớp / tỷ lệ vốn
+    # Bộ đệm vòng giá và mức tăng; SMA / tổng mức tăng cộng trượt, RSI chỉ tính ở nến có tín hiệu MUA
+    width = max(sma_w, RSI_WINDOW) + 1
+    ring, gains = np.zeros((width, n)), np.zeros((RSI_WINDOW, n))
+    sma_sum, gain_sum = np.zeros(n), np.zeros(n)
+    p = np.full(n, float(price[0]))
+    src = np.zeros(n, np.int64)
+
+    for t in range(len(actions)):
+        if t > 0:
+            prev = p
+            if block:
+                if (t - 1) % block == 0: src = rng.integers(0, len(growth) - block + 1, n)
+                else: src += 1
+                p = p * growth[src]
+            else: p = np.full(n, float(price[t]))
+            g = np.maximum(p - prev, 0.0)
+            k = (t - 1) % RSI_WINDOW
+            gain_sum += g - gains[k]
+            gains[k] = g
+        sma_sum += p - ring[(t - sma_w) % width]
+        ring[t % width] = p
+
+        # Cắt lỗ / chốt lời ghi đè tín hiệu của nến -> chỉ xử lý các đường bị ảnh hưởng
+        act, pct = actions[t], percents[t]
+        hit = np.flatnonzero((p <= lo) | (p >= hi))
+        if act == ACTION_SELL:
+            idx = np.flatnonzero(stock > 0)
+            px = p[idx]
+            frac = np.where(px <= lo[idx], 1.0, np.where(px >= hi[idx], 0.5, pct))
+        else:
+            idx, px = hit, p[hit]
+            frac = np.where(px <= lo[idx], 1.0, 0.5)
+
+        if act == ACTION_BUY:
+            sma = sma_sum / sma_w if t >= sma_w - 1 else 0.0
+            if t >= RSI_WINDOW:
+                loss = gain_sum - (p - ring[(t - RSI_WINDOW) % width])
+                rsi = np.where(loss > 0, 100 - 100 / (1 + gain_sum / np.where(loss > 0, loss, 1.0)), np.where(gain_sum > 0, 100.0, 0.0))
+            else: rsi = 0.0
+            arm = ~(((p < sma) & (rsi > rsi_floor)) | (rsi > rsi_ob))
+            arm[hit] = False
+            armed = np.flatnonzero(arm)
+            due_at[armed] = t + rng.integers(0, max_delay + 1, len(armed)) if max_delay else t
+            due_pct[armed] = pct
+
+        if len(idx):
+            qty = stock[idx] * frac
+            if is_stock: qty = np.floor(qty / 100) * 100
+            qty = np.minimum(qty, stock[idx])
+            ok = qty > 0
+            idx, qty, px = idx[ok], qty[ok], px[ok] * (1 - slip[idx[ok]])
+            val = qty * px
+            fee_val = val * fee[idx]
+            cash[idx] += val - fee_val
+            fees_paid[idx] += fee_val
+            wins[idx] += (px - avg[idx]) * qty > 0
+            trades[idx] += 1
+            stock[idx] -= qty
+            closed = idx[stock[idx] == 0]
+            avg[closed], lo[closed], hi[closed] = 0.0, -1.0, np.inf
+            due_at[idx[due_at[idx] == t]] = -1   # Lệnh MUA tới hạn bị hủy nếu cùng nến có lệnh bán
+
+        sel = np.flatnonzero(due_at == t)
+        if len(sel):
+            px = p[sel] * (1 + slip[sel])
+            amt = cash[sel] * due_pct[sel]
+            qty = amt / px
+            if is_stock: qty = np.floor(qty / 100) * 100
+            ok = (amt > min_order) & (qty > 0)
+            sel, qty, px = sel[ok], qty[ok], px[ok]
+            val = qty * px
+            fee_val = val * fee[sel]
+            held = stock[sel]
+            avg[sel] = (held * avg[sel] + val) / (held + qty)
+            stock[sel] = held + qty
+            cash[sel] -= val + fee_val
+            fees_paid[sel] += fee_val
+            lo[sel], hi[sel] = avg[sel] * sl_mul, avg[sel] * tp_mul
+
+        np.multiply(stock, p, out=equity)
+        equity += cash
+        np.maximum(peak, equity, out=peak)
+        np.divide(equity, peak, out=equity)
+        np.minimum(ratio_min, equity, out=ratio_min)
+
+    return {"roi": (cash + stock * p) / capital - 1, "max_drawdown": ratio_min - 1, "trades": trades,
+            "win_rate": np.divide(wins, trades, out=np.zeros(n), where=trades > 0), "fees": fees_paid}
+
+def run_monte_carlo(bt, n_paths=MC_PATHS, opts=None, params=None, workers=MC_WORKERS, chunk=MC_CHUNK):
+    opts = {**MC_DEFAULTS, **(opts or {})}
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    price = bt["price"]
+    if not 0 < n_paths <= MAX_PATHS: raise ValueError(f"Số đường phải trong 1..{MAX_PATHS:,}")
+    if np.any(price <= 0): raise ValueError("Giá phải > 0 để tính lợi suất")
+    ctx = {"price": price, "growth": price[1:] / price[:-1], "actions": bt["actions"].tolist(), "percents": bt["percents"].tolist(),
+           "asset_type": bt["asset_type"], "params": params, "opts": opts}
+    # Hạt giống con cố định theo khối -> kết quả không phụ thuộc số tiến trình
+    sizes = [min(chunk, n_paths - i) for i in range(0, n_paths, chunk)]
+    jobs = list(zip(np.random.SeedSequence(int(opts["seed"])).spawn(len(sizes)), sizes))
+    if workers <= 1 or len(jobs) == 1:
+        init_worker("monte_carlo", ctx)
+        parts = [_simulate_chunk(job) for job in jobs]
+    else:
+        with process_pool(min(workers, len(jobs)), init_worker, ("monte_carlo", ctx)) as pool:
+            parts = list(pool.map(_simulate_chunk, jobs))
+    return {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+
+def format_monte_carlo_report(bt, base, paths, opts, elapsed):
+    opts = {**MC_DEFAULTS, **(opts or {})}
+    dists = {"ROI": (distribution(paths["roi"]), "+.1%"), "MaxDD": (distribution(paths["max_drawdown"]), ".1%"),
+             "Win": (distribution(paths["win_rate"]), ".0%")}
+    lines = [f"{'':<6}{'p10':>8}{'p25':>8}{'p50':>8}{'p75':>8}{'p90':>8}"]
+    for name, (d, f) in dists.items():
+        lines.append(f"{name:<6}" + "".join(f"{format(d[k], f):>8}" for k in ("p10", "p25", "median", "p75", "p90")))
+    roi = paths["roi"]
+    return (
+        f"🎲 <b>MONTE CARLO: {bt['symbol'].upper()}</b>\n"
+        f"⏳ {bt['days']} ngày | 🕯 {len(bt['price'])} nến | 🔢 {len(roi):,} đường | ⏱ {elapsed:.1f}s\n"
+        f"🧩 Khối {opts['block']} nến | trễ 0-{opts['delay']} nến | phí ±{opts['fee_jitter']:.0%} | trượt giá ≤{opts['slippage']:.2%}\n"
+        f"<pre>" + "\n".join(lines) + "</pre>\n"
+        f"📌 <b>Đường thật:</b> ROI {base['roi']:+.2%}, MaxDD {base['max_drawdown']:.1%} (hơn {np.mean(roi < base['roi']):.0%} số đường)\n"
+        f"💀 <b>Xác suất lỗ:</b> {np.mean(roi < 0):.1%} | Lỗ >20%: {np.mean(roi < -0.2):.1%}\n"
+        f"🛒 <b>Số lệnh (p50):</b> {np.median(paths['trades']):.0f}"
+    )
+
+def run_monte_carlo_report(symbol, days, signals, n_paths=MC_PATHS, opts=None, workers=MC_WORKERS):
+    try:
+        bt, msg = load_backtest_arrays(symbol, days, signals)
+        if bt is None: return msg
+        started = time.time()
+        sma20, rsi = compute_indicators(bt["price"])
+        base = summarize_stats(simulate_arrays(bt["price"], sma20, rsi, bt["actions"], bt["percents"], bt["asset_type"]))
+        paths = run_monte_carlo(bt, n_paths, opts, workers=workers)
+        return format_monte_carlo_report(bt, base, paths, opts, time.time() - started)
+    except Exception as e:
+        print(f"❌ [BUILD LOG] Exception in Monte Carlo: {str(e)}")
+        return f"❌ <b>Lỗi Monte Carlo</b>: {str(e)}"
+
+# Lệnh Telegram: "mc MÃ [NGÀY] [paths=N] [block=24] [delay=3] [fee=0.5] [slip=0.001] [seed=0]"
+def parse_monte_carlo_args(parts):
+    if not parts: raise ValueError("Thiếu mã tài sản")
+    symbol, days, n_paths, opts = parts[0].upper(), 365, MC_PATHS, {}
+    for p in parts[1:]:
+        if "=" in p:
+            name, _, value = p.partition("=")
+            if name.lower() == "paths": n_paths = int(value)
+            elif name.lower() in MC_ALIASES:
+                key = MC_ALIASES[name.lower()]
+                opts[key] = int(value) if key in ("block", "delay", "seed") else float(value)
+            else: raise ValueError(f"Tham số lạ: {name}")
+        else: days = int(p)
+    return symbol, days, n_paths, opts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo: phân phối ROI / drawdown trên các đường giá nhiễu từ dữ liệu thật")
+    parser.add_argument("symbol")
+    parser.add_argument("days", type=int, nargs="?", default=365)
+    parser.add_argument("--paths", type=int, default=MC_PATHS)
+    for alias, key in MC_ALIASES.items():
+        parser.add_argument(f"--{alias}", dest=key, type=type(MC_DEFAULTS[key]), default=MC_DEFAULTS[key])
+    parser.add_argument("--workers", type=int, default=MC_WORKERS)
+    args = parser.parse_args()
+    opts = {key: getattr(args, key) for key in MC_DEFAULTS}
+    report = run_monte_carlo_report(args.symbol, args.days, load_signal_table(), args.paths, opts, args.workers)
+    print_report(report)
@@ -0,0 +1,84 @@
+import os
+import time
+import queue
+import threading
+import requests
+
+from concurrency import TokenBucket, host_slot
+from run_profile import profile, span
+
+# --- CẤU HÌNH NOTION ---
+NOTION_API = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+NOTION_RATE = float(os.environ.get("NOTION_RATE", 3))          # Notion cho phép ~3 req/s
+NOTION_WRITE_WORKERS = int(os.environ.get("NOTION_WRITE_WORKERS", 3))
+NOTION_MAX_RETRIES = 5
+
+class NotionClient:
+    def __init__(self, token, rate=NOTION_RATE, workers=NOTION_WRITE_WORKERS):
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json", "Notion-Version": NOTION_VERSION})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(4, workers + 2))
+        self.session.mount("https://", adapter)
+        self.bucket = TokenBucket(rate)
+        self.workers = workers
+        self.queue = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0}
+
+    def _count(self, field, n=1):
+        with self.lock: self.stats[field] += n
+
+    # Gọi API có giới hạn tốc độ, tự thử lại khi 429/5xx (tôn trọng Retry-After)
+    def request(self, endpoint, method="POST", payload=None):
+        url = f"{NOTION_API}/{endpoint}"
+        for attempt in range(NOTION_MAX_RETRIES + 1):
+            self.bucket.acquire()
+            try:
+                with host_slot("api.notion.com") as slot:
+                    response = self.session.request(method, url, json=payload if method == "POST" else None, timeout=30)
+                    slot.nbytes = len(response.content)
+            except requests.RequestException as e:
+                response, delay = None, min(30, 2 ** attempt)
+                print(f"⚠️ [BUILD LOG] Notion lỗi kết nối ({e}), thử lại sau {delay}s")
+            else:
+                if response.status_code == 200: return response.json()
+                if response.status_code != 429 and response.status_code < 500: return None
+                try: delay = float(response.headers.get("Retry-After"))
+                except (TypeError, ValueError): delay = min(30, 2 ** attempt)
+            if attempt == NOTION_MAX_RETRIES: break
+            self._count("retries")
+            profile.record_retry("api.notion.com")
+            time.sleep(delay)
+        return None
+
+    # --- HÀNG ĐỢI GHI PAGE ---
+    def _worker(self):
+        while True:
+            payload, on_success = self.queue.get()
+            try:
+                with span("notion_write"): ok = self.request("pages", "POST", payload) is not None
+                self._count("sent" if ok else "failed")
+                if ok and on_success: on_success()
+            except Exception as e:
+                print(f"❌ [BUILD LOG] Lỗi ghi Notion: {e}")
+                self._count("failed")
+            finally:
+                self.queue.task_done()
+
+    def queue_page(self, payload, on_success=None):
+        with self.lock:
+            self.stats["queued"] += 1
+            if not self.threads:
+                for _ in range(max(1, self.workers)):
+                    t = threading.Thread(target=self._worker, daemon=True)
+                    t.start()
+                    self.threads.append(t)
+        self.queue.put((payload, on_success))
+
+    def flush(self): self.queue.join()
+
+    def summary(self):
+        with self.lock: s = dict(self.stats)
+        return f"📝 Notion: đã xếp hàng {s['queued']}, đã ghi {s['sent']}, lỗi {s['failed']}, thử lại {s['retries']}"
@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import argparse
+
+import numpy as np
+
+from backtest import DEFAULT_PARAMS, FEE_CRYPTO, FEE_STOCK, filter_buy_signals, get_backtest_config, load_backtest_arrays
+from batch_backtest import resolve_symbols
+from concurrency import run_parallel
+from indicators import compute_indicators
+from market_data import USD_VND_RATE
+from signal_table import ACTION_BUY, ACTION_HOLD, ACTION_SELL, as_signal_table, load_signal_table
+from telegram_sender import print_report
+
+# --- BACKTEST DANH MỤC NHIỀU TÀI SẢN, VỐN DÙNG CHUNG ---
+# Trục thời gian chung = hợp các giờ có nến (cổ phiếu chỉ trong phiên, crypto 24h). Giá được giữ nguyên (ffill)
+# ngoài giờ giao dịch để định giá NAV; lệnh chỉ khớp ở giờ tài sản đó có nến thật.
+# Chế độ tiền mặt: "shared" (một quỹ VNĐ, crypto quy đổi theo tỷ giá), "bucket" (quỹ VNĐ + quỹ USD),
+# "independent" (mỗi tài sản vốn riêng như chiến dịch hiện tại).
+CASH_MODES = ("shared", "bucket", "independent")
+PORTFOLIO_WORKERS = int(os.environ.get("PORTFOLIO_WORKERS", 8))
+
+# assets: list (mã backtest, vốn ban đầu theo tiền tệ của tài sản hoặc None = mặc định theo loại)
+def load_portfolio_data(assets, days, signals, workers=PORTFOLIO_WORKERS):
+    signals = as_signal_table(signals)
+    loaded = run_parallel(lambda a: (a, load_backtest_arrays(a[0], days, signals)), assets, workers)
+    ok, failed = [], []
+    for (symbol, capital), (bt, msg) in loaded:
+        if bt is None: failed.append((symbol, re.sub(r"<[^>]+>", "", msg).replace("\n", " ")))
+        else: ok.append((bt, capital if capital else get_backtest_config(bt["asset_type"])[0]))
+    return ok, failed
+
+# Căn các chuỗi về trục thời gian chung -> ma trận (tài sản × thời điểm)
+def align_assets(items, params):
+    timeline = np.unique(np.concatenate([bt["ts"] for bt, _ in items]))
+    n, T = len(items), len(timeline)
+    price = np.empty((n, T))
+    signal = np.full((n, T), ACTION_HOLD, dtype=np.int8)
+    pct = np.zeros((n, T))
+    live = np.zeros((n, T), dtype=bool)
+    for i, (bt, _) in enumerate(items):
+        sma20, rsi = compute_indicators(bt["price"], params["sma_window"])
+        filtered = filter_buy_signals(bt["price"], sma20, rsi, bt["actions"], params)
+        idx = np.searchsorted(timeline, bt["ts"])
+        live[i, idx], signal[i, idx], pct[i, idx] = True, filtered, bt["percents"]
+        # Giá ffill theo nến gần nhất trước đó; trước nến đầu tiên dùng giá mở đầu (chưa có vị thế nên không ảnh hưởng NAV)
+        pos = np.searchsorted(bt["ts"], timeline, side="right") - 1
+        price[i] = bt["price"][np.clip(pos, 0, None)]
+    return timeline, price, signal, pct, live
+
+def simulate_portfolio(items, cash_mode="shared", fx_rate=USD_VND_RATE, params=None):
+    if cash_mode not in CASH_MODES: raise ValueError(f"Chế độ tiền mặt phải là một trong {', '.join(CASH_MODES)}")
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    stop_loss, take_profit = params["stop_loss"], params["take_profit"]
+    timeline, price, signal, pct, live = align_assets(items, params)
+    n, T = price.shape
+
+    is_stock = [bt["asset_type"] == "STOCK" for bt, _ in items]
+    fee = [FEE_STOCK if s else FEE_CRYPTO for s in is_stock]
+    min_order = [get_backtest_config(bt["asset_type"])[2] for bt, _ in items]
+    to_vnd = [1.0 if s else fx_rate for s in is_stock]
+    # Quy đổi tiền tệ tài sản -> tiền tệ quỹ; quỹ "shared" tính bằng VNĐ, các chế độ khác giữ nguyên tiền tệ
+    conv = to_vnd if cash_mode == "shared" else [1.0] * n
+    if cash_mode == "shared": pool_of = [0] * n
+    elif cash_mode == "bucket": pool_of = [0 if s else 1 for s in is_stock]
+    else: pool_of = list(range(n))
+    pool_ids = sorted(set(pool_of))
+    cash = {p: 0.0 for p in pool_ids}
+    for i, (_, capital) in enumerate(items): cash[pool_of[i]] += capital * conv[i]
+    pool_capital = dict(cash)
+    pool_vnd = {pool_of[i]: to_vnd[i] / conv[i] for i in range(n)}   # Quy đổi tiền tệ quỹ -> VNĐ
+    weight = [items[i][1] * conv[i] / pool_capital[pool_of[i]] for i in range(n)]
+
+    stock, avg_price = [0.0] * n, [0.0] * n
+    trades, wins, losses, fees_paid, realized = [0] * n, [0] * n, [0] * n, [0.0] * n, [0.0] * n
+    equity = np.empty(T)
+    invested = np.empty(T)
+
+    prices_t = price.T.tolist()
+    live_idx = [np.flatnonzero(col).tolist() for col in live.T]
+    sig_t, pct_t = signal.T.tolist(), pct.T.tolist()
+    held = set()
+
+    for t in range(T):
+        px, sig_row, pct_row = prices_t[t], sig_t[t], pct_t[t]
+        for i in live_idx[t]:
+            p, sig, pc = px[i], sig_row[i], pct_row[i]
+            if stock[i] > 0 and avg_price[i] > 0:
+                holding_pnl = (p - avg_price[i]) / avg_price[i]
+                if holding_pnl <= stop_loss: sig, pc = ACTION_SELL, 1.0
+                elif holding_pnl >= take_profit: sig, pc = ACTION_SELL, 0.5
+            pool = pool_of[i]
+            if sig == ACTION_BUY:
+                amt = cash[pool] * pc * weight[i] / conv[i]   # theo tiền tệ tài sản
+                if amt > min_order[i]:
+                    qty = amt / p
+                    if is_stock[i]: qty = int(qty // 100) * 100
+                    if qty > 0:
+                        buy_val = qty * p
+                        fee_val = buy_val * fee[i]
+                        fees_paid[i] += fee_val
+                        avg_price[i] = (stock[i] * avg_price[i] + buy_val) / (stock[i] + qty)
+                        stock[i] += qty
+                        cash[pool] -= (buy_val + fee_val) * conv[i]
+                        held.add(i)
+            elif sig == ACTION_SELL and stock[i] > 0:
+                qty = stock[i] * pc
+                if is_stock[i]: qty = int(qty // 100) * 100
+                if qty > stock[i]: qty = stock[i]
+                if qty > 0:
+                    sell_val = qty * p
+                    fee_val = sell_val * fee[i]
+                    fees_paid[i] += fee_val
+                    stock[i] -= qty
+                    cash[pool] += (sell_val - fee_val) * conv[i]
+                    gross = (p - avg_price[i]) * qty
+                    realized[i] += gross
+                    if gross > 0: wins[i] += 1
+                    elif gross < 0: losses[i] += 1
+                    trades[i] += 1
+                    if stock[i] == 0: avg_price[i] = 0.0; held.discard(i)
+        # NAV quy về VNĐ để so sánh được giữa các chế độ
+        pos_val = sum(stock[i] * px[i] * to_vnd[i] for i in held)
+        equity[t] = pos_val + sum(cash[p] * pool_vnd[p] for p in pool_ids)
+        invested[t] = pos_val
+
+    capital_vnd = sum(c * to_vnd[i] for i, (_, c) in enumerate(items))
+    peak = np.maximum.accumulate(np.concatenate(([capital_vnd], equity)))[1:]
+    drawdown = (equity - peak) / peak
+    exposure = np.divide(invested, equity, out=np.zeros(T), where=equity > 0)
+    per_asset = []
+    for i, (bt, capital) in enumerate(items):
+        last = price[i, -1]
+        per_asset.append({"symbol": bt["symbol"].upper(), "type": bt["asset_type"], "trades": trades[i], "wins": wins[i], "losses": losses[i],
+                          "fees_vnd": fees_paid[i] * to_vnd[i],
+                          "pnl_vnd": (realized[i] + stock[i] * (last - avg_price[i]) - fees_paid[i]) * to_vnd[i],
+                          "weight": capital * to_vnd[i] / capital_vnd, "holding": stock[i] > 0})
+    return {"mode": cash_mode, "timeline": timeline, "equity": equity, "capital_vnd": capital_vnd, "final_vnd": float(equity[-1]),
+            "roi": float(equity[-1] / capital_vnd - 1), "max_drawdown": float(drawdown.min()), "exposure_avg": float(exposure.mean()),
+            "exposure_max": float(exposure.max()), "trades": sum(trades), "fees_vnd": sum(a["fees_vnd"] for a in per_asset), "assets": per_asset}
+
+def format_portfolio_report(result, days, failed, elapsed, fx_rate=USD_VND_RATE):
+    lines = [f"{'Mã':<9} {'Tỷ trọng':>8} {'Lệnh':>4} {'Lãi/Lỗ':>10}"]
+    for a in sorted(result["assets"], key=lambda a: a["pnl_vnd"], reverse=True):
+        lines.append(f"{a['symbol'][:9]:<9} {a['weight']:>8.0%} {a['trades']:>4} {a['pnl_vnd']/1e6:>+9.1f}tr")
+    msg = (
+        f"💼 <b>BACKTEST DANH MỤC ({len(result['assets'])} mã, tiền mặt: {result['mode']})</b>\n"
+        f"⏳ {days} ngày | 🕯 {len(result['timeline'])} mốc giờ | 💱 {fx_rate:,.0f} đ/$ | ⏱ {elapsed:.1f}s\n"
+        f"--------------------------\n"
+        f"💰 <b>Vốn:</b> {result['capital_vnd']/1e6:,.1f} tr → <b>{result['final_vnd']/1e6:,.1f} tr</b>\n"
+        f"🚀 <b>ROI: {result['roi']:+.2%}</b> | 📉 MaxDD {result['max_drawdown']:.1%}\n"
+        f"📊 <b>Tỷ trọng đầu tư:</b> TB {result['exposure_avg']:.0%}, cao nhất {result['exposure_max']:.0%}\n"
+        f"🛒 {result['trades']} lệnh | 💸 Phí {result['fees_vnd']/1e6:,.1f} tr\n"
+        f"<pre>" + "\n".join(lines) + "</pre>"
+    )
+    if failed: msg += "\n⚠️ <b>Bỏ qua:</b>\n" + "\n".join(f"• {s}: {m}" for s, m in failed)
+    return msg
+
+def run_portfolio_report(assets, days, signals, cash_mode="shared", fx_rate=USD_VND_RATE):
+    try:
+        started = time.time()
+        items, failed = load_portfolio_data(assets, days, signals)
+        if not items: return "❌ <b>Backtest danh mục thất bại</b>: không tải được dữ liệu.\n" + "\n".join(f"• {s}: {m}" for s, m in failed)
+        result = simulate_portfolio(items, cash_mode, fx_rate)
+        return format_portfolio_report(result, days, failed, time.time() - started, fx_rate)
+    except Exception as e:
+        print(f"❌ [BUILD LOG] Exception in Portfolio Backtest: {str(e)}")
+        return f"❌ <b>Lỗi backtest danh mục</b>: {str(e)}"
+
+# Lệnh Telegram: "pf [MÃ,MÃ|@list] [NGÀY] [shared|bucket|independent]" (không có mã -> các chiến dịch đang chạy)
+def parse_portfolio_args(parts):
+    tokens, days, mode = [], 365, "shared"
+    for p in parts:
+        if p.lower() in CASH_MODES: mode = p.lower()
+        elif p.isdigit(): days = int(p)
+        else: tokens.append(p)
+    return (resolve_symbols(tokens) if tokens else []), days, mode
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest danh mục nhiều tài sản với vốn dùng chung")
+    parser.add_argument("symbols", help="VD BTCUSDT,ETHUSDT,FPT hoặc @vn30; thêm :VỐN để đặt vốn, VD FPT:200000000")
+    parser.add_argument("days", type=int, nargs="?", default=365)
+    parser.add_argument("--cash", choices=CASH_MODES, default="shared")
+    parser.add_argument("--fx", type=float, default=USD_VND_RATE)
+    args = parser.parse_args()
+    assets = []
+    for token in args.symbols.split(","):
+        sym, _, cap = token.partition(":")
+        assets += [(s, float(cap) if cap else None) for s in resolve_symbols([sym])]
+    report = run_portfolio_report(assets, args.days, load_signal_table(), args.cash, args.fx)
+    print_report(report)
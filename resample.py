@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+
+from candle_series import CandleSeries
+from candle_store import get_store
+from hexagram_calendar import VN_OFFSET_SEC
+
+# --- KHUNG THỜI GIAN LỚN DỰNG TỪ NẾN 1H ---
+# Chỉ tải nến 1h; nến 2h/4h/1d được gộp cục bộ (open đầu, high max, low min, close cuối, volume tổng) và lưu lại
+# trong kho nến theo khung riêng. Mỗi nến lớn mang ts = giờ mở cửa; biên nến tính theo giờ Việt Nam.
+# "2h" căn theo giờ chi của calculate_hexagram (Tý 23h-1h, Sửu 1h-3h...) nên mỗi nến 2h trùng đúng một giờ chi.
+# (độ dài giây, độ lệch biên so với 0h giờ VN)
+TIMEFRAMES = {"1h": (3600, 0), "2h": (7200, 3600), "4h": (14400, 0), "1d": (86400, 0)}
+TIMEFRAME_ALIASES = {"chi": "2h", "h1": "1h", "h2": "2h", "h4": "4h", "d1": "1d", "1D": "1d", "1H": "1h"}
+
+# Tách token khung thời gian khỏi tham số lệnh: ["BTC", "90", "4h"] -> (["BTC", "90"], "4h")
+def pop_timeframe(parts, default="1h"):
+    rest, timeframe = [], default
+    for p in parts:
+        if p.lower() in TIMEFRAMES or p in TIMEFRAME_ALIASES or p.lower() in TIMEFRAME_ALIASES: timeframe = parse_timeframe(p)
+        else: rest.append(p)
+    return rest, timeframe
+
+def parse_timeframe(text):
+    tf = TIMEFRAME_ALIASES.get(text, TIMEFRAME_ALIASES.get(text.lower(), text.lower()))
+    if tf not in TIMEFRAMES: raise ValueError(f"Khung thời gian không hỗ trợ: {text} (dùng {', '.join(TIMEFRAMES)})")
+    return tf
+
+def timeframe_step(timeframe): return TIMEFRAMES[timeframe][0]
+
+# Giờ mở cửa của nến khung lớn chứa ts (nhận số hoặc mảng NumPy)
+def bar_start(ts, timeframe):
+    step, offset = TIMEFRAMES[timeframe]
+    shift = VN_OFFSET_SEC - offset
+    return (ts + shift) // step * step - shift
+
+def resample_series(series, timeframe):
+    if timeframe == "1h" or not len(series): return series
+    keys = bar_start(series.ts, timeframe)
+    first = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    last = np.concatenate((first[1:], [len(keys)])) - 1
+    return CandleSeries(keys[first], series.open[first], np.maximum.reduceat(series.high, first),
+                        np.minimum.reduceat(series.low, first), series.close[last], np.add.reduceat(series.volume, first))
+
+def _rows(series):
+    return zip(series.ts.tolist(), series.open.tolist(), series.high.tolist(), series.low.tolist(), series.close.tolist(), series.volume.tolist())
+
+# Đọc nến khung lớn của key trong [start_ts, end_ts] sau khi nến 1h của khoảng đó đã được nạp vào kho.
+# Chỉ gộp lại phần chưa có; nến lớn đang chạy hoặc nằm trên khoảng 1h chưa tải đủ không được đánh dấu để lần sau gộp lại.
+def load_resampled(key, timeframe, start_ts, end_ts, store=None, now_ts=None):
+    store = store or get_store()
+    if timeframe == "1h": return store.read_series(key, "1h", start_ts, end_ts)
+    step = timeframe_step(timeframe)
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    for a, b in store.missing_ranges(key, timeframe, bar_start(start_ts, timeframe), end_ts):
+        bars = resample_series(store.read_series(key, "1h", a, b + step - 1), timeframe)
+        store.write(key, timeframe, list(_rows(bars)))
+        # Phủ tới nến lớn cuối cùng đã đóng và đủ nến 1h (trước khoảng 1h còn thiếu đầu tiên)
+        limit = min(now_ts, b + step)
+        hourly_missing = store.missing_ranges(key, "1h", a, min(b + step, now_ts) - 3600)
+        if hourly_missing: limit = min(limit, hourly_missing[0][0])
+        last_closed = bar_start(limit, timeframe) - step
+        if last_closed >= a: store.mark_covered(key, timeframe, a, last_closed)
+    return store.read_series(key, timeframe, start_ts, end_ts)
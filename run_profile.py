@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from hexagram_calendar import CACHE_DIR
+
+# --- ĐO THỜI GIAN / ĐẾM REQUEST CHO MỘT LƯỢT CHẠY ---
+# Span theo tên (fetch, indicators, hexagram, simulate, notion_write, telegram...), gộp thêm theo chiến dịch
+# của luồng hiện tại; bộ đếm theo host (request, byte, thử lại, lỗi, độ trễ). Xuất ra file JSON cuối lượt.
+PROFILE_FILE = os.environ.get("RUN_PROFILE_FILE", os.path.join(CACHE_DIR, "run_profile.json"))
+PROFILE_DIR = os.path.join(CACHE_DIR, "profile")
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals: return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+def _timing(vals):
+    s = sorted(vals)
+    return {"count": len(s), "total_s": round(sum(s), 4), "p50_ms": round(_percentile(s, 0.5) * 1000, 2),
+            "p90_ms": round(_percentile(s, 0.9) * 1000, 2), "p99_ms": round(_percentile(s, 0.99) * 1000, 2),
+            "max_ms": round((s[-1] if s else 0) * 1000, 2)}
+
+class RunProfile:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self.meta = {}   # Giữ qua các lần reset (VD thời gian khởi động)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.spans, self.campaigns, self.hosts = {}, {}, {}
+
+    # Nhãn chiến dịch cho các span chạy trong luồng hiện tại
+    def set_campaign(self, name): self._local.campaign = name
+
+    def record_span(self, name, seconds):
+        campaign = getattr(self._local, "campaign", None)
+        with self.lock:
+            self.spans.setdefault(name, []).append(seconds)
+            if campaign: self.campaigns.setdefault(campaign, {}).setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.record_span(name, time.perf_counter() - t0)
+
+    def _host(self, host):
+        if host not in self.hosts: self.hosts[host] = {"requests": 0, "bytes": 0, "retries": 0, "errors": 0, "latency": []}
+        return self.hosts[host]
+
+    def record_request(self, host, seconds, nbytes=0, error=False):
+        with self.lock:
+            h = self._host(host)
+            h["requests"] += 1
+            h["bytes"] += int(nbytes or 0)
+            h["errors"] += int(bool(error))
+            h["latency"].append(seconds)
+
+    def record_retry(self, host):
+        with self.lock: self._host(host)["retries"] += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                **self.meta, "started": self.started, "elapsed_s": round(time.time() - self.started, 3),
+                "spans": {k: _timing(v) for k, v in self.spans.items()},
+                "campaigns": {c: {k: _timing(v) for k, v in d.items()} for c, d in self.campaigns.items()},
+                "hosts": {host: {**{k: v for k, v in h.items() if k != "latency"}, "latency": _timing(h["latency"])}
+                          for host, h in self.hosts.items()},
+            }
+
+    def write(self, path=PROFILE_FILE):
+        data = self.to_dict()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        return data
+
+def format_profile_summary(data, top=5):
+    spans = sorted(data["spans"].items(), key=lambda kv: kv[1]["total_s"], reverse=True)[:top]
+    lines = [f"{name:<13} {t['total_s']:>7.2f}s {t['count']:>5}x" for name, t in spans]
+    lines += [f"{host[:13]:<13} {h['requests']:>4} req {h['bytes']/1024:>7.0f}KB p90 {h['latency']['p90_ms']:>5.0f}ms"
+              + (f" ↻{h['retries']}" if h["retries"] else "") for host, h in data["hosts"].items()]
+    return f"⏱ <b>PROFILE LƯỢT CHẠY</b> ({data['elapsed_s']:.1f}s)\n<pre>" + "\n".join(lines) + "</pre>"
+
+profile = RunProfile()
+span = profile.span
+
+# --- cProfile tùy chọn (VD cho run_backtest_core) ---
+@contextmanager
+def cprofile_to(label, top=15):
+    import cProfile
+    import pstats
+    prof = cProfile.Profile()
+    prof.enable()
+    try: yield
+    finally:
+        prof.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{label}_{int(time.time() * 1000)}.prof")
+        prof.dump_stats(path)
+        print(f"🔬 [BUILD LOG] cProfile -> {path}")
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(top)
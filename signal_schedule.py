@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import struct
+import threading
+
+import numpy as np
+
+from hexagram_calendar import CACHE_DIR, KEY_IDS, lookup_codes
+from resample import bar_start
+from signal_table import ACTION_NAMES, load_signal_table
+
+# --- LỊCH TÍN HIỆU TÍNH TRƯỚC ---
+# Quẻ / lời khuyên / lệnh chỉ phụ thuộc thời điểm -> tính sẵn một lần cho mỗi giờ chi (2h, Tý 23h-1h...) trong vài ngày
+# tới, dùng chung cho mọi chiến dịch, bản tin sáng và lệnh "quẻ". Tra cứu = một phép chia lấy chỉ số ô.
+# Tự tạo lại khi hết hạn hoặc khi bảng tín hiệu đổi (fingerprint); ts nằm ngoài lịch tra thẳng lịch quẻ.
+SCHEDULE_FILE = os.path.join(CACHE_DIR, "signal_schedule.bin")
+SCHEDULE_DAYS = int(os.environ.get("SIGNAL_SCHEDULE_DAYS", 14))
+SCHEDULE_BACKFILL_DAYS = 3   # Giữ vài ngày trước đó cho nến đang xử lý lại
+MIN_AHEAD_SEC = 86400        # Còn ít hơn 1 ngày phía trước -> tạo lại
+SLOT_SEC = 7200
+
+# File nhị phân: header (magic, fingerprint bảng tín hiệu, ts ô đầu, số ô) + mã quẻ uint16 + lệnh int8 + tỷ trọng float64
+_MAGIC = b"SIGSCH1\0"
+_HEADER = struct.Struct("<8s40sqi")
+
+class SignalSchedule:
+    def __init__(self, start_ts, codes, actions, percents, fingerprint, signals):
+        self.start_ts, self.fingerprint, self.signals = int(start_ts), fingerprint, signals
+        self.codes = np.asarray(codes, dtype=np.int16)
+        self.actions = np.asarray(actions, dtype=np.int8)
+        self.percents = np.asarray(percents, dtype=np.float64)
+        self.end_ts = self.start_ts + len(self.codes) * SLOT_SEC   # Không bao gồm
+
+    @classmethod
+    def build(cls, signals, now_ts=None, days=SCHEDULE_DAYS):
+        now_ts = int(time.time()) if now_ts is None else now_ts
+        start = int(bar_start(now_ts - SCHEDULE_BACKFILL_DAYS * 86400, "2h"))
+        slots = start + np.arange((days + SCHEDULE_BACKFILL_DAYS) * 86400 // SLOT_SEC, dtype=np.int64) * SLOT_SEC
+        codes = lookup_codes(slots)
+        actions, percents = signals.lookup(codes)
+        return cls(start, codes, actions, percents, signals.fingerprint(), signals)
+
+    def covers(self, start_ts, end_ts): return self.start_ts <= start_ts and end_ts < self.end_ts
+
+    # Mảng epoch (giây) -> (mã quẻ, lệnh, tỷ trọng)
+    def lookup(self, epoch_sec):
+        ts = np.asarray(epoch_sec, dtype=np.int64)
+        idx = (ts - self.start_ts) // SLOT_SEC
+        inside = (idx >= 0) & (idx < len(self.codes))
+        if inside.all(): return self.codes[idx], self.actions[idx], self.percents[idx]
+        codes = np.empty(ts.shape, dtype=np.int16)
+        codes[inside] = self.codes[idx[inside]]
+        codes[~inside] = lookup_codes(ts[~inside])
+        actions, percents = self.signals.lookup(codes)
+        return codes, actions, percents
+
+    def code_at(self, ts): return int(self.lookup([ts])[0][0])
+
+    # Các ô giờ chi từ ô chứa from_ts trong hours giờ tới
+    def upcoming(self, from_ts, hours):
+        slots = np.arange(int(bar_start(from_ts, "2h")), from_ts + hours * 3600, SLOT_SEC, dtype=np.int64)
+        codes, actions, percents = self.lookup(slots)
+        return list(zip(slots.tolist(), codes.tolist(), actions.tolist(), percents.tolist()))
+
+def save_schedule(path, schedule):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, schedule.fingerprint.encode("ascii"), schedule.start_ts, len(schedule.codes)))
+        f.write(schedule.codes.astype("<u2").tobytes() + schedule.actions.tobytes() + schedule.percents.astype("<f8").tobytes())
+    os.replace(tmp, path)
+
+def open_schedule(path, signals):
+    with open(path, "rb") as f: raw = f.read()
+    magic, fingerprint, start_ts, n = _HEADER.unpack_from(raw)
+    if magic != _MAGIC or len(raw) != _HEADER.size + n * 11: raise ValueError(f"File lịch tín hiệu không hợp lệ: {path}")
+    pos = _HEADER.size
+    codes = np.frombuffer(raw, dtype="<u2", count=n, offset=pos)
+    actions = np.frombuffer(raw, dtype=np.int8, count=n, offset=pos + 2 * n)
+    percents = np.frombuffer(raw, dtype="<f8", count=n, offset=pos + 3 * n)
+    return SignalSchedule(start_ts, codes, actions, percents, fingerprint.decode("ascii"), signals)
+
+_schedule = None
+_lock = threading.Lock()
+
+# Lịch phủ [now_ts, until_ts] cho bảng tín hiệu hiện tại; đọc file nếu còn hạn, không thì tạo lại và lưu
+def get_signal_schedule(signals=None, now_ts=None, until_ts=None, path=SCHEDULE_FILE):
+    global _schedule
+    signals = signals or load_signal_table()
+    now_ts = int(time.time()) if now_ts is None else now_ts
+    until_ts = max(until_ts or 0, now_ts + MIN_AHEAD_SEC)
+    fingerprint = signals.fingerprint()
+    valid = lambda s: s is not None and s.fingerprint == fingerprint and s.covers(now_ts, until_ts)
+    with _lock:
+        if valid(_schedule): return _schedule
+        try: schedule = open_schedule(path, signals)
+        except (OSError, ValueError, struct.error): schedule = None
+        if not valid(schedule):
+            days = max(SCHEDULE_DAYS, -(-(until_ts - now_ts) // 86400) + 1)
+            print(f"🗓 [BUILD LOG] Tạo lịch tín hiệu {days} ngày tới...")
+            schedule = SignalSchedule.build(signals, now_ts, days)
+            try: save_schedule(path, schedule)
+            except OSError as e: print(f"⚠️ [BUILD LOG] Không lưu được lịch tín hiệu: {e}")
+        _schedule = schedule
+        return schedule
+
+def format_schedule_report(schedule, from_ts, hours=24, only_trades=False):
+    icons = {"MUA": "🟢", "BÁN": "🔴", "GIỮ": "✊"}
+    lines = []
+    for ts, code, action, percent in schedule.upcoming(from_ts, hours):
+        name = ACTION_NAMES[action]
+        if only_trades and name == "GIỮ": continue
+        when = time.strftime("%H:%M %d/%m", time.gmtime(ts + 7 * 3600))
+        advice = schedule.signals.advice[code] or "(Chưa có lời khuyên)"
+        if len(advice) > 90: advice = advice[:89].rstrip() + "…"
+        size = f" {percent:.0%}" if name != "GIỮ" else ""
+        lines.append(f"{icons[name]} <b>{when}</b> {KEY_IDS[code]}: {name}{size}\n   <i>{advice}</i>")
+    if not lines: return f"🔮 Không có tín hiệu MUA/BÁN trong {hours} giờ tới."
+    return (f"🔮 <b>LỊCH QUẺ {hours} GIỜ TỚI</b> (theo giờ chi, chưa qua bộ lọc SMA/RSI)\n"
+            f"--------------------------\n" + "\n".join(lines))
+
+# "quẻ [GIỜ] [lệnh]": GIỜ mặc định 24; "lệnh" chỉ hiện ô MUA/BÁN
+def parse_schedule_args(parts):
+    hours, only_trades = 24, False
+    for p in parts:
+        if p.isdigit(): hours = int(p)
+        elif p.lower() in ("lệnh", "lenh", "trade"): only_trades = True
+        else: raise ValueError(f"Tham số không hợp lệ: {p}")
+    if not 0 < hours <= SCHEDULE_DAYS * 24 * 2: raise ValueError(f"Số giờ phải trong 1-{SCHEDULE_DAYS * 48}")
+    return hours, only_trades
+
+if __name__ == "__main__":
+    signals = load_signal_table()
+    hours, only_trades = parse_schedule_args(sys.argv[1:])
+    now_ts = int(time.time())
+    schedule = get_signal_schedule(signals, now_ts, now_ts + hours * 3600)
+    print(format_schedule_report(schedule, now_ts, hours, only_trades))
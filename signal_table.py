@@ -0,0 +1,125 @@
+import os
+import threading
+import io
+import csv
+import json
+import hashlib
+import numpy as np
+
+from hexagram_calendar import CACHE_DIR, KEY_IDS, KEY_INDEX
+
+# --- CẤU HÌNH ---
+ADVICE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_loi_khuyen.csv')
+SIGNAL_CACHE = os.path.join(CACHE_DIR, "signal_table.json")
+
+BACKUP_CSV = """KEY_ID,Lời Khuyên
+G1-B1,Đại cát đại lợi, thời cơ chín muồi. Nên mua tất tay.
+G1-B43,Nguy hiểm rình rập, bán tháo ngay lập tức.
+G1-B14,Vận khí tốt, có thể mua vào tích lũy.
+G23-B4,Mông lung xấu, nên hạ tỷ trọng bán bớt."""
+
+ACTION_HOLD, ACTION_BUY, ACTION_SELL = 0, 1, 2
+ACTION_NAMES = ["GIỮ", "MUA", "BÁN"]
+ACTION_CODES = {name: code for code, name in enumerate(ACTION_NAMES)}
+
+# --- PHÂN TÍCH LỜI KHUYÊN (chỉ chạy lúc biên dịch bảng) ---
+# Tăng khi đổi luật phân tích bên dưới -> bảng đã biên dịch (cache đĩa, khóa cache backtest) được tạo lại
+RULES_VERSION = 1
+
+def analyze_smart_action(text):
+    if not isinstance(text, str) or not text: return "GIỮ", 0.0
+    text = text.lower()
+    avoid = ['đứng ngoài', 'quan sát', 'không nên mua', 'rút lui', 'chờ đợi', 'thận trọng']
+    if any(w in text for w in avoid): return "GIỮ", 0.0
+    strong_buy = ['đại cát', 'lợi lớn', 'bay cao', 'thời cơ vàng', 'mua ngay', 'tất tay', 'all-in']
+    if any(w in text for w in strong_buy): return "MUA", 1.0
+    strong_sell = ['nguy hiểm', 'sập', 'tháo chạy', 'bán tháo', 'tuyệt vọng', 'cắt lỗ ngay']
+    if any(w in text for w in strong_sell): return "BÁN", 1.0
+    normal_buy = ['mua', 'tốt', 'lãi', 'tích lũy', 'hanh thông', 'tăng', 'nên mua']
+    if any(w in text for w in normal_buy): return "MUA", 0.5
+    normal_sell = ['bán', 'xấu', 'lỗ', 'giảm', 'trở ngại', 'hạ tỷ trọng', 'nên bán']
+    if any(w in text for w in normal_sell): return "BÁN", 0.5
+    return "GIỮ", 0.0
+
+def parse_advice_csv(text):
+    rows = csv.reader(io.StringIO(text))
+    header = next(rows)
+    key_col, adv_col = header.index("KEY_ID"), header.index("Lời Khuyên")
+    adv_map = {}
+    for row in rows:
+        if len(row) <= key_col: continue
+        # File dự phòng không bọc lời khuyên trong dấu nháy -> gộp phần thừa vào cột cuối
+        advice = ",".join(row[adv_col:]) if adv_col == len(header) - 1 else row[adv_col]
+        adv_map[row[key_col].strip()] = advice.strip()
+    return adv_map
+
+# --- BẢNG TÍN HIỆU: mã quẻ (KEY_INDEX) -> (lời khuyên, lệnh, tỷ trọng) ---
+class SignalTable:
+    def __init__(self, advice, actions, percents, source_hash=""):
+        self.advice = advice
+        self.actions = np.asarray(actions, dtype=np.int8)
+        self.percents = np.asarray(percents, dtype=np.float64)
+        self.source_hash = source_hash
+
+    @classmethod
+    def from_advice_map(cls, adv_map, source_hash=""):
+        advice = [adv_map.get(key, "") for key in KEY_IDS]
+        actions, percents = [], []
+        for text in advice:
+            action, percent = analyze_smart_action(text)
+            actions.append(ACTION_CODES[action]); percents.append(percent)
+        return cls(advice, actions, percents, source_hash)
+
+    def lookup(self, codes): return self.actions[codes], self.percents[codes]
+
+    # Dấu vân tay của tín hiệu đã biên dịch (đổi CSV hoặc luật phân tích -> đổi giá trị)
+    def fingerprint(self):
+        return hashlib.sha1(self.source_hash.encode() + self.actions.tobytes() + self.percents.tobytes()).hexdigest()
+
+    def signal_for(self, key):
+        code = KEY_INDEX.get(key)
+        if code is None: return "GIỮ", 0.0
+        return ACTION_NAMES[self.actions[code]], float(self.percents[code])
+
+    def advice_for(self, key):
+        code = KEY_INDEX.get(key)
+        return self.advice[code] if code is not None else ""
+
+    def advice_map(self): return {key: adv for key, adv in zip(KEY_IDS, self.advice) if adv}
+
+    def to_json(self):
+        return {"hash": self.source_hash, "advice": self.advice, "actions": self.actions.tolist(), "percents": self.percents.tolist()}
+
+def _read_advice_source(path):
+    if os.path.exists(path):
+        with open(path, "rb") as f: raw = f.read()
+    else: raw = BACKUP_CSV.encode("utf-8")
+    return raw, hashlib.sha1(f"rules-v{RULES_VERSION}\n".encode() + raw).hexdigest()
+
+_tables = {}
+
+def load_signal_table(path=ADVICE_CSV, cache_path=SIGNAL_CACHE):
+    if path in _tables: return _tables[path]
+    raw, digest = _read_advice_source(path)
+    table = None
+    try:
+        with open(cache_path, encoding="utf-8") as f: cached = json.load(f)
+        if cached.get("hash") == digest and len(cached["advice"]) == len(KEY_IDS):
+            table = SignalTable(cached["advice"], cached["actions"], cached["percents"], digest)
+    except (OSError, ValueError, KeyError): pass
+
+    if table is None:
+        print("🧮 [BUILD LOG] Biên dịch bảng tín hiệu từ lời khuyên...")
+        table = SignalTable.from_advice_map(parse_advice_csv(raw.decode("utf-8-sig")), digest)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp = f"{cache_path}.tmp{os.getpid()}.{threading.get_ident()}"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(table.to_json(), f, ensure_ascii=False)
+            os.replace(tmp, cache_path)
+        except OSError as e: print(f"⚠️ [BUILD LOG] Không lưu được bảng tín hiệu: {e}")
+    _tables[path] = table
+    return table
+
+def as_signal_table(signals):
+    if isinstance(signals, SignalTable): return signals
+    return SignalTable.from_advice_map(signals or {})
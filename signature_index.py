@@ -0,0 +1,98 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+
+from concurrency import lazy_singleton
+from hexagram_calendar import CACHE_DIR
+
+# --- CHỈ MỤC CHỮ KÝ NẾN ĐÃ GHI NOTION (mã, ts nến) ---
+SIGNATURE_DB = os.path.join(CACHE_DIR, "signatures.sqlite")
+VN_TZ = timezone(timedelta(hours=7))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (symbol TEXT NOT NULL, ts INTEGER NOT NULL, PRIMARY KEY (symbol, ts)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_state (symbol TEXT PRIMARY KEY, last_seen TEXT);
+"""
+
+class SignatureIndex:
+    def __init__(self, path=SIGNATURE_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(_SCHEMA)
+
+    def load(self, symbol):
+        with self.lock:
+            return {r[0] for r in self.conn.execute("SELECT ts FROM signatures WHERE symbol=?", (symbol,))}
+
+    def add(self, symbol, ts_list):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO signatures VALUES (?, ?)", [(symbol, int(t)) for t in ts_list])
+
+    def last_seen(self, symbol):
+        with self.lock:
+            row = self.conn.execute("SELECT last_seen FROM sync_state WHERE symbol=?", (symbol,)).fetchone()
+            return row[0] if row else None
+
+    def set_last_seen(self, symbol, iso):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (symbol, iso))
+
+    def clear(self, symbol):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM signatures WHERE symbol=?", (symbol,))
+            self.conn.execute("DELETE FROM sync_state WHERE symbol=?", (symbol,))
+
+# Trang cũ có thể thiếu "Giờ Giao Dịch" -> đọc "HH:MM dd/mm" trong tiêu đề, lấy năm gần nhất không vượt quá hiện tại
+def _ts_from_title(title, now):
+    match = re.search(r'(\d{2}):(\d{2}) (\d{2})/(\d{2})', title or "")
+    if not match: return None
+    hh, mm, dd, mo = map(int, match.groups())
+    for year in (now.year, now.year - 1):
+        try: dt = datetime(year, mo, dd, hh, mm, tzinfo=VN_TZ)
+        except ValueError: continue
+        if dt <= now + timedelta(days=1): return int(dt.timestamp())
+    return None
+
+def _page_signature(page, now):
+    props = page.get('properties', {})
+    try: owner = props['Mã']['rich_text'][0]['plain_text']
+    except (KeyError, IndexError, TypeError): owner = ""
+    start = ((props.get('Giờ Giao Dịch') or {}).get('date') or {}).get('start')
+    if start:
+        try: return owner, int(datetime.fromisoformat(start).timestamp()), start
+        except ValueError: pass
+    try: title = props['Thời Gian']['title'][0]['plain_text']
+    except (KeyError, IndexError, TypeError): title = ""
+    return owner, _ts_from_title(title, now), None
+
+# Đồng bộ từ Notion: full=True quét lại toàn bộ (có phân trang), ngược lại chỉ hỏi các trang từ lần đồng bộ trước
+def sync_signatures(index, request_fn, log_db_id, symbol, full=False):
+    if full: index.clear(symbol)
+    since = index.last_seen(symbol)
+    flt = {"property": "Mã", "rich_text": {"contains": symbol}}
+    if since: flt = {"and": [flt, {"property": "Giờ Giao Dịch", "date": {"on_or_after": since}}]}
+    payload = {"filter": flt, "sorts": [{"property": "Giờ Giao Dịch", "direction": "ascending"}], "page_size": 100}
+
+    now = datetime.now(VN_TZ)
+    found, last_seen, last_seen_ts = [], since, None
+    while True:
+        data = request_fn(f"databases/{log_db_id}/query", "POST", payload)
+        if not data or 'results' not in data: return False
+        for page in data['results']:
+            owner, ts, start = _page_signature(page, now)
+            if ts is None or owner.split(" (")[0].strip() != symbol: continue
+            found.append(ts)
+            if start and (last_seen_ts is None or ts > last_seen_ts): last_seen, last_seen_ts = start, ts
+        if not data.get('has_more') or not data.get('next_cursor'): break
+        payload["start_cursor"] = data['next_cursor']
+
+    index.add(symbol, found)
+    if last_seen: index.set_last_seen(symbol, last_seen)
+    return True
+
+get_signature_index = lazy_singleton(SignatureIndex)
@@ -0,0 +1,130 @@
+import os
+import re
+import sys
+import math
+import time
+import argparse
+import itertools
+
+from concurrency import init_worker, process_pool, worker_ctx
+from backtest import DEFAULT_PARAMS, load_backtest_arrays, simulate_arrays, summarize_stats
+from indicators import compute_indicators, compute_sma
+from signal_table import load_signal_table
+from telegram_sender import print_report
+
+# --- CẤU HÌNH QUÉT THAM SỐ ---
+SWEEP_WORKERS = int(os.environ.get("SWEEP_WORKERS", os.cpu_count() or 2))
+MAX_COMBOS = 20000
+SWEEP_DAYS = 90
+# Tên viết tắt dùng trong CLI / Telegram -> khóa trong DEFAULT_PARAMS
+PARAM_ALIASES = {"sl": "stop_loss", "tp": "take_profit", "rsi_floor": "rsi_floor", "rsi_ob": "rsi_overbought", "sma": "sma_window"}
+DEFAULT_GRID = {"stop_loss": "-0.03:-0.12:-0.01", "take_profit": "0.05:0.30:0.05", "rsi_floor": "30,35,40",
+                "rsi_overbought": "70,75,80", "sma_window": "10,20,30"}
+
+# "a:b:bước" (gồm cả b), "a,b,c" hoặc một giá trị
+def parse_range(text, cast=float):
+    text = str(text).strip()
+    if ":" in text:
+        a, b, step = (float(x) for x in text.split(":"))
+        if step == 0 or (b - a) / step < 0: raise ValueError(f"Khoảng không hợp lệ: {text}")
+        n = int(math.floor((b - a) / step + 1e-9)) + 1
+        return [cast(round(a + i * step, 10)) for i in range(n)]
+    return [cast(x) for x in text.split(",") if x]
+
+def build_grid(overrides=None):
+    spec = {**DEFAULT_GRID, **(overrides or {})}
+    grid = {k: parse_range(spec[k], int if k == "sma_window" else float) for k in DEFAULT_PARAMS}
+    n = math.prod(len(v) for v in grid.values())
+    if n == 0: raise ValueError("Lưới tham số rỗng")
+    if n > MAX_COMBOS: raise ValueError(f"Quá nhiều tổ hợp ({n:,} > {MAX_COMBOS:,})")
+    return grid
+
+# --- WORKER (dữ liệu dùng chung được nạp một lần cho mỗi tiến trình) ---
+def _eval_chunk(combos):
+    c = worker_ctx("sweep")
+    out = []
+    for params in combos:
+        stats = simulate_arrays(c["price"], c["sma"][params["sma_window"]], c["rsi"], c["actions"], c["percents"], c["asset_type"], params)
+        out.append({**params, **summarize_stats(stats)})
+    return out
+
+def run_sweep(bt, grid, workers=SWEEP_WORKERS):
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    _, rsi = compute_indicators(bt["price"])
+    ctx = {"price": bt["price"], "rsi": rsi, "actions": bt["actions"], "percents": bt["percents"], "asset_type": bt["asset_type"],
+           "sma": {w: compute_sma(bt["price"], w) for w in set(grid["sma_window"])}}
+
+    if workers <= 1 or len(combos) < 50:
+        init_worker("sweep", ctx)
+        rows = _eval_chunk(combos)
+    else:
+        size = max(1, len(combos) // (workers * 8))
+        chunks = [combos[i:i + size] for i in range(0, len(combos), size)]
+        rows = []
+        with process_pool(workers, init_worker, ("sweep", ctx)) as pool:
+            for part in pool.map(_eval_chunk, chunks): rows.extend(part)
+    rows.sort(key=lambda r: r["roi"], reverse=True)
+    return rows
+
+def format_sweep_report(bt, rows, elapsed, top=10):
+    lines = [f"{'#':>2} {'SL':>6} {'TP':>5} {'RSI':>5} {'SMA':>3} {'ROI':>8} {'Win':>5} {'Lệnh':>4} {'MaxDD':>7}"]
+    for i, r in enumerate(rows[:top], 1):
+        lines.append(f"{i:>2} {r['stop_loss']:>6.0%} {r['take_profit']:>5.0%} {r['rsi_floor']:>2.0f}/{r['rsi_overbought']:<2.0f} {r['sma_window']:>3} "
+                     f"{r['roi']:>+8.2%} {r['win_rate']:>5.0%} {r['trades']:>4} {r['max_drawdown']:>7.1%}")
+    best = rows[0]
+    fee_fmt = f"{best['fees']:,.2f}" if bt["asset_type"] == "CRYPTO" else f"{best['fees']/1e6:,.1f} tr"
+    return (
+        f"🧪 <b>QUÉT THAM SỐ: {bt['symbol'].upper()}</b>\n"
+        f"⏳ {bt['days']} ngày | 🕯 {len(bt['price'])} nến | 🔢 {len(rows):,} tổ hợp | ⏱ {elapsed:.1f}s\n"
+        f"💸 <b>Phí GD (top 1):</b> {fee_fmt}\n"
+        f"<pre>" + "\n".join(lines) + "</pre>"
+    )
+
+def run_sweep_report(symbol, days, signals, overrides=None, top=10, workers=SWEEP_WORKERS):
+    try:
+        grid = build_grid(overrides)
+        bt, msg = load_backtest_arrays(symbol, days, signals)
+        if bt is None: return msg
+        started = time.time()
+        rows = run_sweep(bt, grid, workers)
+        return format_sweep_report(bt, rows, time.time() - started, top)
+    except Exception as e:
+        print(f"❌ [BUILD LOG] Exception in Sweep: {str(e)}")
+        return f"❌ <b>Lỗi quét tham số</b>: {str(e)}"
+
+# Lệnh Telegram: "sweep MÃ [NGÀY] [sl=-0.05:-0.1:-0.01] [tp=..] [rsi_floor=..] [rsi_ob=..] [sma=..]"
+def parse_sweep_args(parts):
+    if not parts: raise ValueError("Thiếu mã tài sản")
+    symbol, days, overrides = parts[0].upper(), SWEEP_DAYS, {}
+    for p in parts[1:]:
+        if "=" in p:
+            name, _, value = p.partition("=")
+            if name.lower() not in PARAM_ALIASES: raise ValueError(f"Tham số lạ: {name}")
+            overrides[PARAM_ALIASES[name.lower()]] = value
+        else: days = int(p)
+    return symbol, days, overrides
+
+# argparse coi "-0.03:..." là một option -> dán giá trị âm vào cờ: "--sl -0.03:-0.12:-0.01" thành "--sl=-0.03:-0.12:-0.01"
+def _join_negative_values(argv, flags):
+    out = []
+    for arg in argv:
+        if out and out[-1] in flags and re.match(r"^-[\d.]", arg): out[-1] = f"{out[-1]}={arg}"
+        else: out.append(arg)
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quét lưới tham số chiến lược trên dữ liệu backtest",
+                                     epilog="VD: python sweep.py BTC 90 sl=-0.03:-0.12:-0.01 tp=0.05:0.3:0.05 (hoặc --sl=-0.03:-0.12:-0.01)")
+    parser.add_argument("symbol")
+    parser.add_argument("args", nargs="*", metavar="NGÀY|THAM_SỐ=KHOẢNG", help=f"số ngày (mặc định {SWEEP_DAYS}) và/hoặc sl=a:b:bước ...")
+    flags = [f"--{alias.replace('_', '-')}" for alias in PARAM_ALIASES]
+    for flag, (alias, key) in zip(flags, PARAM_ALIASES.items()):
+        parser.add_argument(flag, dest=key, help=f"mặc định {DEFAULT_GRID[key]}")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=SWEEP_WORKERS)
+    args = parser.parse_args(_join_negative_values(sys.argv[1:], flags))
+    symbol, days, overrides = parse_sweep_args([args.symbol] + args.args)
+    overrides.update({k: getattr(args, k) for k in DEFAULT_PARAMS if getattr(args, k) is not None})
+    report = run_sweep_report(symbol, days, load_signal_table(), overrides, args.top, args.workers)
+    print_report(report)
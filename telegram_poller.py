@@ -0,0 +1,46 @@
+import os
+import json
+import requests
+
+from hexagram_calendar import CACHE_DIR
+from concurrency import host_slot
+
+# --- LONG POLLING TELEGRAM (chế độ daemon) ---
+# Lưu offset đã xác nhận để mỗi lệnh chỉ xử lý đúng một lần, kể cả khi daemon khởi động lại
+OFFSET_FILE = os.path.join(CACHE_DIR, "telegram_offset.json")
+POLL_TIMEOUT = int(os.environ.get("TG_POLL_TIMEOUT", 25))
+
+class TelegramPoller:
+    def __init__(self, token, offset_path=OFFSET_FILE):
+        self.url = f"https://api.telegram.org/bot{token}/getUpdates"
+        self.session = requests.Session()
+        self.offset_path = offset_path
+        try:
+            with open(offset_path, encoding="utf-8") as f: self.offset = json.load(f)["offset"]
+        except (OSError, ValueError, KeyError): self.offset = None
+
+    def _save_offset(self):
+        os.makedirs(os.path.dirname(self.offset_path), exist_ok=True)
+        tmp = f"{self.offset_path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump({"offset": self.offset}, f)
+        os.replace(tmp, self.offset_path)
+
+    # -> list (update_id, unix date, text); offset được ghi trước khi trả về để lệnh lỗi không bị lặp vô hạn
+    def poll(self, timeout=POLL_TIMEOUT):
+        params = {"timeout": max(0, int(timeout)), "allowed_updates": json.dumps(["message"])}
+        if self.offset is not None: params["offset"] = self.offset
+        with host_slot("api.telegram.org", label="api.telegram.org/getUpdates") as slot:
+            resp = self.session.get(self.url, params=params, timeout=timeout + 10)
+            slot.nbytes = len(resp.content)
+        res = resp.json()
+        if not res.get('ok'): return []
+        updates = res.get('result') or []
+        if not updates: return []
+        self.offset = max(u['update_id'] for u in updates) + 1
+        self._save_offset()
+        out = []
+        for u in updates:
+            msg = u.get('message') or {}
+            text = (msg.get('text') or '').strip()
+            if text: out.append((u['update_id'], msg.get('date', 0), text))
+        return out
@@ -0,0 +1,188 @@
+import os
+import re
+import sys
+import time
+import atexit
+import threading
+from collections import deque
+
+import requests
+
+from concurrency import TokenBucket, host_slot
+from run_profile import profile, span
+
+# --- HÀNG ĐỢI GỬI TELEGRAM (bất đồng bộ) ---
+# Tin nhắn được xếp hàng và gửi bởi một luồng nền qua session dùng chung -> chiến dịch không phải chờ Telegram.
+# Giới hạn tốc độ theo từng chat, tôn trọng retry_after khi bị 429, tự cắt tin dài quá 4096 ký tự.
+# Tin có nhóm (VD tín hiệu của một lượt chạy) được giữ lại tới khi release(nhóm); đủ ngưỡng thì gộp thành một tin.
+TELEGRAM_API = "https://api.telegram.org"
+TG_MAX_LEN = 4096
+TG_CHAT_RATE = float(os.environ.get("TG_CHAT_RATE", 1))          # Telegram khuyến nghị ~1 tin/giây mỗi chat
+TG_GLOBAL_RATE = float(os.environ.get("TG_GLOBAL_RATE", 25))     # và ~30 tin/giây cho cả bot
+TG_COALESCE_THRESHOLD = int(os.environ.get("TG_COALESCE_THRESHOLD", 5))
+TG_MAX_RETRIES = 5
+TG_EXIT_FLUSH_S = 30
+
+_TAG = re.compile(r"<(/?)(b|i|u|s|code|pre)>")
+
+# Cắt theo đoạn trống, rồi theo dòng, cuối cùng cắt cứng; đóng / mở lại thẻ HTML bị cắt ngang giữa các phần
+def split_message(text, limit=TG_MAX_LEN):
+    if len(text) <= limit: return [text]
+    parts, rest = [], text
+    while len(rest) > limit:
+        budget = limit - 32   # chừa chỗ cho thẻ đóng / mở lại
+        cut = rest.rfind("\n\n", 0, budget)
+        if cut <= 0: cut = rest.rfind("\n", 0, budget)
+        if cut <= 0:
+            # Cắt cứng: lùi về trước thẻ "<...>" hoặc thực thể "&...;" đang dở
+            cut = budget
+            lt, amp = rest.rfind("<", 0, cut), rest.rfind("&", 0, cut)
+            if lt > rest.rfind(">", 0, cut): cut = lt
+            if amp > rest.rfind(";", 0, cut): cut = min(cut, amp)
+            if cut <= 0: cut = budget
+        parts.append(rest[:cut])
+        rest = rest[cut:].lstrip("\n")
+    parts.append(rest)
+    out, carry = [], []
+    for part in parts:
+        part = "".join(f"<{t}>" for t in carry) + part
+        open_tags = []
+        for closing, tag in _TAG.findall(part):
+            if closing and tag in open_tags: open_tags.remove(tag)
+            elif not closing: open_tags.append(tag)
+        out.append(part + "".join(f"</{t}>" for t in reversed(open_tags)))
+        carry = open_tags
+    return out
+
+def strip_tags(text): return _TAG.sub("", text)
+
+# Chạy báo cáo từ dòng lệnh: in bản bỏ thẻ HTML, mã thoát 1 nếu báo cáo là lỗi ("❌ ...")
+def print_report(report):
+    print(strip_tags(report))
+    sys.exit(0 if not report.startswith("❌") else 1)
+
+class TelegramSender:
+    def __init__(self, token, chat_rate=TG_CHAT_RATE, coalesce_threshold=TG_COALESCE_THRESHOLD):
+        self.url = f"{TELEGRAM_API}/bot{token}/sendMessage"
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.chat_rate = chat_rate
+        self.buckets = {}
+        self.global_bucket = TokenBucket(TG_GLOBAL_RATE)
+        self.threshold = max(2, coalesce_threshold)
+        self.pending = deque()   # (chat_id, text, parse_mode) chờ gửi
+        self.groups = {}         # (chat_id, nhóm) -> [(text, parse_mode)] chờ release
+        self.busy = 0
+        self.cond = threading.Condition()
+        self.thread = None
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "coalesced": 0}
+        atexit.register(self.close, TG_EXIT_FLUSH_S)
+
+    def _count(self, field, n=1):
+        with self.cond: self.stats[field] += n
+
+    def send(self, chat_id, text, group=None, parse_mode="HTML"):
+        if not text: return
+        with self.cond:
+            self.stats["queued"] += 1
+            if group is not None:
+                self.groups.setdefault((str(chat_id), group), []).append((text, parse_mode))
+                return
+            self._enqueue(str(chat_id), text, parse_mode)
+
+    def _enqueue(self, chat_id, text, parse_mode):
+        self.pending.append((chat_id, text, parse_mode))
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._worker, daemon=True)
+            self.thread.start()
+        self.cond.notify_all()
+
+    # Đẩy các tin đang giữ của nhóm vào hàng đợi (None = mọi nhóm); đủ ngưỡng thì gộp thành một tin
+    def release(self, group=None):
+        with self.cond:
+            for (chat_id, name) in [k for k in self.groups if group is None or k[1] == group]:
+                batch = self.groups.pop((chat_id, name))
+                if len(batch) < self.threshold:
+                    for text, parse_mode in batch: self._enqueue(chat_id, text, parse_mode)
+                    continue
+                self.stats["coalesced"] += len(batch)
+                header = f"🔔 <b>{len(batch)} TÍN HIỆU MỚI</b>" if name == "signals" else f"📦 <b>{len(batch)} tin nhắn</b>"
+                self._enqueue(chat_id, header + "\n\n" + "\n\n".join(text for text, _ in batch), batch[0][1])
+
+    def _next(self):
+        with self.cond:
+            while not self.pending: self.cond.wait()
+            self.busy += 1
+            return self.pending.popleft()
+
+    def _worker(self):
+        while True:
+            chat_id, text, parse_mode = self._next()
+            try:
+                with span("telegram"):
+                    for part in split_message(text):
+                        self._count("sent" if self._post(chat_id, part, parse_mode) else "failed")
+            except Exception as e:
+                print(f"❌ [BUILD LOG] Lỗi gửi Telegram: {e}")
+                self._count("failed")
+            finally:
+                with self.cond:
+                    self.busy -= 1
+                    self.cond.notify_all()
+
+    def _bucket(self, chat_id):
+        if chat_id not in self.buckets: self.buckets[chat_id] = TokenBucket(self.chat_rate, capacity=3)
+        return self.buckets[chat_id]
+
+    def _post(self, chat_id, text, parse_mode):
+        payload = {"chat_id": chat_id, "text": text}
+        if parse_mode: payload["parse_mode"] = parse_mode
+        for attempt in range(TG_MAX_RETRIES + 1):
+            self._bucket(chat_id).acquire()
+            self.global_bucket.acquire()
+            try:
+                with host_slot("api.telegram.org") as slot:
+                    resp = self.session.post(self.url, json=payload, timeout=10)
+                    slot.nbytes = len(resp.content)
+                body = resp.json() if resp.content else {}
+            except (requests.RequestException, ValueError) as e:
+                resp, body, delay = None, {}, min(30, 2 ** attempt)
+                print(f"⚠️ [BUILD LOG] Telegram lỗi kết nối ({e}), thử lại sau {delay}s")
+            else:
+                if resp.status_code == 200 and body.get("ok", True): return True
+                if resp.status_code == 429: delay = float((body.get("parameters") or {}).get("retry_after") or min(30, 2 ** attempt))
+                elif resp.status_code == 400 and "parse_mode" in payload and "parse" in str(body.get("description", "")).lower():
+                    # HTML hỏng -> gửi lại dạng văn bản thường thay vì mất tin
+                    payload = {"chat_id": chat_id, "text": strip_tags(text)}
+                    continue
+                elif resp.status_code < 500:
+                    print(f"❌ [BUILD LOG] Telegram từ chối tin ({resp.status_code}): {body.get('description', '')}")
+                    return False
+                else: delay = min(30, 2 ** attempt)
+            if attempt == TG_MAX_RETRIES: break
+            self._count("retries")
+            profile.record_retry("api.telegram.org")
+            time.sleep(delay)
+        return False
+
+    # Khi thoát tiến trình: gửi nốt các nhóm còn giữ rồi chờ hàng đợi
+    def close(self, timeout=None):
+        self.release()
+        return self.flush(timeout)
+
+    # Chờ gửi hết hàng đợi (gọi cuối lượt chạy); tin có nhóm chỉ được gửi sau release()
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self.pending or self.busy:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    print(f"⚠️ [BUILD LOG] Telegram: hết thời gian chờ, bỏ {len(self.pending)} tin chưa gửi")
+                    return False
+                self.cond.wait(left)
+        return True
+
+    def summary(self):
+        with self.cond: s = dict(self.stats)
+        return (f"📨 Telegram: đã xếp hàng {s['queued']}, đã gửi {s['sent']}, gộp {s['coalesced']}, lỗi {s['failed']}, "
+                f"thử lại {s['retries']}")
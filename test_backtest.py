@@ -0,0 +1,67 @@
+import time
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+import baseline_reference
+from indicators import compute_indicators
+
+# Dữ liệu giờ ngẫu nhiên có seed (dạng load_backtest_arrays) cho các test mô phỏng
+def synthetic_bt(n, seed, asset_type, start_ts=1704067200):
+    from hexagram_calendar import lookup_codes
+    from signal_table import load_signal_table
+    rng = np.random.default_rng(seed)
+    signals = load_signal_table()
+    ts = start_ts + np.arange(n, dtype=np.int64) * 3600
+    price = (30000.0 if asset_type == "STOCK" else 100.0) * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+    if asset_type == "STOCK": price = np.round(price, 2)
+    codes = lookup_codes(ts)
+    actions, percents = signals.lookup(codes)
+    return {"symbol": f"T{seed}", "days": n // 24, "timeframe": "1h", "asset_type": asset_type, "ts": ts, "price": price, "codes": codes,
+            "actions": actions, "percents": percents, "signals": signals, "missing": 0}
+
+@lru_cache(maxsize=1)
+def baseline_advice():
+    from signal_table import ADVICE_CSV
+    return baseline_reference.load_advice_map(ADVICE_CSV)
+
+# --- BACKTEST QUA KHO NẾN ---
+
+@pytest.mark.parametrize("symbol, timeframe", [("C001USDT", "1h"), ("C001USDT", "4h"), ("S002", "1h")])
+def test_backtest_ignores_open_candle(fake_services, symbol, timeframe):
+    from backtest import run_backtest_core
+    from signal_table import load_signal_table
+    signals = load_signal_table()
+    before = run_backtest_core(symbol, 20, signals, use_cache=False, timeframe=timeframe)
+    # Nến đang chạy (ts = đầu giờ hiện tại) đổi giá giữa hai lần gọi trong cùng giờ
+    cols = fake_services.market.candles(symbol.replace("USDT", "/USDT"))
+    if cols[0][-1] == fake_services.market.end:
+        for col in cols[1:5]: col[-1] *= 1.5
+    after = run_backtest_core(symbol, 20, signals, use_cache=False, timeframe=timeframe)
+    assert "ROI" in before and after == before
+
+# --- ENGINE: khớp run_backtest_core gốc trên cùng dữ liệu ---
+
+@pytest.mark.parametrize("symbol", ["C001USDT", "S002"])
+@pytest.mark.parametrize("engine", ["vector", "loop"])
+def test_backtest_report_matches_baseline(fake_services, symbol, engine):
+    from backtest import run_backtest_core
+    from signal_table import load_signal_table
+    end_ts = int(time.time()) // 3600 * 3600
+    report = run_backtest_core(symbol, 30, load_signal_table(), engine, use_cache=False)
+    ts, _, _, _, close, _ = fake_services.market.window(symbol.replace("USDT", "/USDT"), end_ts - 30 * 86400, end_ts - 3600)
+    asset_type = "CRYPTO" if "USDT" in symbol else "STOCK"
+    expected = baseline_reference.run_backtest_core(symbol, 30, baseline_advice(), baseline_reference.to_raw_data(ts, close), asset_type)
+    assert "ROI" in report and report == expected
+
+@pytest.mark.parametrize("asset_type", ["STOCK", "CRYPTO"])
+@pytest.mark.parametrize("seed", range(3))
+def test_simulate_arrays_matches_baseline(asset_type, seed):
+    from backtest import simulate_arrays
+    bt = synthetic_bt(3000, seed, asset_type)
+    sma20, rsi = compute_indicators(bt["price"])
+    stats = simulate_arrays(bt["price"], sma20, rsi, bt["actions"], bt["percents"], asset_type)
+    expected = baseline_reference.simulate(baseline_reference.to_raw_data(bt["ts"], bt["price"]), baseline_advice(), asset_type)
+    assert expected["trade_count"] > 20
+    for name in ("final_equity", "total_fees", "trade_count", "win_count", "loss_count"): assert stats[name] == expected[name]
@@ -0,0 +1,42 @@
+import copy
+
+import pytest
+
+from benchmark import FAKE_ENV
+
+# --- CHECKPOINT CHIẾN DỊCH: chạy lại khi không có nến mới không được đổi trạng thái / lệnh ---
+
+@pytest.fixture
+def bot(fake_services, monkeypatch):
+    import main
+    from notion_client import NotionClient
+    monkeypatch.setattr(main, "notion", NotionClient("test", rate=100000))
+    monkeypatch.setattr(main, "telegram", None)
+    monkeypatch.setattr(main, "REBUILD_STATE", False)
+    return main
+
+def campaign(services, index, timeframe):
+    config = copy.deepcopy(services.notion_query(FAKE_ENV["CONFIG_DB_ID"], {})["results"][index])
+    config["id"] += f"-{timeframe}"
+    config["properties"]["Khung Giờ"] = {"select": {"name": timeframe}}
+    return config
+
+@pytest.mark.parametrize("index, timeframe", [(1, "1h"), (1, "4h"), (2, "1h")])
+def test_checkpoint_rerun_without_new_candles_is_stable(bot, fake_services, index, timeframe):
+    from campaign_state import load_campaign_state
+    from equity_store import get_equity_store
+    config = campaign(fake_services, index, timeframe)
+    runs = []
+    for _ in range(3):   # Lần đầu dựng từ đầu, hai lần sau đi đường checkpoint
+        stats = bot.run_campaign(config)
+        bot.notion.flush()
+        runs.append((load_campaign_state(config["id"]), get_equity_store().read(config["id"]), stats))
+    (state0, rows0, stats0), (state1, rows1, stats1), (state2, rows2, stats2) = runs
+    assert state0 is not None and state1 == state0 and state2 == state0
+    assert stats1 == stats0 and stats2 == stats0
+    for name in rows0:
+        assert rows1[name].tolist() == rows0[name].tolist() and rows2[name].tolist() == rows0[name].tolist()
+    assert (rows0["action"] != 0).any()   # Có lệnh thật, không phải chuỗi toàn GIỮ
+    pages = [p for p in fake_services.pages if config["properties"]["Mã Tài Sản"]["rich_text"][0]["plain_text"] in
+             p["properties"]["Mã"]["rich_text"][0]["plain_text"]]
+    assert len({p["properties"]["Giờ Giao Dịch"]["date"]["start"] for p in pages}) == len(pages)
@@ -0,0 +1,62 @@
+import threading
+
+import numpy as np
+
+from candle_store import CandleStore
+from market_data import load_candles
+
+# --- KHO NẾN: chỉ tải phần chưa phủ, đọc lại khớp dữ liệu nguồn ---
+H = 3600
+START = 1704067200   # 01/01/2024 00:00 UTC, đủ xa để mọi nến đã đóng
+
+def source_rows(a, b, skip=()):
+    return [(t, t / H, t / H + 1, t / H - 1, t / H + 0.5, 1.0) for t in range(a, b + 1, H) if t not in skip]
+
+class CountingFetch:
+    def __init__(self, skip=()):
+        self.calls, self.skip, self.lock = [], set(skip), threading.Lock()
+
+    def __call__(self, a, b):
+        with self.lock: self.calls.append((a, b))
+        return source_rows(a, b, self.skip)
+
+def test_missing_ranges_merge_and_gaps(tmp_path):
+    store = CandleStore(str(tmp_path / "c.sqlite"))
+    store.mark_covered("k", "1h", START, START + 10 * H)
+    store.mark_covered("k", "1h", START + 20 * H, START + 30 * H)
+    assert store.missing_ranges("k", "1h", START, START + 40 * H) == [(START + 11 * H, START + 19 * H), (START + 31 * H, START + 40 * H)]
+    store.mark_covered("k", "1h", START + 11 * H, START + 19 * H)   # Nối liền hai khoảng -> gộp làm một
+    assert store.coverage("k", "1h") == [(START, START + 30 * H)]
+    assert store.missing_ranges("k", "1h", START + 5 * H, START + 25 * H) == []
+
+def test_load_candles_fetches_only_missing_parts(tmp_path):
+    store = CandleStore(str(tmp_path / "c.sqlite"))
+    fetch = CountingFetch()
+    a, b = START + 100 * H, START + 300 * H
+    first = load_candles("k", a, b, fetch, store=store, window_candles=50)
+    assert first.ts.tolist() == [r[0] for r in source_rows(a, b)]
+    assert np.array_equal(first.close, [r[4] for r in source_rows(a, b)])
+    assert len(fetch.calls) == 5
+
+    fetch.calls.clear()
+    assert load_candles("k", a + 7 * H, b - 7 * H, fetch, store=store, window_candles=50).ts.tolist() == [r[0] for r in source_rows(a + 7 * H, b - 7 * H)]
+    assert fetch.calls == []
+
+    # Mở rộng hai đầu: chỉ tải đầu lịch sử và đuôi mới
+    wide = load_candles("k", START, START + 400 * H, fetch, store=store, window_candles=50)
+    assert wide.ts.tolist() == [r[0] for r in source_rows(START, START + 400 * H)]
+    fetched = sorted(t for ca, cb in fetch.calls for t in range(ca, cb + 1, H))
+    assert fetched == list(range(START, a, H)) + list(range(b + H, START + 401 * H, H))
+
+def test_empty_windows_are_refetched(tmp_path):
+    store = CandleStore(str(tmp_path / "c.sqlite"))
+    hole = set(range(START + 50 * H, START + 100 * H, H))
+    fetch = CountingFetch(skip=hole)
+    series = load_candles("k", START, START + 149 * H, fetch, store=store, window_candles=50)
+    assert len(series) == 100
+    # Cửa sổ rỗng không được đánh dấu đã phủ -> lần sau tải lại đúng cửa sổ đó
+    assert store.missing_ranges("k", "1h", START, START + 149 * H) == [(START + 50 * H, START + 99 * H)]
+    fetch.calls.clear()
+    fetch.skip = set()
+    assert len(load_candles("k", START, START + 149 * H, fetch, store=store, window_candles=50)) == 150
+    assert fetch.calls == [(START + 50 * H, START + 99 * H)]
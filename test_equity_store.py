@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+import equity_store
+from equity_store import COLUMNS, EquityStore
+
+# --- KHO TÀI SẢN: tail.bin + base.npz, ts trùng giữ bản ghi sau cùng ---
+H = 3600
+START = 1704067200
+
+def row(i, version=0):
+    return (START + i * H, 1000.0 + i + version / 10, 500.0, 0.1 * version, 50.0 + i, i / 100, version % 5, i % 4096)
+
+def expected_cols(latest):
+    rows = np.array([latest[ts] for ts in sorted(latest)], dtype=equity_store.ROW_DTYPE)
+    return {name: rows[name] for name in COLUMNS}
+
+def assert_cols_equal(got, expected):
+    for name in COLUMNS: assert np.array_equal(got[name], expected[name]), name
+
+def test_append_compact_and_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(equity_store, "COMPACT_ROWS", 40)
+    store = EquityStore(str(tmp_path))
+    latest, i = {}, 0
+    for run in range(30):
+        # Mỗi lượt chạy xử lý lại nến cuối của lượt trước (nến đang chạy) rồi thêm nến mới
+        batch = [row(j, run) for j in range(max(0, i - 1), i + 7)]
+        store.append("camp", batch)
+        for r in batch: latest[r[0]] = r
+        i += 7
+        assert_cols_equal(store.read("camp"), expected_cols(latest))
+    folder = store._dir("camp")
+    assert os.path.exists(os.path.join(folder, "base.npz"))
+    assert os.path.getsize(os.path.join(folder, "tail.bin")) < 40 * equity_store.ROW_DTYPE.itemsize
+    # Gộp lại lần nữa / đọc theo khoảng không đổi kết quả
+    assert store.compact("camp") == len(latest)
+    assert_cols_equal(store.read("camp"), expected_cols(latest))
+    part = store.read("camp", START + 50 * H, START + 99 * H)
+    assert part["ts"].tolist() == [START + k * H for k in range(50, 100)]
+
+def test_interrupted_compaction_and_truncated_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(equity_store, "COMPACT_ROWS", 10 ** 6)
+    store = EquityStore(str(tmp_path))
+    store.append("camp", [row(j) for j in range(20)])
+    store.compact("camp")
+    # Ngắt sau khi ghi base nhưng trước khi xóa tail -> tail còn các bản ghi đã có trong base
+    store.append("camp", [row(j, 1) for j in range(15, 25)])
+    latest = {r[0]: r for r in [row(j) for j in range(15)] + [row(j, 1) for j in range(15, 25)]}
+    assert_cols_equal(store.read("camp"), expected_cols(latest))
+    # Bản ghi ghi dở cuối tail bị bỏ qua
+    with open(os.path.join(store._dir("camp"), "tail.bin"), "ab") as f: f.write(b"\x01" * (equity_store.ROW_DTYPE.itemsize // 2))
+    assert_cols_equal(store.read("camp"), expected_cols(latest))
+    store.append("camp", [row(25, 2)])   # Ghi tiếp sau bản ghi dở vẫn đọc đúng
+    latest[START + 25 * H] = row(25, 2)
+    assert_cols_equal(store.read("camp"), expected_cols(latest))
+
+def test_meta_change_resets_series(tmp_path):
+    store = EquityStore(str(tmp_path))
+    meta = {"id": "camp", "symbol": "BTC", "capital": 1000, "timeframe": "1h"}
+    assert store.set_meta("camp", meta) is False
+    store.append("camp", [row(0)])
+    assert store.set_meta("camp", dict(meta, name="đổi tên")) is False and len(store.read("camp")["ts"]) == 1
+    assert store.set_meta("camp", dict(meta, capital=2000)) is True and len(store.read("camp")["ts"]) == 0
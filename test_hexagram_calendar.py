@@ -0,0 +1,29 @@
+from datetime import date, datetime
+
+import numpy as np
+
+import baseline_reference
+from hexagram_calendar import KEY_IDS, VN_TZ, HexagramCalendar, build_calendar, lookup_codes
+
+# --- LỊCH QUẺ: tra bảng phải khớp calculate_hexagram gốc (LunarDate từng nến) ---
+
+def expected_keys(ts):
+    return [baseline_reference.calculate_hexagram(datetime.fromtimestamp(int(t), tz=VN_TZ)) for t in ts]
+
+def vn_ts(*args): return int(datetime(*args, tzinfo=VN_TZ).timestamp())
+
+def test_calendar_matches_baseline():
+    calendar = HexagramCalendar(*build_calendar(2024, 2025))
+    assert calendar.start_ord == date(2024, 1, 1).toordinal()
+    rng = np.random.default_rng(1)
+    inside = rng.integers(vn_ts(2024, 1, 1), vn_ts(2025, 12, 31), 400)
+    outside = rng.integers(vn_ts(2019, 1, 1), vn_ts(2020, 1, 1), 50)   # Ngoài bảng -> tính trực tiếp
+    # Biên giờ Tý (23h / 0h / 1h), biên năm của bảng và đầu / cuối mỗi giờ chi
+    edges = [vn_ts(2024, 12, 31, h, 30) for h in (22, 23)] + [vn_ts(2025, 1, 1, h) for h in (0, 1)] + \
+            [vn_ts(2023, 12, 31, 23), vn_ts(2025, 12, 31, 23)] + [vn_ts(2024, 6, 15, h, m) for h in range(24) for m in (0, 59)]
+    ts = np.concatenate((inside, outside, edges))
+    assert [KEY_IDS[c] for c in calendar.lookup_codes(ts)] == expected_keys(ts)
+
+def test_default_calendar_hourly_matches_baseline():
+    ts = vn_ts(2025, 1, 20) + np.arange(0, 60 * 86400, 3600)   # Qua Tết âm lịch 2025
+    assert [KEY_IDS[c] for c in lookup_codes(ts)] == expected_keys(ts)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import baseline_reference
+from indicators import IndicatorState, compute_indicators, compute_sma
+
+# --- CHỈ BÁO: streaming / batch phải khớp từng bit với add_indicators (pandas) gốc ---
+
+def random_prices(seed, n=3000):
+    rng = np.random.default_rng(seed)
+    price = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    price[500:530] = price[500]   # Chuỗi giá đứng yên (nhánh same_ct của rolling mean)
+    return price
+
+@pytest.mark.parametrize("seed", range(3))
+def test_indicators_match_baseline(seed):
+    price = random_prices(seed)
+    df = baseline_reference.add_indicators(pd.DataFrame({"p": price}))
+    sma_ref, rsi_ref = df["SMA20"].to_numpy(), df["RSI"].to_numpy()
+    sma_b, rsi_b = compute_indicators(price)
+    assert np.array_equal(sma_b, sma_ref) and np.array_equal(rsi_b, rsi_ref)
+    state = IndicatorState()
+    sma_head, rsi_head = state.update_batch(price[:1234])
+    state = IndicatorState.from_dict(state.to_dict())   # Tiếp nối từ checkpoint như run_campaign
+    sma_tail, rsi_tail = state.update_batch(price[1234:])
+    assert np.array_equal(np.concatenate((sma_head, sma_tail)), sma_ref)
+    assert np.array_equal(np.concatenate((rsi_head, rsi_tail)), rsi_ref)
+
+@pytest.mark.parametrize("window", [5, 10, 50])
+def test_custom_sma_window_matches_pandas(window):
+    price = random_prices(7)
+    expected = pd.Series(price).rolling(window=window).mean().fillna(0).to_numpy()
+    assert np.array_equal(compute_sma(price, window), expected)
+    assert np.array_equal(IndicatorState(sma_window=window).update_batch(price)[0], expected)
@@ -0,0 +1,54 @@
+import pytest
+
+import market_data
+from candle_store import CandleStore
+from market_data import download_windows, load_candles, split_windows
+from test_candle_store import CountingFetch, source_rows
+
+# --- TẢI NẾN QUA API ---
+
+def test_markets_loaded_once_across_download_threads(fake_services):
+    end = fake_services.market.end
+    rows, _, failed = market_data.download_windows(lambda a, b: market_data.fetch_crypto_ohlcv("C001/USDT", a, b), end - 20 * 86400, end,
+                                                   window_candles=48, workers=4)
+    assert not failed and len(rows) == 20 * 24 + 1
+    assert fake_services.counts["ccxt_markets"] == 1
+    assert fake_services.counts["ccxt"] >= 10
+
+# --- CHIA CỬA SỔ TẢI SONG SONG ---
+H = 3600
+START = 1704067200
+
+def test_split_windows_cover_range_exactly():
+    for n, size in [(1, 1000), (1000, 1000), (1001, 1000), (2500, 48), (7, 3)]:
+        end = START + (n - 1) * H
+        windows = split_windows(START, end, H, size)
+        assert windows[0][0] == START and windows[-1][1] == end
+        assert all(b - a < size * H for a, b in windows)
+        assert all(nxt[0] == prev[1] + H for prev, nxt in zip(windows, windows[1:]))   # Liền nhau, không chồng
+    assert split_windows(START, START - H, H, 10) == []
+
+def test_download_windows_merges_in_order():
+    fetch = lambda a, b: list(reversed(source_rows(a, b)))   # Thứ tự trả về trong cửa sổ không quan trọng
+    rows, gaps, failed = download_windows(fetch, START, START + 499 * H, window_candles=30, workers=6)
+    assert rows == source_rows(START, START + 499 * H) and gaps == [] and failed == []
+
+def test_failed_windows_are_reported_and_retried(tmp_path, capsys):
+    store = CandleStore(str(tmp_path / "c.sqlite"))
+    bad = (START + 50 * H, START + 99 * H)
+    def fetch(a, b):
+        if (a, b) == bad: raise ConnectionError("timeout")
+        return source_rows(a, b)
+    failed = []
+    series = load_candles("k", START, START + 149 * H, fetch, store=store, window_candles=50, failed=failed)
+    assert failed == [bad] and len(series) == 100
+    assert "lỗi tải" in capsys.readouterr().out
+    assert store.missing_ranges("k", "1h", START, START + 149 * H) == [bad]
+    # Lần sau chỉ tải lại đúng cửa sổ lỗi
+    retry = CountingFetch()
+    assert len(load_candles("k", START, START + 149 * H, retry, store=store, window_candles=50)) == 150
+    assert retry.calls == [bad]
+
+def test_all_windows_failed_raises():
+    def fetch(a, b): raise ConnectionError("down")
+    with pytest.raises(ConnectionError): download_windows(fetch, START, START + 99 * H, window_candles=10, workers=2)
@@ -0,0 +1,27 @@
+import pytest
+
+import baseline_reference
+from backtest import simulate_arrays, summarize_stats
+from indicators import compute_indicators
+from monte_carlo import run_monte_carlo
+from test_backtest import baseline_advice, synthetic_bt
+
+# --- MONTE CARLO: không nhiễu thì mọi đường trùng backtest gốc ---
+
+@pytest.mark.parametrize("asset_type", ["STOCK", "CRYPTO"])
+def test_zero_noise_paths_match_baseline(asset_type):
+    bt = synthetic_bt(3000, 4, asset_type)
+    expected = baseline_reference.simulate(baseline_reference.to_raw_data(bt["ts"], bt["price"]), baseline_advice(), asset_type)
+    roi = (expected["final_equity"] - expected["capital"]) / expected["capital"]
+    sma20, rsi = compute_indicators(bt["price"])
+    drawdown = summarize_stats(simulate_arrays(bt["price"], sma20, rsi, bt["actions"], bt["percents"], asset_type))["max_drawdown"]
+    paths = run_monte_carlo(bt, 3, {"block": 0, "delay": 0, "fee_jitter": 0, "slippage": 0}, workers=1)
+    assert expected["trade_count"] > 20
+    assert paths["roi"].tolist() == pytest.approx([roi] * 3, rel=1e-10, abs=1e-12)
+    assert paths["trades"].tolist() == [expected["trade_count"]] * 3
+    assert paths["max_drawdown"].tolist() == pytest.approx([drawdown] * 3, rel=1e-10, abs=1e-12)
+
+def test_noise_changes_paths():
+    bt = synthetic_bt(3000, 4, "CRYPTO")
+    paths = run_monte_carlo(bt, 8, {"block": 24, "delay": 1, "fee_jitter": 0.2, "slippage": 0.001}, workers=1)
+    assert len(set(paths["roi"].tolist())) > 1
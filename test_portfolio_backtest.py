@@ -0,0 +1,19 @@
+import pytest
+
+import baseline_reference
+from backtest import get_backtest_config
+from market_data import USD_VND_RATE
+from portfolio_backtest import simulate_portfolio
+from test_backtest import baseline_advice, synthetic_bt
+
+# --- DANH MỤC: một tài sản, vốn riêng phải khớp run_backtest_core gốc ---
+
+@pytest.mark.parametrize("asset_type", ["STOCK", "CRYPTO"])
+def test_independent_single_asset_matches_baseline(asset_type):
+    bt = synthetic_bt(2000, 3, asset_type)
+    expected = baseline_reference.simulate(baseline_reference.to_raw_data(bt["ts"], bt["price"]), baseline_advice(), asset_type)
+    result = simulate_portfolio([(bt, get_backtest_config(asset_type)[0])], "independent")
+    to_vnd = 1 if asset_type == "STOCK" else USD_VND_RATE
+    assert expected["trade_count"] > 20
+    assert result["final_vnd"] / to_vnd == pytest.approx(expected["final_equity"], rel=1e-12)
+    assert result["trades"] == expected["trade_count"]
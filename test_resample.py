@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import baseline_reference
+from candle_series import CandleSeries
+from candle_store import CandleStore
+from hexagram_calendar import VN_TZ
+from resample import bar_start, load_resampled, resample_series
+from test_candle_store import H, START, source_rows
+
+# --- GỘP NẾN KHUNG LỚN: biên theo giờ VN, nến 2h trùng giờ chi ---
+
+def hourly(n, start=START, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = start + np.arange(n, dtype=np.int64) * H
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    keep = rng.random(n) > 0.05   # Thiếu vài nến như dữ liệu thật
+    return CandleSeries(ts[keep], close[keep] * 0.999, close[keep] * 1.01, close[keep] * 0.99, close[keep], rng.random(n)[keep])
+
+# Gộp kiểu thủ công: nhóm theo (ngày, giờ) VN của giờ mở cửa nến lớn
+def naive_resample(series, timeframe):
+    def bucket(t):
+        dt = datetime.fromtimestamp(t, tz=VN_TZ)
+        if timeframe == "1d": return dt.replace(hour=0)
+        if timeframe == "4h": return dt.replace(hour=dt.hour // 4 * 4)
+        return datetime.fromtimestamp(t - (dt.hour + 1) % 2 * H, tz=VN_TZ)   # 2h: giờ chi bắt đầu ở giờ lẻ (23h, 1h, 3h...)
+    groups = {}
+    for i, t in enumerate(series.ts.tolist()): groups.setdefault(int(bucket(t).timestamp()), []).append(i)
+    rows = [(k, series.open[ix[0]], series.high[ix].max(), series.low[ix].min(), series.close[ix[-1]], series.volume[ix].sum()) for k, ix in groups.items()]
+    return CandleSeries.from_rows(rows)
+
+@pytest.mark.parametrize("timeframe", ["2h", "4h", "1d"])
+def test_resample_matches_naive_grouping(timeframe):
+    series = hourly(24 * 40, start=START + 5 * H)
+    got, expected = resample_series(series, timeframe), naive_resample(series, timeframe)
+    assert got.ts.tolist() == expected.ts.tolist()
+    for col in ("open", "high", "low", "close"): assert np.array_equal(getattr(got, col), getattr(expected, col))
+    assert np.allclose(got.volume, expected.volume)
+
+def test_two_hour_bars_share_one_chi():
+    bars = resample_series(hourly(24 * 20), "2h")
+    for t in bars.ts.tolist():
+        keys = {baseline_reference.calculate_hexagram(datetime.fromtimestamp(t + h * H, tz=VN_TZ)) for h in (0, 1)}
+        assert len(keys) == 1
+        assert datetime.fromtimestamp(t, tz=VN_TZ).hour % 2 == 1
+
+def test_load_resampled_incremental_matches_full(tmp_path):
+    store = CandleStore(str(tmp_path / "c.sqlite"))
+    base = START - 7 * H   # 0h giờ VN, đầu một nến 4h / 1d
+    rows = source_rows(base, base + 10 * 86400 - H)
+    cut = base + 4 * 86400 + 10 * H   # 10h VN: nến 4h 08h-12h còn đang chạy
+    store.write("k", "1h", [r for r in rows if r[0] < cut])
+    store.mark_covered("k", "1h", base, cut - H)
+    partial = load_resampled("k", "4h", base, base + 10 * 86400, store=store, now_ts=cut)
+    assert partial.ts[-1] == bar_start(cut, "4h") == cut - 2 * H   # Nến đang chạy vẫn được trả về nhưng không đánh dấu đã phủ
+    assert store.coverage("k", "4h") == [(base, cut - 6 * H)]
+    store.write("k", "1h", [r for r in rows if r[0] >= cut])
+    store.mark_covered("k", "1h", cut, rows[-1][0])
+    full = load_resampled("k", "4h", base, base + 10 * 86400, store=store, now_ts=base + 11 * 86400)
+    expected = resample_series(CandleSeries.from_rows(rows), "4h")
+    assert full.ts.tolist() == expected.ts.tolist()
+    for col in ("open", "high", "low", "close", "volume"): assert np.array_equal(getattr(full, col), getattr(expected, col))
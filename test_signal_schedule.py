@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import baseline_reference
+from hexagram_calendar import KEY_IDS, VN_TZ
+from signal_schedule import SignalSchedule, get_signal_schedule, open_schedule, save_schedule
+from signal_table import ACTION_NAMES, load_signal_table
+from test_backtest import baseline_advice
+
+# --- LỊCH TÍN HIỆU: tra ô giờ chi phải khớp calculate_hexagram + analyze_smart_action gốc ---
+NOW = int(datetime(2025, 1, 27, 15, 20, tzinfo=VN_TZ).timestamp())   # Sát Tết âm lịch 2025
+
+def baseline_signal(ts):
+    key = baseline_reference.calculate_hexagram(datetime.fromtimestamp(int(ts), tz=VN_TZ))
+    return (key,) + baseline_reference.analyze_smart_action(baseline_advice().get(key))
+
+def as_signals(schedule, ts):
+    codes, actions, percents = schedule.lookup(ts)
+    return [(KEY_IDS[c], ACTION_NAMES[a], p) for c, a, p in zip(codes.tolist(), actions.tolist(), percents.tolist())]
+
+@pytest.fixture(scope="module")
+def schedule():
+    return SignalSchedule.build(load_signal_table(), NOW, days=5)
+
+def test_slots_align_to_hour_branches(schedule):
+    assert datetime.fromtimestamp(schedule.start_ts, tz=VN_TZ).hour % 2 == 1   # Ô bắt đầu ở giờ lẻ (Tý 23h, Sửu 1h...)
+    assert schedule.covers(NOW, NOW + 4 * 86400) and not schedule.covers(NOW, NOW + 6 * 86400)
+
+def test_lookup_matches_baseline(schedule):
+    minutes = np.arange(schedule.start_ts, schedule.end_ts, 1800, dtype=np.int64)   # Mọi nửa giờ trong lịch
+    assert as_signals(schedule, minutes) == [baseline_signal(t) for t in minutes.tolist()]
+    assert all(schedule.code_at(t) == schedule.lookup([t])[0][0] for t in minutes[::17].tolist())
+
+def test_out_of_range_falls_back_to_calendar(schedule):
+    ts = np.array([schedule.start_ts - 3600, schedule.start_ts, schedule.end_ts - 1, schedule.end_ts, schedule.end_ts + 30 * 86400], dtype=np.int64)
+    assert as_signals(schedule, ts) == [baseline_signal(t) for t in ts.tolist()]
+
+def test_save_open_round_trip(schedule, tmp_path):
+    path = str(tmp_path / "s.bin")
+    save_schedule(path, schedule)
+    loaded = open_schedule(path, schedule.signals)
+    assert (loaded.start_ts, loaded.end_ts, loaded.fingerprint) == (schedule.start_ts, schedule.end_ts, schedule.fingerprint)
+    for name in ("codes", "actions", "percents"): assert np.array_equal(getattr(loaded, name), getattr(schedule, name))
+    with open(path, "r+b") as f: f.truncate(100)
+    with pytest.raises(ValueError): open_schedule(path, schedule.signals)
+
+def test_get_signal_schedule_rebuilds_when_stale(tmp_path, monkeypatch):
+    import signal_schedule
+    monkeypatch.setattr(signal_schedule, "_schedule", None)
+    path = str(tmp_path / "s.bin")
+    first = get_signal_schedule(now_ts=NOW, path=path)
+    monkeypatch.setattr(signal_schedule, "_schedule", None)
+    assert get_signal_schedule(now_ts=NOW + 3600, path=path).start_ts == first.start_ts   # Đọc lại từ file
+    later = get_signal_schedule(now_ts=NOW + 20 * 86400, path=path)
+    assert later.start_ts > first.start_ts and later.covers(NOW + 20 * 86400, NOW + 21 * 86400)
@@ -0,0 +1,37 @@
+import json
+
+import signal_table
+from signal_table import load_signal_table
+
+# --- CACHE BẢNG TÍN HIỆU: đổi CSV hoặc đổi luật phân tích -> biên dịch lại ---
+CSV = "KEY_ID,Lời Khuyên\nG1-B44,Đại cát. Nên mua tất tay.\nG1-B13,Nguy hiểm, bán tháo.\n"
+
+def load_fresh(monkeypatch, csv_path, cache_path):
+    monkeypatch.setattr(signal_table, "_tables", {})
+    return load_signal_table(str(csv_path), str(cache_path))
+
+def test_cache_reused_then_invalidated_by_rules_version(tmp_path, monkeypatch, capsys):
+    csv_path, cache_path = tmp_path / "advice.csv", tmp_path / "signals.json"
+    csv_path.write_text(CSV, encoding="utf-8")
+    first = load_fresh(monkeypatch, csv_path, cache_path)
+    assert "Biên dịch" in capsys.readouterr().out
+    assert first.signal_for("G1-B44") == ("MUA", 1.0) and first.signal_for("G1-B13") == ("BÁN", 1.0)
+
+    assert load_fresh(monkeypatch, csv_path, cache_path).fingerprint() == first.fingerprint()
+    assert "Biên dịch" not in capsys.readouterr().out
+
+    # Cache cũ biên dịch theo luật khác (giả lập bằng cách sửa lệnh trong file) bị bỏ khi tăng RULES_VERSION
+    cached = json.loads(cache_path.read_text(encoding="utf-8"))
+    cached["actions"] = [0] * len(cached["actions"])
+    cache_path.write_text(json.dumps(cached), encoding="utf-8")
+    monkeypatch.setattr(signal_table, "RULES_VERSION", signal_table.RULES_VERSION + 1)
+    rebuilt = load_fresh(monkeypatch, csv_path, cache_path)
+    assert "Biên dịch" in capsys.readouterr().out
+    assert rebuilt.signal_for("G1-B44") == ("MUA", 1.0) and rebuilt.fingerprint() != first.fingerprint()
+
+def test_csv_change_invalidates_cache(tmp_path, monkeypatch):
+    csv_path, cache_path = tmp_path / "advice.csv", tmp_path / "signals.json"
+    csv_path.write_text(CSV, encoding="utf-8")
+    load_fresh(monkeypatch, csv_path, cache_path)
+    csv_path.write_text(CSV.replace("Nên mua tất tay", "Nên đứng ngoài quan sát"), encoding="utf-8")
+    assert load_fresh(monkeypatch, csv_path, cache_path).signal_for("G1-B44") == ("GIỮ", 0.0)
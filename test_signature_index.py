@@ -0,0 +1,53 @@
+import time
+from datetime import datetime
+
+from benchmark import FakeMarket, FakeServices
+from signature_index import VN_TZ, SignatureIndex, sync_signatures
+
+# --- ĐỒNG BỘ CHỮ KÝ NOTION: phân trang lần đầu, lần sau chỉ hỏi phần mới ---
+START = 1704067200
+
+def page(owner, ts, with_date=True):
+    dt = datetime.fromtimestamp(ts, tz=VN_TZ)
+    props = {"Thời Gian": {"title": [{"plain_text": f"✊ GIỮ | {dt.strftime('%H:%M %d/%m')}"}]}, "Mã": {"rich_text": [{"plain_text": owner}]},
+             "Giờ Giao Dịch": {"date": {"start": dt.isoformat()} if with_date else None}}
+    return {"properties": props}
+
+class NotionLog:
+    def __init__(self):
+        self.services = FakeServices(FakeMarket(1), 0)
+        self.requests = []
+
+    def __call__(self, endpoint, method="POST", payload=None):
+        self.requests.append(dict(payload))
+        return self.services.notion_query("log", payload)
+
+def test_full_then_delta_sync(tmp_path):
+    log = NotionLog()
+    log.services.pages = [page("ABC (Camp)", START + i * 3600) for i in range(250)] + [page("ABCD (Khác)", START + i * 3600) for i in range(30)]
+    index = SignatureIndex(str(tmp_path / "s.sqlite"))
+    assert sync_signatures(index, log, "log", "ABC")
+    assert index.load("ABC") == {START + i * 3600 for i in range(250)}
+    assert len(log.requests) == 3 and "start_cursor" in log.requests[-1]   # 280 trang khớp "contains" -> 3 trang kết quả
+
+    log.requests.clear()
+    log.services.pages += [page("ABC (Camp)", START + i * 3600) for i in range(250, 255)]
+    assert sync_signatures(index, log, "log", "ABC")
+    assert len(log.requests) == 1
+    since = log.requests[0]["filter"]["and"][1]["date"]["on_or_after"]
+    assert since == datetime.fromtimestamp(START + 249 * 3600, tz=VN_TZ).isoformat()
+    assert index.load("ABC") == {START + i * 3600 for i in range(255)}
+
+def test_full_rebuild_drops_stale_and_reads_titles(tmp_path):
+    recent = int(time.time()) // 3600 * 3600 - 48 * 3600   # Tiêu đề không có năm -> dùng nến gần đây
+    pages = [page("ABC (Camp)", recent), page("ABC (Camp)", recent + 3600, with_date=False)]
+    index = SignatureIndex(str(tmp_path / "s.sqlite"))
+    index.add("ABC", [1, 2, 3])
+    assert sync_signatures(index, lambda *a: {"results": pages, "has_more": False}, "log", "ABC", full=True)
+    assert index.load("ABC") == {recent, recent + 3600}
+
+def test_failed_request_keeps_index(tmp_path):
+    index = SignatureIndex(str(tmp_path / "s.sqlite"))
+    index.add("ABC", [START])
+    assert not sync_signatures(index, lambda *a: None, "log", "ABC")
+    assert index.load("ABC") == {START} and index.last_seen("ABC") is None
@@ -0,0 +1,77 @@
+import re
+
+import numpy as np
+import pytest
+
+from telegram_sender import _TAG, TelegramSender, split_message, strip_tags
+
+# --- CẮT TIN DÀI: mỗi phần vừa giới hạn, thẻ cân bằng, ghép lại đủ nội dung ---
+
+def random_html(seed, n=400):
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for _ in range(n):
+        word = "x" * int(rng.integers(1, 40))
+        kind = rng.integers(0, 6)
+        if kind == 0: word = f"<b>{word}</b>"
+        elif kind == 1: word = f"<pre>{word} &lt;{word}&gt; {word}</pre>"
+        elif kind == 2: word = f"{word} &amp; {word}"
+        chunks.append(word + ["", " ", "\n", "\n\n"][int(rng.integers(0, 4))])
+    return "<b>" + "".join(chunks) + "</b>"
+
+def balanced(part):
+    stack = []
+    for closing, tag in _TAG.findall(part):
+        if not closing: stack.append(tag)
+        elif not stack or stack.pop() != tag: return False
+    return not stack
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("limit", [200, 1000, 4096])
+def test_split_message_parts_are_valid(seed, limit):
+    text = random_html(seed)
+    parts = split_message(text, limit)
+    assert len(parts) > 1
+    for part in parts:
+        assert len(part) <= limit and balanced(part)
+        bare = strip_tags(part)
+        assert "<" not in bare and ">" not in bare                         # Không cắt giữa thẻ
+        assert bare.count("&") == len(re.findall(r"&(lt|gt|amp);", bare))  # Không cắt giữa thực thể
+    assert strip_tags("".join(parts)).replace("\n", "") == strip_tags(text).replace("\n", "")
+
+def test_split_message_hard_cut_without_newlines():
+    text = "<pre>" + "a&amp;b " * 2000 + "</pre>"
+    parts = split_message(text, 500)
+    assert all(len(p) <= 500 and balanced(p) and p.startswith("<pre>") for p in parts)
+    assert "".join(strip_tags(p) for p in parts) == strip_tags(text)
+
+def test_short_message_unchanged():
+    assert split_message("<b>hi</b>") == ["<b>hi</b>"]
+
+# --- GỘP TIN THEO NHÓM ---
+
+@pytest.fixture
+def sender(monkeypatch):
+    tg = TelegramSender("test", chat_rate=100000, coalesce_threshold=3)
+    tg.posted = []
+    monkeypatch.setattr(tg, "_post", lambda chat_id, text, parse_mode: tg.posted.append((chat_id, text)) or True)
+    return tg
+
+def test_group_held_until_release_and_coalesced(sender):
+    for i in range(4): sender.send(1, f"tín hiệu {i}", group="signals")
+    sender.send(1, "lẻ")
+    assert sender.flush(5) and sender.posted == [("1", "lẻ")]
+    sender.release("signals")
+    assert sender.flush(5) and len(sender.posted) == 2
+    chat_id, text = sender.posted[1]
+    assert chat_id == "1" and text.startswith("🔔 <b>4 TÍN HIỆU MỚI</b>")
+    assert text.split("\n\n")[1:] == [f"tín hiệu {i}" for i in range(4)]
+    assert sender.stats["coalesced"] == 4 and sender.stats["sent"] == 2
+
+def test_small_group_sent_individually(sender):
+    for i in range(2): sender.send(1, f"tín hiệu {i}", group="signals")
+    sender.send(2, "chat khác", group="signals")
+    sender.release()
+    assert sender.flush(5)
+    assert sorted(sender.posted) == [("1", "tín hiệu 0"), ("1", "tín hiệu 1"), ("2", "chat khác")]
+    assert sender.stats["coalesced"] == 0
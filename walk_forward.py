@@ -0,0 +1,98 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from backtest import DEFAULT_PARAMS, filter_buy_signals, load_backtest_arrays, simulate_signals, summarize_stats
+from indicators import compute_indicators
+from signal_table import load_signal_table
+from telegram_sender import print_report
+
+# --- WALK-FORWARD: nhiều ngày bắt đầu chồng lấn, mỗi cửa sổ cùng độ dài ---
+# Tải dữ liệu, tính quẻ / tín hiệu / chỉ báo / bộ lọc kỹ thuật MỘT lần trên cả chuỗi; mỗi cửa sổ chỉ chạy lại
+# vòng lặp trạng thái trên lát cắt list. Chỉ báo ở đầu cửa sổ đã "ấm" (tính từ dữ liệu trước đó) như khi chạy thật.
+WF_HORIZON_DAYS = 90
+WF_SPAN_DAYS = 365
+MAX_WINDOWS = int(os.environ.get("WF_MAX_WINDOWS", 2000))
+
+def window_bounds(ts, horizon_days, span_days, step_days=1):
+    last = int(ts[-1])
+    first_start = last - (horizon_days + span_days) * 86400
+    starts = np.arange(max(first_start, int(ts[0])), last - horizon_days * 86400 + 1, step_days * 86400, dtype=np.int64)
+    lo = np.searchsorted(ts, starts)
+    hi = np.searchsorted(ts, starts + horizon_days * 86400, side="right")
+    keep = hi - lo >= 20
+    return starts[keep], lo[keep], hi[keep]
+
+def run_walk_forward(bt, horizon_days=WF_HORIZON_DAYS, span_days=WF_SPAN_DAYS, step_days=1, params=None):
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    price = bt["price"]
+    sma20, rsi = compute_indicators(price, params["sma_window"])
+    signal = filter_buy_signals(price, sma20, rsi, bt["actions"], params)
+    prices, signals, pcts = price.tolist(), signal.tolist(), bt["percents"].tolist()
+
+    starts, lo, hi = window_bounds(bt["ts"], horizon_days, span_days, step_days)
+    if len(starts) > MAX_WINDOWS: raise ValueError(f"Quá nhiều cửa sổ ({len(starts):,} > {MAX_WINDOWS:,}), tăng bước ngày")
+    rows = []
+    for start, a, b in zip(starts.tolist(), lo.tolist(), hi.tolist()):
+        stats = simulate_signals(prices[a:b], signals[a:b], pcts[a:b], bt["asset_type"], params)
+        rows.append({"start": start, "candles": b - a, **summarize_stats(stats)})
+    return rows
+
+def distribution(values):
+    v = np.asarray(values, dtype=np.float64)
+    q = np.percentile(v, [0, 10, 25, 50, 75, 90, 100])
+    return {"min": q[0], "p10": q[1], "p25": q[2], "median": q[3], "p75": q[4], "p90": q[5], "max": q[6], "mean": float(v.mean())}
+
+def format_walk_forward_report(bt, rows, horizon_days, step_days, elapsed):
+    if not rows: return f"❌ <b>Walk-forward</b>: không đủ dữ liệu cho cửa sổ {horizon_days} ngày."
+    fmt_day = lambda ts: time.strftime("%d/%m/%y", time.gmtime(ts + 7 * 3600))
+    dists = {"ROI": (distribution([r["roi"] for r in rows]), "+.1%"), "Win": (distribution([r["win_rate"] for r in rows]), ".0%"),
+             "MaxDD": (distribution([r["max_drawdown"] for r in rows]), ".1%")}
+    lines = [f"{'':<6}{'p10':>8}{'p25':>8}{'p50':>8}{'p75':>8}{'p90':>8}"]
+    for name, (d, f) in dists.items():
+        lines.append(f"{name:<6}" + "".join(f"{format(d[k], f):>8}" for k in ("p10", "p25", "median", "p75", "p90")))
+    best, worst = max(rows, key=lambda r: r["roi"]), min(rows, key=lambda r: r["roi"])
+    win_share = sum(r["roi"] > 0 for r in rows) / len(rows)
+    return (
+        f"🧭 <b>WALK-FORWARD: {bt['symbol'].upper()}</b>\n"
+        f"🪟 {len(rows)} cửa sổ × {horizon_days} ngày, bước {step_days} ngày | ⏱ {elapsed:.1f}s\n"
+        f"<pre>" + "\n".join(lines) + "</pre>\n"
+        f"📈 <b>Cửa sổ có lãi:</b> {win_share:.0%} | ROI TB {dists['ROI'][0]['mean']:+.2%}\n"
+        f"🏆 <b>Tốt nhất:</b> {fmt_day(best['start'])} ({best['roi']:+.2%})\n"
+        f"💀 <b>Tệ nhất:</b> {fmt_day(worst['start'])} ({worst['roi']:+.2%}, MaxDD {worst['max_drawdown']:.1%})"
+    )
+
+def run_walk_forward_report(symbol, signals, horizon_days=WF_HORIZON_DAYS, span_days=WF_SPAN_DAYS, step_days=1):
+    try:
+        if horizon_days <= 0 or span_days <= 0 or step_days <= 0: raise ValueError("Số ngày phải > 0")
+        bt, msg = load_backtest_arrays(symbol, horizon_days + span_days, signals)
+        if bt is None: return msg
+        started = time.time()
+        rows = run_walk_forward(bt, horizon_days, span_days, step_days)
+        return format_walk_forward_report(bt, rows, horizon_days, step_days, time.time() - started)
+    except Exception as e:
+        print(f"❌ [BUILD LOG] Exception in Walk-forward: {str(e)}")
+        return f"❌ <b>Lỗi walk-forward</b>: {str(e)}"
+
+# Lệnh Telegram: "wf MÃ [ĐỘ_DÀI_NGÀY] [KHOẢNG_NGÀY] [step=N]"
+def parse_walk_forward_args(parts):
+    if not parts: raise ValueError("Thiếu mã tài sản")
+    symbol, nums, step = parts[0].upper(), [], 1
+    for p in parts[1:]:
+        if p.lower().startswith("step="): step = int(p.split("=", 1)[1])
+        else: nums.append(int(p))
+    horizon = nums[0] if len(nums) > 0 else WF_HORIZON_DAYS
+    span = nums[1] if len(nums) > 1 else WF_SPAN_DAYS
+    return symbol, horizon, span, step
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward: phân phối ROI / win rate / drawdown theo nhiều ngày bắt đầu")
+    parser.add_argument("symbol")
+    parser.add_argument("horizon", type=int, nargs="?", default=WF_HORIZON_DAYS, help="độ dài mỗi cửa sổ (ngày)")
+    parser.add_argument("span", type=int, nargs="?", default=WF_SPAN_DAYS, help="khoảng các ngày bắt đầu (ngày)")
+    parser.add_argument("--step", type=int, default=1, help="bước giữa các ngày bắt đầu (ngày)")
+    args = parser.parse_args()
+    report = run_walk_forward_report(args.symbol, load_signal_table(), args.horizon, args.span, args.step)
+    print_report(report)